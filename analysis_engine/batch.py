@@ -0,0 +1,332 @@
+'''
+Split and process many data files using a pool of worker processes.
+
+    python -m analysis_engine.batch /path/to/files manifest.txt --tail G-FDSL --processes 4
+
+Each worker imports the node modules once when it starts, rather than for
+every flight, and then splits each data file into segments and processes
+every segment with process_flight. A summary of the batch including the
+throughput achieved is logged and may be written to a JSON file.
+'''
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import simplejson as json
+import sys
+
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+from time import perf_counter
+
+import pytz
+
+from flightdatautilities.filesystem_tools import copy_file
+
+from analysis_engine import settings
+from analysis_engine.exceptions import FlightTimeoutError
+from analysis_engine.json_tools import process_flight_to_json
+from analysis_engine.process_flight import process_flight
+from analysis_engine.split_hdf_to_segments import split_hdf_to_segments
+from analysis_engine.utils import get_aircraft_info, get_derived_nodes
+
+
+logger = logging.getLogger(__name__)
+
+
+DATA_FILE_EXTENSIONS = ('.hdf5', '.hdf')
+
+
+def find_files(paths):
+    '''
+    Find data files to process. Directories are searched (not recursively)
+    for files with DATA_FILE_EXTENSIONS, while other files are treated as
+    manifests listing one data file path per line. Blank lines and lines
+    starting with # are ignored within manifests.
+
+    :param paths: Paths of data files, directories or manifests.
+    :type paths: [str]
+    :returns: Paths of data files in the order found, without duplicates.
+    :rtype: [str]
+    '''
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(DATA_FILE_EXTENSIONS)))
+        elif path.lower().endswith(DATA_FILE_EXTENSIONS):
+            files.append(path)
+        else:
+            with open(path) as manifest:
+                base_dir = os.path.dirname(path)
+                for line in manifest:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        files.append(os.path.join(base_dir, line))
+    seen = set()
+    return [f for f in files if not (f in seen or seen.add(f))]
+
+
+@contextmanager
+def time_limit(seconds, path):
+    '''
+    Raise FlightTimeoutError within the context if it takes longer than
+    seconds. Only supported within the main thread of a process.
+
+    :param seconds: Time allowed. None or 0 disables the time limit.
+    :type seconds: float or None
+    :param path: Path of the file being split or processed.
+    :type path: str
+    '''
+    if not seconds:
+        yield
+        return
+
+    def handler(signum, frame):
+        raise FlightTimeoutError(path, seconds)
+
+    previous_handler = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def init_worker(node_modules):
+    '''
+    Pool initializer which imports the node modules, or loads the node
+    manifest if settings.NODE_MANIFEST_PATH is set, once per worker process so
+    that this is not repeated for each flight.
+
+    :param node_modules: Module paths to import.
+    :type node_modules: [str]
+    '''
+    start = perf_counter()
+    get_derived_nodes(node_modules, manifest_path=settings.NODE_MANIFEST_PATH)
+    logger.debug("Worker %d imported node modules in %.2fs.", os.getpid(), perf_counter() - start)
+
+
+def process_file(path, tail_number, aircraft_info=None, fallback_dt=None, validation_dt=None,
+                 timeout=None, write_json=False, process_kwargs=None):
+    '''
+    Split a data file into segments and process each segment. Errors are
+    logged and recorded within the result rather than raised so that the
+    remainder of the batch continues.
+
+    :param path: Path of the data file. A copy is split so that the original
+        is not modified.
+    :type path: str
+    :param tail_number: Aircraft tail number.
+    :type tail_number: str
+    :param aircraft_info: Aircraft information. Fetched with
+        get_aircraft_info if not provided.
+    :type aircraft_info: dict or None
+    :param timeout: Seconds allowed to split the file and to process each
+        segment.
+    :type timeout: float or None
+    :param write_json: Write the results of each segment to a JSON file
+        alongside the segment.
+    :type write_json: bool
+    :param process_kwargs: Keyword arguments for process_flight.
+    :type process_kwargs: dict or None
+    :returns: Result of splitting and processing the file.
+    :rtype: dict
+    '''
+    if process_kwargs is None:
+        process_kwargs = {}
+    start = perf_counter()
+    result = {'file': path, 'error': None, 'timed_out': False, 'segments': []}
+    try:
+        if aircraft_info is None:
+            aircraft_info = get_aircraft_info(tail_number)
+        hdf_copy = copy_file(path, postfix='_split')
+        with time_limit(timeout, path):
+            segments = split_hdf_to_segments(
+                hdf_copy, aircraft_info, fallback_dt=fallback_dt, validation_dt=validation_dt,
+                fallback_relative_to_start=False)
+    except (Exception, FlightTimeoutError) as err:
+        logger.exception("Failed to split '%s'.", path)
+        result.update(error=str(err), timed_out=isinstance(err, FlightTimeoutError),
+                      processing_time=perf_counter() - start)
+        return result
+
+    for segment in segments:
+        segment_start = perf_counter()
+        segment_result = {
+            'path': segment.path,
+            'type': segment.type,
+            'duration': (segment.stop_dt - segment.start_dt).total_seconds(),
+            'error': None,
+            'timed_out': False,
+        }
+        segment_info = {
+            'File': segment.path,
+            'Segment Type': segment.type,
+            'Start Datetime': segment.start_dt,
+        }
+        try:
+            with time_limit(timeout, segment.path):
+                res = process_flight(segment_info, tail_number, aircraft_info=aircraft_info,
+                                     **process_kwargs)
+            if write_json:
+                with open(os.path.splitext(segment.path)[0] + '.json', 'w') as f:
+                    f.write(process_flight_to_json(res))
+        except (Exception, FlightTimeoutError) as err:
+            logger.exception("Failed to process segment '%s'.", segment.path)
+            segment_result.update(error=str(err), timed_out=isinstance(err, FlightTimeoutError))
+        segment_result['processing_time'] = perf_counter() - segment_start
+        result['segments'].append(segment_result)
+
+    result['processing_time'] = perf_counter() - start
+    return result
+
+
+def summarise(results, elapsed):
+    '''
+    Summarise the results of a batch.
+
+    :param results: Results of process_file.
+    :type results: [dict]
+    :param elapsed: Seconds taken to process the batch.
+    :type elapsed: float
+    :returns: Counts of files and segments, errors and throughput.
+    :rtype: dict
+    '''
+    segments = [s for r in results for s in r['segments']]
+    processed = [s for s in segments if not s['error']]
+    return {
+        'files': len(results),
+        'files_failed': sum(1 for r in results if r['error']),
+        'segments': len(segments),
+        'segments_processed': len(processed),
+        'segments_failed': len(segments) - len(processed),
+        'timed_out': sum(1 for r in results if r['timed_out']) + sum(1 for s in segments if s['timed_out']),
+        'flight_hours': sum(s['duration'] for s in processed) / 3600.0,
+        'elapsed': elapsed,
+        'flights_per_hour': len(processed) * 3600.0 / elapsed if elapsed else 0.0,
+        'segments_per_second': len(segments) / elapsed if elapsed else 0.0,
+    }
+
+
+def process_batch(paths, tail_number, processes=None, timeout=None, node_modules=None,
+                  max_files_per_process=None, **kwargs):
+    '''
+    Split and process data files using a pool of worker processes.
+
+    :param paths: Paths of data files, directories or manifests (see
+        find_files).
+    :type paths: [str]
+    :param tail_number: Aircraft tail number.
+    :type tail_number: str
+    :param processes: Number of worker processes. Defaults to
+        settings.BATCH_PROCESSES.
+    :type processes: int or None
+    :param timeout: Seconds allowed to split each file and to process each
+        segment. Defaults to settings.BATCH_FLIGHT_TIMEOUT.
+    :type timeout: float or None
+    :param node_modules: Modules imported by each worker when started.
+        Defaults to settings.NODE_MODULES.
+    :type node_modules: [str] or None
+    :param max_files_per_process: Number of files processed by each worker
+        before it is replaced. Defaults to
+        settings.BATCH_MAX_FILES_PER_PROCESS.
+    :type max_files_per_process: int or None
+    :param kwargs: Keyword arguments for process_file.
+    :returns: Results of each file in the order completed and a summary.
+    :rtype: ([dict], dict)
+    '''
+    files = find_files(paths)
+    if processes is None:
+        processes = settings.BATCH_PROCESSES
+    if timeout is None:
+        timeout = settings.BATCH_FLIGHT_TIMEOUT
+    if node_modules is None:
+        node_modules = settings.NODE_MODULES
+    if max_files_per_process is None:
+        max_files_per_process = settings.BATCH_MAX_FILES_PER_PROCESS
+
+    logger.info("Processing %d files.", len(files))
+    start = perf_counter()
+    results = []
+    worker = partial(process_file, tail_number=tail_number, timeout=timeout, **kwargs)
+    with multiprocessing.Pool(processes, initializer=init_worker, initargs=(node_modules,),
+                              maxtasksperchild=max_files_per_process) as pool:
+        for result in pool.imap_unordered(worker, files):
+            logger.info("Processed '%s' (%d segments) in %.2fs%s.", result['file'],
+                        len(result['segments']), result['processing_time'],
+                        ': %s' % result['error'] if result['error'] else '')
+            results.append(result)
+
+    summary = summarise(results, perf_counter() - start)
+    logger.info("Processed %(segments_processed)d of %(segments)d segments from %(files)d files in "
+                "%(elapsed).1fs (%(flights_per_hour).1f flights/hour, %(segments_per_second).3f "
+                "segments/sec).", summary)
+    return results, summary
+
+
+def main():
+    print('FlightDataAnalyzer (c) Copyright 2018 Flight Data Services, Ltd.')
+    print('  - Powered by POLARIS')
+    print('  - http://www.flightdatacommunity.com')
+    print()
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler(stream=sys.stdout))
+
+    now = datetime.utcnow().replace(tzinfo=pytz.utc)
+
+    def valid_date(s):
+        try:
+            return datetime.strptime(s, '%Y-%m-%d %H:%M').replace(tzinfo=pytz.utc)
+        except ValueError:
+            raise argparse.ArgumentTypeError('not a valid date and time: %s' % s)
+
+    parser = argparse.ArgumentParser(description='Split and process a batch of data files.')
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='Data files, directories of data files or manifests listing data files.')
+    parser.add_argument('-tail', '--tail', dest='tail_number', type=str, default='G-FDSL',
+                        help='Aircraft tail number.')
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help='Number of worker processes (defaults to the number of CPUs).')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Seconds allowed to split each file and to process each flight.')
+    parser.add_argument('--max-files-per-process', type=int, default=None,
+                        help='Number of files processed by each worker before it is replaced.')
+    parser.add_argument(
+        '-t', '--fallback-datetime', type=valid_date, default=now, metavar='DATETIME',
+        help='Date and time at beginning of data, used if parameters unreliable (%%Y-%%m-%%d %%H:%%M)',
+    )
+    parser.add_argument(
+        '-d', '--validation-datetime', type=valid_date, default=now, metavar='DATETIME',
+        help='Date and time used to validate time parameters, usually upload time (%%Y-%%m-%%d %%H:%%M)',
+    )
+    parser.add_argument('--write-json', action='store_true',
+                        help='Write the results of each flight to a JSON file alongside its segment.')
+    parser.add_argument('--summary', type=str,
+                        help='Path to write the batch results and summary to in JSON format.')
+    parser.add_argument('-v', '--verbose', dest='verbose', action='store_true',
+                        help='Verbose logging')
+    args = parser.parse_args()
+
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+
+    results, summary = process_batch(
+        args.paths, args.tail_number, processes=args.processes, timeout=args.timeout,
+        max_files_per_process=args.max_files_per_process,
+        fallback_dt=args.fallback_datetime, validation_dt=args.validation_datetime,
+        write_json=args.write_json)
+
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump({'summary': summary, 'results': results}, f, indent=2)
+        logger.info("Batch summary written to: %s", args.summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,19 @@
 import copy
+import hashlib
+import importlib.util
 import logging
+import os
+import sys
+import tempfile
 import types
 
+from collections import OrderedDict
+
 import networkx as nx
+import simplejson as json
+from networkx.readwrite import json_graph
+
+from analysis_engine import __version__, settings
 
 logger = logging.getLogger(__name__)
 
@@ -280,6 +291,174 @@ def dependencies3(graph, root, node_mgr, dependency_tree_log=False):
     return state.order, state.tree_path
 
 
+def _traverse_node(state, operational, node, dependency_tree_log=False):
+    '''
+    Generator equivalent of traverse_tree for a single node. Rather than
+    recursing, the names of dependencies to traverse are yielded and whether
+    they are operational is sent back in by traverse_tree_iterative. The
+    generator's return value is whether the node is operational.
+    '''
+    if node in state.active_nodes:
+        return True  # Node already found to be operational.
+
+    if state.failed_nodes.get(node) == len(state.inop_nodes):
+        # Node does not depend on a cycle and no further nodes have been found
+        # to be inoperable since it was last traversed, so it will fail again.
+        return False
+
+    successors = [name for name in state.graph[node] if name not in state.inop_nodes]
+
+    if not successors or not operational(node, successors):
+        state.inop_nodes.add(node)
+        return False
+
+    # OPT: Only nodes within a strongly connected component can be revisited
+    # within the current path, avoiding scanning the path for all other nodes.
+    if node in state.cyclic_nodes and node in state.path:
+        # Start of circular dependency. See traverse_tree.
+        successors = [name for name in successors if name not in state.path]
+
+        if not successors or not operational(node, successors):
+            start = state.path.index(node)
+            cycle = tuple(state.path[start:])
+            if cycle in state.cycles:
+                state.inop_nodes.update(cycle)
+            else:
+                state.cycles.add(cycle)
+
+            if dependency_tree_log:
+                state.tree_path.append(state.path + [node, 'CIRCULAR'])
+            logger.debug("Circular dependency avoided at node '%s'. Branch path: %s", node, state.path)
+            return False
+
+    state.path.append(node)
+
+    inop_count = len(state.inop_nodes)
+    operating_dependencies = set()
+    for dependency in successors:
+        if (yield dependency):
+            operating_dependencies.add(dependency)
+
+    state.path.pop()
+
+    if operational(node, operating_dependencies):
+        if node not in state.active_nodes:
+            state.active_nodes.add(node)
+            state.order.append(node)
+        if dependency_tree_log:
+            state.tree_path.append(state.path + [node])
+        return True
+    else:
+        if node in state.acyclic_nodes and len(state.inop_nodes) == inop_count and not dependency_tree_log:
+            # OPT: Traversal of nodes which cannot reach a cycle does not
+            # depend on the path, so they do not need to be traversed again
+            # unless the inoperable nodes change.
+            state.failed_nodes[node] = inop_count
+        if dependency_tree_log:
+            state.tree_path.append(state.path + [node, 'NOT OPERATIONAL'])
+        return False
+
+
+def traverse_tree_iterative(state, operational, node, dependency_tree_log=False):
+    '''
+    Traverse the dependency tree from this node using an explicit stack of
+    _traverse_node generators so that deep trees do not exceed the recursion
+    limit.
+
+    :returns: Whether this node's dependencies are satisfied.
+    :rtype: bool
+    '''
+    stack = [_traverse_node(state, operational, node, dependency_tree_log)]
+    result = None
+    while stack:
+        try:
+            dependency = stack[-1].send(result)
+        except StopIteration as stop:
+            stack.pop()
+            result = stop.value
+        else:
+            # OPT: Avoid creating generators for nodes already evaluated.
+            if dependency in state.active_nodes:
+                result = True
+            elif state.failed_nodes.get(dependency) == len(state.inop_nodes):
+                result = False
+            else:
+                stack.append(_traverse_node(state, operational, dependency, dependency_tree_log))
+                result = None
+    return result
+
+
+def dependencies_iterative(graph, root, node_mgr, dependency_tree_log=False):
+    '''
+    Iterative implementation of dependencies3 which resolves the same
+    processing order.
+
+    - Strongly connected components of the graph are found so that only
+      nodes within a cycle are checked against the current branch path and
+      nodes which cannot reach a cycle are only traversed until they are found
+      to be inoperable.
+    - Results of node_mgr.operational are memoised for each node and set of
+      available dependencies.
+
+    See dependencies3 for a description of the parameters.
+    '''
+    cyclic_nodes = set()
+    for component in nx.strongly_connected_components(graph):
+        if len(component) > 1:
+            cyclic_nodes.update(component)
+    cyclic_nodes.update(nx.nodes_with_selfloops(graph))
+    # Nodes which depend on a node within a cycle.
+    reaches_cycle = set(cyclic_nodes)
+    stack = list(cyclic_nodes)
+    while stack:
+        for predecessor in graph.pred[stack.pop()]:
+            if predecessor not in reaches_cycle:
+                reaches_cycle.add(predecessor)
+                stack.append(predecessor)
+
+    state = types.SimpleNamespace(
+        graph=graph.succ,
+        active_nodes={
+            'HDF Duration',
+            *node_mgr.aircraft_info,
+            *node_mgr.achieved_flight_record,
+            *node_mgr.hdf_keys,
+            *node_mgr.segment_info,
+        },
+        inop_nodes=set(),
+        failed_nodes={},  # {node: len(inop_nodes)} for nodes which cannot reach a cycle
+        cyclic_nodes=cyclic_nodes,
+        acyclic_nodes=set(graph) - reaches_cycle,
+        cycles=set(),
+        order=[],
+        path=[],
+        tree_path=[],
+    )
+
+    results = {}
+
+    def operational(name, available):
+        key = (name, frozenset(available))
+        try:
+            return results[key]
+        except KeyError:
+            result = results[key] = node_mgr.operational(name, available)
+            return result
+
+    for node in state.graph[root]:
+        traverse_tree_iterative(state, operational, node, dependency_tree_log=dependency_tree_log)
+
+    assert not state.path, 'Branch tracking path state not empty!'
+
+    return state.order, state.tree_path
+
+
+DEPENDENCY_RESOLVERS = {
+    'recursive': dependencies3,
+    'iterative': dependencies_iterative,
+}
+
+
 def graph_nodes(node_mgr):
     derived_only = {k: v for k, v in node_mgr.derived_nodes.items() if k not in node_mgr.hdf_keys}
 
@@ -310,10 +489,138 @@ def graph_nodes(node_mgr):
     return graph
 
 
+# In-memory cache of processing orders. {key: (order, gr_st)}
+_DEPENDENCY_ORDER_CACHE = OrderedDict()
+
+
+def _module_fingerprint(module_name):
+    '''
+    Identify the version of a node module from its source file so that cached
+    processing orders are invalidated when node classes change.
+
+    :type module_name: str
+    :rtype: tuple
+    '''
+    module = sys.modules.get(module_name)
+    if module is not None:
+        path = getattr(module, '__file__', None)
+    else:
+        # Modules of LazyNodes (see NODE_MANIFEST_PATH) may not be imported.
+        try:
+            path = importlib.util.find_spec(module_name).origin
+        except (ImportError, AttributeError, ValueError):
+            path = None
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return (module_name,)
+    return module_name, stat.st_mtime_ns, stat.st_size
+
+
+def dependency_order_cache_key(node_mgr):
+    '''
+    Create a fingerprint of everything which determines the processing order:
+    the available parameter and attribute names, requested and required nodes,
+    the node classes and the versions of the modules defining them, and the
+    values of attributes used within can_operate methods.
+
+    :param node_mgr: Node manager to create the key for.
+    :type node_mgr: NodeManager
+    :returns: Hex digest of the fingerprint.
+    :rtype: str
+    '''
+    nodes = sorted(
+        (name, node.__module__, getattr(node, '__qualname__', type(node).__qualname__))
+        for name, node in node_mgr.derived_nodes.items())
+    modules = sorted({module for _, module, _ in nodes})
+    attributes = sorted(
+        (name, repr(attribute.value) if attribute is not None else None)
+        for name, attribute in node_mgr.get_can_operate_attributes().items())
+
+    fingerprint = repr((
+        __version__,
+        sorted(node_mgr.hdf_keys),
+        sorted(node_mgr.requested),
+        sorted(node_mgr.required),
+        sorted(node_mgr.aircraft_info),
+        sorted(node_mgr.achieved_flight_record),
+        sorted(node_mgr.segment_info),
+        nodes,
+        [_module_fingerprint(module) for module in modules],
+        attributes,
+    ))
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+
+def _get_cached_order(key):
+    '''
+    Get a processing order from the in-memory cache falling back to the
+    on-disk cache (settings.DEPENDENCY_ORDER_CACHE_DIR).
+
+    :returns: Processing order and a copy of the spanning tree graph or None.
+    :rtype: (list of strings, nx.DiGraph) or None
+    '''
+    if key in _DEPENDENCY_ORDER_CACHE:
+        _DEPENDENCY_ORDER_CACHE.move_to_end(key)
+        order, gr_st = _DEPENDENCY_ORDER_CACHE[key]
+        return list(order), gr_st.copy()
+
+    if not settings.DEPENDENCY_ORDER_CACHE_DIR:
+        return None
+    path = os.path.join(settings.DEPENDENCY_ORDER_CACHE_DIR, '%s.json' % key)
+    try:
+        with open(path) as fh:
+            data = json.load(fh)
+    except (IOError, OSError, ValueError):
+        return None
+    order, gr_st = data['order'], json_graph.node_link_graph(data['graph'])
+    _set_cached_order(key, order, gr_st, persist=False)
+    return list(order), gr_st.copy()
+
+
+def _set_cached_order(key, order, gr_st, persist=True):
+    '''
+    Store a processing order within the in-memory cache, evicting the least
+    recently used entries beyond settings.DEPENDENCY_ORDER_CACHE_SIZE, and the
+    on-disk cache if settings.DEPENDENCY_ORDER_CACHE_DIR is configured.
+    '''
+    if settings.DEPENDENCY_ORDER_CACHE_SIZE:
+        _DEPENDENCY_ORDER_CACHE[key] = (list(order), gr_st.copy())
+        while len(_DEPENDENCY_ORDER_CACHE) > settings.DEPENDENCY_ORDER_CACHE_SIZE:
+            _DEPENDENCY_ORDER_CACHE.popitem(last=False)
+
+    if not persist or not settings.DEPENDENCY_ORDER_CACHE_DIR:
+        return
+    data = {'order': order, 'graph': json_graph.node_link_data(gr_st)}
+    try:
+        os.makedirs(settings.DEPENDENCY_ORDER_CACHE_DIR, exist_ok=True)
+        # Write to a temporary file first so that concurrent processes never
+        # read a partially written cache file.
+        fd, temp_path = tempfile.mkstemp(dir=settings.DEPENDENCY_ORDER_CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(data, fh)
+        os.replace(temp_path, os.path.join(settings.DEPENDENCY_ORDER_CACHE_DIR, '%s.json' % key))
+    except (IOError, OSError):
+        logger.exception('Unable to store processing order within the dependency order cache.')
+
+
+def clear_dependency_order_cache():
+    '''
+    Clear the in-memory dependency order cache. Files within
+    settings.DEPENDENCY_ORDER_CACHE_DIR are not removed.
+    '''
+    _DEPENDENCY_ORDER_CACHE.clear()
+
+
 def dependency_order(node_mgr, raise_inoperable_requested=False, dependency_tree_log=False):
     """
     Main method for retrieving processing order of nodes.
 
+    Processing orders are cached when settings.DEPENDENCY_ORDER_CACHE_SIZE or
+    settings.DEPENDENCY_ORDER_CACHE_DIR are set, keyed by
+    dependency_order_cache_key, so that repeat flights with the same
+    parameters, attributes and node modules skip building the graph.
+
     :param node_mgr:
     :type node_mgr: NodeManager
     :param draw: Will draw the graph. Green nodes are available LFL params, Blue are operational derived, Black are not requested derived, Red are active top level requested params, Grey are inactive params. Edges are labelled with processing order.
@@ -321,23 +628,36 @@ def dependency_order(node_mgr, raise_inoperable_requested=False, dependency_tree
     :returns: List of Nodes determining the order for processing and the spanning tree graph.
     :rtype: (list of strings, dict)
     """
-    gr_all = graph_nodes(node_mgr)
+    cache_key = cached = gr_all = None
+    if not dependency_tree_log and (settings.DEPENDENCY_ORDER_CACHE_SIZE or settings.DEPENDENCY_ORDER_CACHE_DIR):
+        cache_key = dependency_order_cache_key(node_mgr)
+        cached = _get_cached_order(cache_key)
+
+    if cached:
+        logger.debug("Using cached processing order '%s'.", cache_key)
+        order, gr_st = cached
+    else:
+        gr_all = graph_nodes(node_mgr)
 
-    order, tree_path = dependencies3(gr_all, 'root', node_mgr, dependency_tree_log=dependency_tree_log)
-    logger.debug("Processing order of %d nodes is: %s", len(order), order)
-    if dependency_tree_log:
-        ordered_tree_to_file(tree_path, name=dependency_tree_log)
+        resolver = DEPENDENCY_RESOLVERS[settings.DEPENDENCY_RESOLVER]
+        order, tree_path = resolver(gr_all, 'root', node_mgr, dependency_tree_log=dependency_tree_log)
+        logger.debug("Processing order of %d nodes is: %s", len(order), order)
+        if dependency_tree_log:
+            ordered_tree_to_file(tree_path, name=dependency_tree_log)
 
-    inactive_nodes = set(gr_all.nodes()) - set(order) - set(node_mgr.hdf_keys) - {'root'}
-    logger.debug("Inactive nodes: %s", sorted(inactive_nodes))
-    gr_st = gr_all.copy()
-    gr_st.remove_nodes_from(inactive_nodes)
+        inactive_nodes = set(gr_all.nodes()) - set(order) - set(node_mgr.hdf_keys) - {'root'}
+        logger.debug("Inactive nodes: %s", sorted(inactive_nodes))
+        gr_st = gr_all.copy()
+        gr_st.remove_nodes_from(inactive_nodes)
 
     inoperable_requested = set(node_mgr.requested) - set(order)
     if inoperable_requested:
         logger.warning("Found %s inoperable requested parameters.", len(inoperable_requested))
         if logging.NOTSET < logger.getEffectiveLevel() <= logging.DEBUG:
             # only build this massive tree if in debug!
+            if gr_all is None:
+                gr_all = graph_nodes(node_mgr)
+            inactive_nodes = set(gr_all.nodes()) - set(order) - set(node_mgr.hdf_keys) - {'root'}
             items = []
             for node in inactive_nodes:
                 # add attributes to the node to reflect it's inactivity
@@ -356,4 +676,31 @@ def dependency_order(node_mgr, raise_inoperable_requested=False, dependency_tree
     if required_missing:
         raise RequiredNodesMissing("Required nodes missing: %s" % ', '.join(required_missing))
 
+    if cache_key and not cached:
+        _set_cached_order(cache_key, order, gr_st)
+
     return order, gr_st
+
+
+def dependent_nodes(graph, names):
+    '''
+    Find the nodes which depend upon names, directly or indirectly, within a
+    dependency graph such as the spanning tree stored within the HDF file by
+    process_flight (hdf.dependency_tree).
+
+    :param graph: Graph with edges from each node to its dependencies.
+    :type graph: nx.DiGraph
+    :param names: Node names.
+    :type names: iterable of str
+    :returns: names and the nodes which depend upon them, excluding root.
+    :rtype: set of str
+    '''
+    dependents = set(names)
+    stack = [name for name in dependents if name in graph]
+    while stack:
+        for predecessor in graph.pred[stack.pop()]:
+            if predecessor not in dependents:
+                dependents.add(predecessor)
+                stack.append(predecessor)
+    dependents.discard('root')
+    return dependents
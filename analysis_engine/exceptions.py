@@ -67,5 +67,30 @@ class DataFrameError(Exception):
             % (self.param_name, self.frame_name)
 
 
+class FlightTimeoutError(BaseException):
+    '''
+    Error raised when splitting a data file or processing a flight exceeds the
+    time allowed. Derives from BaseException, as KeyboardInterrupt does, so
+    that it is not handled by nodes which catch Exception.
+    '''
+
+    def __init__(self, path, timeout):
+        '''
+        :param path: Path of the file being split or processed.
+        :type path: string
+        :param timeout: Number of seconds allowed.
+        :type timeout: float
+        '''
+        self.path = path
+        self.timeout = timeout
+        super(FlightTimeoutError, self).__init__(path, timeout)
+
+    def __str__(self):
+        '''
+        Describe the file and the timeout exceeded.
+        '''
+        return "Processing '%s' exceeded the timeout of %s seconds." % (self.path, self.timeout)
+
+
 ################################################################################
 # vim:et:ft=python:nowrap:sts=4:sw=4:ts=4
@@ -16329,8 +16329,7 @@ class RateOfClimbAtHeightBeforeLevelFlight(KeyPointValueNode):
 
         # TODO: Mask vert spd below 0?
         for altitude in self.NAME_VALUES['altitude']:
-            ktis = heights.get(name='%d Ft Before Level Flight Climbing'
-                               % altitude)
+            ktis = heights.get(name_values={'altitude': altitude})
             for kti in ktis:
                 value = value_at_index(vert_spd.array, kti.index)
                 self.create_kpv(kti.index, value,
@@ -16797,8 +16796,7 @@ class RateOfDescentAtHeightBeforeLevelFlight(KeyPointValueNode):
 
         # TODO: Mask vert spd above 0?
         for altitude in self.NAME_VALUES['altitude']:
-            ktis = heights.get(name='%d Ft Before Level Flight Descending'
-                               % altitude)
+            ktis = heights.get(name_values={'altitude': altitude})
             for kti in ktis:
                 value = value_at_index(vert_spd.array, kti.index)
                 self.create_kpv(kti.index, value,
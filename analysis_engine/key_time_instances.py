@@ -26,6 +26,7 @@ from analysis_engine.library import (
     first_valid_sample,
     hysteresis,
     index_at_value,
+    index_at_values,
     is_index_within_slice,
     is_index_within_slices,
     last_valid_sample,
@@ -2091,18 +2092,17 @@ class AltitudeWhenClimbing(KeyTimeInstanceNode):
 
         climbs = list(takeoff) + list(initial_climb) + list(climb)
         climb_slices = slices_remove_small_gaps([c.slice for c in climbs])
+        # Use height above airfield up to the transition altitude and
+        # standard altitudes above.
+        aal_thresholds = [a for a in self.NAME_VALUES['altitude'] if a <= TRANSITION_ALTITUDE]
+        std_thresholds = [a for a in self.NAME_VALUES['altitude'] if a > TRANSITION_ALTITUDE]
         for climb_slice in climb_slices:
+            # Will trigger a single KTI per height (if threshold is crossed)
+            # per climbing phase.
+            indices = dict(zip(aal_thresholds, index_at_values(alt_aal.array, aal_thresholds, climb_slice)))
+            indices.update(zip(std_thresholds, index_at_values(alt_std.array, std_thresholds, climb_slice)))
             for alt_threshold in self.NAME_VALUES['altitude']:
-                # Will trigger a single KTI per height (if threshold is crossed)
-                # per climbing phase.
-                if alt_threshold <= TRANSITION_ALTITUDE:
-                    # Use height above airfield.
-                    alt = alt_aal.array
-                else:
-                    # Use standard altitudes.
-                    alt = alt_std.array
-
-                index = index_at_value(alt, alt_threshold, climb_slice)
+                index = indices[alt_threshold]
                 if index:
                     self.create_kti(index, altitude=alt_threshold)
 
@@ -2119,22 +2119,19 @@ class AltitudeWhenDescending(KeyTimeInstanceNode):
                alt_std=P('Altitude STD Smoothed')):
         alt_aal=repair_mask(alt_aal.array, frequency=alt_aal.frequency, copy=True)
         alt_std=repair_mask(alt_std.array, frequency=alt_std.frequency, copy=True)
+        # Use height above airfield up to the transition altitude and
+        # standard altitudes above.
+        aal_thresholds = [a for a in self.NAME_VALUES['altitude'] if a <= TRANSITION_ALTITUDE]
+        std_thresholds = [a for a in self.NAME_VALUES['altitude'] if a > TRANSITION_ALTITUDE]
         for descend in descending:
+            # Will trigger a single KTI per height (if threshold is crossed)
+            # per descending phase. The altitude array is scanned backwards
+            # to make sure we trap the last instance at each height.
+            _slice = slice(descend.slice.stop, descend.slice.start, -1)
+            indices = dict(zip(aal_thresholds, index_at_values(alt_aal, aal_thresholds, _slice)))
+            indices.update(zip(std_thresholds, index_at_values(alt_std, std_thresholds, _slice)))
             for alt_threshold in self.NAME_VALUES['altitude']:
-                # Will trigger a single KTI per height (if threshold is
-                # crossed) per descending phase. The altitude array is
-                # scanned backwards to make sure we trap the last instance at
-                # each height.
-                if alt_threshold <= TRANSITION_ALTITUDE:
-                    # Use height above airfield.
-                    alt = alt_aal
-                else:
-                    # Use standard altitudes.
-                    alt = alt_std
-
-                index = index_at_value(alt, alt_threshold,
-                                       slice(descend.slice.stop,
-                                             descend.slice.start, -1))
+                index = indices[alt_threshold]
                 if index:
                     self.create_kti(index, altitude=alt_threshold)
 
@@ -2170,11 +2167,10 @@ class AltitudeBeforeLevelFlightWhenClimbing(KeyTimeInstanceNode):
             else:
                 continue  # Must be following a descent
 
-            for height in self.NAME_VALUES['altitude']:
-                index = index_at_value(aal.array, level_height-height,
-                                       _slice=slice(climb_slice.stop,
-                                                    climb_slice.start,
-                                                    -1))
+            heights = self.NAME_VALUES['altitude']
+            indices = index_at_values(aal.array, [level_height-h for h in heights],
+                                      _slice=slice(climb_slice.stop, climb_slice.start, -1))
+            for height, index in zip(heights, indices):
                 if index:
                     self.create_kti(index, replace_values={'altitude': height})
 
@@ -2210,11 +2206,10 @@ class AltitudeBeforeLevelFlightWhenDescending(KeyTimeInstanceNode):
             else:
                 continue  # Must be following a climb
 
-            for height in self.NAME_VALUES['altitude']:
-                index = index_at_value(aal.array, level_height+height,
-                                       _slice=slice(descent_slice.stop,
-                                                    descent_slice.start,
-                                                    -1))
+            heights = self.NAME_VALUES['altitude']
+            indices = index_at_values(aal.array, [level_height+h for h in heights],
+                                      _slice=slice(descent_slice.stop, descent_slice.start, -1))
+            for height, index in zip(heights, indices):
                 if index:
                     self.create_kti(index, replace_values={'altitude': height})
 
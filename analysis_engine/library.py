@@ -4,6 +4,7 @@
 
 from __future__ import print_function
 
+import heapq
 import itertools
 import logging
 import math
@@ -12,14 +13,16 @@ from numpy.ma.extras import _ezclump as ezclump
 import pytz
 
 from builtins import zip
-from collections import OrderedDict, namedtuple
+from collections import namedtuple
 from copy import copy, deepcopy
-from datetime import datetime, timedelta
+from datetime import MAXYEAR, MINYEAR, datetime, timedelta
 from decimal import Decimal
+from functools import lru_cache
 from hashlib import sha256
 from math import ceil, copysign, cos, floor, log, radians, sin, sqrt
 from operator import itemgetter
 from scipy import interpolate as scipy_interpolate, optimize
+from scipy.linalg import solveh_banded
 from scipy.ndimage import filters
 from scipy.signal import medfilt
 from six.moves import zip_longest
@@ -34,6 +37,7 @@ from flightdatautilities.numpy_utils import (
 )
 
 from analysis_engine.settings import (
+    ALIGN_KERNEL_CACHE_SIZE,
     BUMP_HALF_WIDTH,
     HYSTERESIS_FPALT_CCD,
     ILS_CAPTURE,
@@ -415,6 +419,67 @@ def align_args(slave_array, slave_frequency, slave_offset, master_frequency, mas
         else:
             return slave_array
 
+    wm, ws, r, delta = _align_rates(slave_frequency, slave_offset, master_frequency, master_offset)
+
+    # Here we create a masked array to hold the returned values that will have
+    # the same sample rate and timing offset as the master
+    len_aligned = int(len(slave_array) * r)
+    if len_aligned != (len(slave_array) * r):
+        raise ValueError("Array length problem in align. Probable cause is flight cutting not at superframe boundary")
+
+    # Where offsets are equal, the slave_array recorded values remain
+    # unchanged and interpolation is performed between these values.
+    # - and we do not interpolate mapped arrays!
+    if not delta and interpolate and (is_power2(slave_frequency) and
+                                      is_power2(master_frequency)):
+        if master_frequency > slave_frequency:
+            slave_aligned = np.ma.zeros(len_aligned, dtype=_dtype)
+            slave_aligned.mask = True
+            # populate values and interpolate
+            slave_aligned[0::int(r)] = slave_array[0::1]
+            # Interpolate and do not extrapolate masked ends or gaps
+            # bigger than the duration between slave samples (i.e. where
+            # original slave data is masked).
+            # If array is fully masked, return array of masked zeros
+            dur_between_slave_samples = 1.0 / slave_frequency
+            return repair_mask(
+                slave_aligned,
+                copy=False,
+                frequency=master_frequency,
+                repair_duration=dur_between_slave_samples,
+                raise_entirely_masked=False,
+            )
+
+        else:
+            # step through slave taking the required samples
+            return slave_array[0::int(1/r)]
+
+    kernel = _align_kernel(wm, ws, r, delta, len(slave_array), interpolate)
+    slave_aligned = _apply_align_kernel(kernel, slave_array, _dtype)
+
+    if isinstance(original_array, MappedArray) or original_array.dtype.type is np.string_:
+        # return back to mapped array
+        mapped_array = MappedArray(np.ma.zeros(len(slave_aligned)).astype(_dtype), values_mapping=mappings)
+        mapped_array[:] = slave_aligned[:]
+        slave_aligned = mapped_array
+
+    if original_array.dtype.type is np.string_:
+        # return back to string array
+        slave_aligned = mapped_array_to_string_array(slave_aligned)
+
+    return slave_aligned
+
+
+@lru_cache(maxsize=256)
+def _align_rates(slave_frequency, slave_offset, master_frequency, master_offset):
+    '''
+    Validate the frequencies and offsets of an alignment and express them as
+    the number of master and slave samples within each period.
+
+    :returns: Master samples per period, slave samples per period, sample
+        rate ratio and the timing disparity in slave sample intervals.
+    :rtype: (int or float, int or float, float, float)
+    '''
     # Get the sample rates for the two parameters
     wm = master_frequency
     ws = slave_frequency
@@ -444,51 +509,47 @@ def align_args(slave_array, slave_frequency, slave_offset, master_frequency, mas
 
     # Compute the sample rate ratio:
     r = wm / float(ws)
+    return wm, ws, r, delta
 
-    # Here we create a masked array to hold the returned values that will have
-    # the same sample rate and timing offset as the master
-    len_aligned = int(len(slave_array) * r)
-    if len_aligned != (len(slave_array) * r):
-        raise ValueError("Array length problem in align. Probable cause is flight cutting not at superframe boundary")
 
-    slave_aligned = np.ma.zeros(int(len(slave_array) * r), dtype=_dtype)
+AlignKernel = namedtuple('AlignKernel', 'length phases outside')
 
-    # Where offsets are equal, the slave_array recorded values remain
-    # unchanged and interpolation is performed between these values.
-    # - and we do not interpolate mapped arrays!
-    if not delta and interpolate and (is_power2(slave_frequency) and
-                                      is_power2(master_frequency)):
-        slave_aligned.mask = True
-        if master_frequency > slave_frequency:
-            # populate values and interpolate
-            slave_aligned[0::int(r)] = slave_array[0::1]
-            # Interpolate and do not extrapolate masked ends or gaps
-            # bigger than the duration between slave samples (i.e. where
-            # original slave data is masked).
-            # If array is fully masked, return array of masked zeros
-            dur_between_slave_samples = 1.0 / slave_frequency
-            return repair_mask(
-                slave_aligned,
-                copy=False,
-                frequency=master_frequency,
-                repair_duration=dur_between_slave_samples,
-                raise_entirely_masked=False,
-            )
 
-        else:
-            # step through slave taking the required samples
-            return slave_array[0::int(1/r)]
+@lru_cache(maxsize=ALIGN_KERNEL_CACHE_SIZE)
+def _align_kernel(wm, ws, r, delta, length, interpolate):
+    '''
+    Precompute the strides of slave samples either side of each phase of the
+    period and their interpolation coefficients so that aligning is a few
+    strided array operations per phase rather than masked array arithmetic.
+
+    :param wm: Master samples per period.
+    :param ws: Slave samples per period.
+    :param r: Sample rate ratio.
+    :param delta: Timing disparity in slave sample intervals.
+    :param length: Length of the slave array.
+    :param interpolate: Whether to interpolate or take the closest sample.
+    :returns: Length of the aligned array, the aligned, before and after
+        slices with coefficients a and b of each phase, and the indices of
+        aligned samples outside of the slave array.
+    :rtype: AlignKernel
+    '''
     # wm & ws used for indexing from now on ensure they are integars
     wm = int(wm)
     ws = int(ws)
+    if length % ws:
+        raise ValueError("Array length problem in align. Probable cause is flight cutting not at superframe boundary")
+    periods = length // ws
+    phases = []
+    outside = []
     # Each sample in the master parameter may need different combination parameters
     for i in range(wm):
         bracket = (i / r) + delta
         # Interpolate between the hth and (h+1)th samples of the slave array
         h = int(floor(bracket))
-        h1 = h + 1
+        if h < -ws:
+            raise ValueError('Align called with excessive timing mismatch')
 
-        # Compute the linear interpolation coefficients, b & a
+        # Compute the linear interpolation coefficient b of the (h+1)th sample
         b = bracket - h
 
         # Cunningly, if we are interpolating (working with mapped arrays e.g.
@@ -498,46 +559,70 @@ def align_args(slave_array, slave_frequency, slave_offset, master_frequency, mas
         if not interpolate:
             b = py2round(b)
 
-        # Either way, a is the residual part.
-        a = 1 - b
-
-        if h < 0:
-            if h<-ws:
-                raise ValueError('Align called with excessive timing mismatch')
-            # slave_array values do not exist in aligned array
-            if ws==1:
-                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws::ws]
-            else:
-                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws:1-ws:ws]
-            # We can't interpolate the inital values as we are outside the
-            # range of the slave parameters.
-            # Treat ends as "padding"; Value of 0 and Masked.
-            slave_aligned[i] = 0
-            slave_aligned[i] = np.ma.masked
-        elif h1 >= ws:
-            slave_aligned[i:-wm:wm] = a*slave_array[h:-ws:ws] + b*slave_array[h1::ws]
-            # At the other end, we run out of slave parameter values so need to
-            # pad to the end of the array.
-            # Treat ends as "padding"; Value of 0 and Masked.
-            slave_aligned[i-wm] = 0
-            slave_aligned[i-wm] = np.ma.masked
-        else:
-            # Sheer bliss. We can compute slave_aligned across the whole
-            # range of the data without having to take special care at the
-            # ends of the array.
-            slave_aligned[i::wm] = a*slave_array[h::ws] + b*slave_array[h1::ws]
-
-    if isinstance(original_array, MappedArray) or original_array.dtype.type is np.string_:
-        # return back to mapped array
-        mapped_array = MappedArray(np.ma.zeros(len(slave_aligned)).astype(_dtype), values_mapping=mappings)
-        mapped_array[:] = slave_aligned[:]
-        slave_aligned = mapped_array
-
-    if original_array.dtype.type is np.string_:
-        # return back to string array
-        slave_aligned = mapped_array_to_string_array(slave_aligned)
-
-    return slave_aligned
+        # We can't interpolate the initial or final values where we are
+        # outside the range of the slave parameter, so only periods first to
+        # last of this phase are interpolated.
+        first = max(0, -(h // ws))
+        last = min(periods, max(first, (length - 2 - h) // ws + 1))
+        if last > first:
+            phases.append((
+                slice(i + first * wm, i + last * wm, wm),
+                slice(h + first * ws, h + last * ws, ws),
+                slice(h + 1 + first * ws, h + 1 + last * ws, ws),
+                # Either way, a is the residual part. Zero dimensional arrays
+                # combine with the slave data as python floats do within
+                # masked array arithmetic.
+                np.array(1 - b),
+                np.array(b),
+            ))
+        outside.extend(range(i, i + first * wm, wm))
+        outside.extend(range(i + last * wm, periods * wm, wm))
+
+    outside = np.array(sorted(outside), dtype=np.intp)
+    outside.flags.writeable = False
+    return AlignKernel(periods * wm, tuple(phases), outside)
+
+
+def _apply_align_kernel(kernel, slave_array, dtype):
+    '''
+    Align the raw data and mask of slave_array using a kernel from
+    _align_kernel.
+
+    The data beneath masked samples matches the result of masked array
+    arithmetic (a * before + b * after).
+
+    :type kernel: AlignKernel
+    :type slave_array: np.ma.MaskedArray
+    :param dtype: dtype of the aligned array.
+    :rtype: np.ma.MaskedArray
+    '''
+    data = np.ma.getdata(slave_array)
+    mask = np.ma.getmask(slave_array)
+    aligned = np.empty(kernel.length, dtype=np.result_type(np.array(1.0), data.dtype))
+
+    if mask is np.ma.nomask:
+        for aligned_slice, before, after, a, b in kernel.phases:
+            values = a * data[before]
+            values += b * data[after]
+            aligned[aligned_slice] = values
+        if not len(kernel.outside):
+            return np.ma.MaskedArray(aligned.astype(dtype, copy=False))
+        aligned_mask = np.zeros(kernel.length, dtype=bool)
+    else:
+        aligned_mask = np.empty(kernel.length, dtype=bool)
+        for aligned_slice, before, after, a, b in kernel.phases:
+            mask_before = mask[before]
+            weighted_before = a * data[before]
+            values = weighted_before + b * data[after]
+            values_mask = mask_before | mask[after]
+            if values_mask.any():
+                values[values_mask] = np.where(mask_before, a, weighted_before)[values_mask]
+            aligned[aligned_slice] = values
+            aligned_mask[aligned_slice] = values_mask
+
+    aligned[kernel.outside] = 0
+    aligned_mask[kernel.outside] = True
+    return np.ma.MaskedArray(aligned.astype(dtype, copy=False), mask=aligned_mask)
 
 
 def align_slices(slave, master, slices):
@@ -897,20 +982,16 @@ def calculate_timebase(years, months, days, hours, mins, secs):
     :rtype: datetime
     :raises: InvalidDatetime if no valid timestamps provided
     """
-    base_dt = None
     # Calculate current year here and pass into
     # convert_two_digit_to_four_digit_year to save calculating year for every
     # second of flight
     current_year = datetime.utcnow().year
-    # OrderedDict so if all values are the same, max will consistently take the
-    # first val on repeated runs
-    clock_variation = OrderedDict()
 
     if not len(years) == len(months) == len(days) == \
        len(hours) == len(mins) == len(secs):
         raise ValueError("Arrays must be of same length")
 
-    # Fill masked values with negative numbers to speed up iteration
+    # Fill masked values with negative numbers so that they are invalid
     years = np.ma.asanyarray(years).filled(fill_value=-1).astype(int)
     months = np.ma.asanyarray(months).filled(fill_value=-1).astype(int)
     days = np.ma.asanyarray(days).filled(fill_value=-1).astype(int)
@@ -920,38 +1001,32 @@ def calculate_timebase(years, months, days, hours, mins, secs):
 
     convert_two_digit_to_four_digit_year(years, current_year)
 
-    for step, (yr, mth, day, hr, mn, sc) in enumerate(np.stack((years, months, days, hours, mins, secs), axis=-1)):
-        #TODO: Try using numpy datetime functions for speedup?
-        #try:
-            #date = np.datetime64('%d-%d-%d' % (yr, mth, day), 'D')
-        #except np.core._mx_datetime_parser.RangeError  :
-            #continue
-        # same for time?
-        try:
-            dt = datetime(yr, mth, day, hr, mn, sc, tzinfo=pytz.utc)
-        except (ValueError, TypeError):
-            # ValueError is raised if values are out of range, e.g. 0..59.
-            # Q: Should we validate these parameters and switch to fallback_dt
-            #    if it fails?
-            continue
-        if not base_dt:
-            base_dt = dt # store reference datetime
-        # calc diff from base
-        diff = dt - base_dt - timedelta(seconds=step)
-        #print("%02d - %s %s" % (step, dt, diff))
-        try:
-            clock_variation[diff] += 1
-        except KeyError:
-            # new difference
-            clock_variation[diff] = 1
-    if base_dt:
-        # return most regular difference
-        clock_delta = max(clock_variation, key=clock_variation.get)
-        return base_dt + clock_delta
-    else:
+    # OPT: Validate and convert every second with datetime64 arithmetic rather
+    # than creating a datetime for each second. Timestamps are valid where
+    # datetime would accept them.
+    valid = ((MINYEAR <= years) & (years <= MAXYEAR) &
+             (1 <= months) & (months <= 12) &
+             (0 <= hours) & (hours <= 23) &
+             (0 <= mins) & (mins <= 59) &
+             (0 <= secs) & (secs <= 59))
+    month_starts = np.where(valid, (years - 1970) * 12 + months - 1, 0).astype('datetime64[M]')
+    month_days = (month_starts + 1).astype('datetime64[D]') - month_starts.astype('datetime64[D]')
+    valid &= (1 <= days) & (days <= month_days.astype(int))
+    if not valid.any():
         # No valid datestamps found
         raise InvalidDatetime("No valid datestamps found")
 
+    steps = np.flatnonzero(valid)
+    seconds = (month_starts[valid].astype('datetime64[D]').astype(np.int64) + days[valid] - 1) * 86400 + \
+        hours[valid] * 3600 + mins[valid] * 60 + secs[valid]
+    # Timestamp at the start of the array implied by each valid second; the
+    # most common is returned, taking the first to occur if several are
+    # equally common.
+    starts, first_steps, counts = np.unique(seconds - steps, return_index=True, return_counts=True)
+    most_common = counts == counts.max()
+    start = starts[most_common][np.argmin(first_steps[most_common])]
+    return datetime(1970, 1, 1, tzinfo=pytz.utc) + timedelta(seconds=int(start))
+
 
 def convert_two_digit_to_four_digit_year(yr, current_year):
     """
@@ -1341,31 +1416,81 @@ def cycle_finder(array, min_step=0.0, include_ends=True):
             pass # as before.
 
     # This section progressively removes reversals smaller than the step size of
-    # interest, hence the arrays shrink until just the desired answer is left.
+    # interest until just the desired answer is left.
+    return _remove_small_reversals(idxs, vals, min_step)
+
+
+def _remove_small_reversals(idxs, vals, min_step):
+    '''
+    Repeatedly removes the smallest change between turning points while it
+    is less than min_step. Changes at either end are removed with the end
+    turning point, while elsewhere the two turning points either side of the
+    change are removed and the changes either side merged.
+
+    OPT: Rather than finding the smallest change and deleting from the
+    arrays for every reversal removed, which is quadratic in the number of
+    turning points, the changes less than min_step are held in a heap and
+    the turning points within a linked list. The smallest changes are
+    removed in the same order, the earliest first where equal, so the
+    result is identical.
+
+    :param idxs: Indices of the turning points.
+    :type idxs: np.ndarray
+    :param vals: Values of the turning points.
+    :type vals: np.ndarray
+    :param min_step: Minimum step, below which fluctuations will be removed.
+    :type min_step: float
+    :returns: Indices and values of the remaining turning points.
+    :rtype: (np.ndarray, np.ndarray)
+    '''
     dvals = np.ediff1d(vals)
-    while len(dvals) > 0 and np.min(abs(dvals)) < min_step:
-        sort_idx = np.argmin(abs(dvals))
-        last = len(dvals)
-        if sort_idx == 0:
-            idxs = np.delete(idxs, 0)
-            vals = np.delete(vals, 0)
-            dvals = np.delete(dvals, 0)
-        elif sort_idx == last-1:
-            idxs = np.delete(idxs, last)
-            vals = np.delete(vals, last)
-            dvals = np.delete(dvals, last-1) # One fewer dval than val.
-        else:
-            idxs = np.delete(idxs, slice(sort_idx, sort_idx + 2))
-            vals = np.delete(vals, slice(sort_idx, sort_idx + 2))
-            dvals[sort_idx - 1] += dvals[sort_idx] + dvals[sort_idx + 1]
-            dvals = np.delete(dvals, slice(sort_idx, sort_idx + 2))
-    if len(dvals) == 0:
-        # All the changes have disappeared, so return the
-        # single array peak index and value.
-        return idxs, vals
-    else:
+    count = len(dvals)
+    if not count or not np.min(abs(dvals)) < min_step:
+        # Includes changes which are NaN, which stop the reduction.
         return idxs, vals
 
+    # Change k is between turning points k and k + 1, the last turning point
+    # being the tail.
+    diffs = dvals.tolist() if dvals.dtype == np.float64 else list(dvals)
+    heap = [(abs(d), k) for k, d in enumerate(diffs) if abs(d) < min_step]
+    heapq.heapify(heap)
+    prev = list(range(-1, count - 1))
+    next_ = list(range(1, count + 1))
+    next_[-1] = -1
+    removed = np.zeros(count, dtype=bool)
+    keep = np.ones(len(vals), dtype=bool)
+    tail = count
+
+    while heap:
+        step, k = heapq.heappop(heap)
+        if removed[k] or step != abs(diffs[k]):
+            # Superseded by a merge.
+            continue
+        p, n = prev[k], next_[k]
+        removed[k] = True
+        if p == -1:
+            keep[k] = False
+            if n != -1:
+                prev[n] = -1
+        elif n == -1:
+            keep[tail] = False
+            tail = k
+            next_[p] = -1
+        else:
+            keep[k] = keep[n] = False
+            removed[n] = True
+            diffs[p] += diffs[k] + diffs[n]
+            n = next_[n]
+            next_[p] = n
+            if n != -1:
+                prev[n] = p
+            merged = abs(diffs[p])
+            if merged != merged:
+                break
+            if merged < min_step:
+                heapq.heappush(heap, (merged, p))
+    return idxs[keep], vals[keep]
+
 
 def cycle_match(idx, cycle_idxs, dist=None):
     '''
@@ -1417,6 +1542,50 @@ def datetime_of_index(start_datetime, index, frequency=1):
     return (start_datetime or 0) + offset
 
 
+def _timedelta_microseconds(seconds):
+    '''
+    Rounds seconds to whole microseconds as timedelta(seconds=...) does: the
+    fraction of a microsecond is rounded half to even.
+
+    :type seconds: np.ndarray of float
+    :rtype: np.ndarray of np.int64
+    '''
+    intpart = np.trunc(seconds)
+    scaled = (seconds - intpart) * 1e6
+    whole = np.trunc(scaled)
+    leftover = scaled - whole
+    microseconds = intpart.astype(np.int64) * 1000000 + whole.astype(np.int64)
+    rounded = np.round(leftover)
+    half = np.abs(rounded - leftover) == 0.5
+    if half.any():
+        odd = microseconds[half] & 1
+        rounded[half] = 2.0 * np.round((leftover[half] + odd) * 0.5) - odd
+    return microseconds + rounded.astype(np.int64)
+
+
+def datetimes_of_indices(start_datetime, indices, frequency=1):
+    '''
+    Returns the datetimes of many indices within the flight at once, as
+    datetime_of_index.
+
+    :param start_datetime: Start datetime of the flight available as the 'Start Datetime' attribute.
+    :type start_datetime: datetime
+    :param indices: Indices within the flight.
+    :type indices: list or np.ndarray of int or float
+    :param frequency: Frequency of the indices.
+    :type frequency: int or float
+    :returns: Datetimes at indices.
+    :rtype: [datetime]
+    '''
+    seconds = np.asarray(indices, dtype=float) / frequency
+    if not np.all(np.abs(seconds) < 1e12):
+        # NaN, infinite or out of range indices raise as within timedelta.
+        return [datetime_of_index(start_datetime, s) for s in seconds.tolist()]
+    # OPT: NumPy creates the timedeltas rather than converting each index.
+    offsets = _timedelta_microseconds(seconds).astype('m8[us]').astype(object)
+    return [start_datetime + offset for offset in offsets.tolist()]
+
+
 def delay(array, period, hz=1.0):
     '''
     This function introduces a time delay. Used in validation testing where
@@ -3057,42 +3226,96 @@ def hysteresis(array, hysteresis):
         return array
 
     quarter_range = hysteresis / 4.0
-    # Length is going to be used often, so prepare here:
-    length = len(array)
-    half_done = np.zeros(length)
-    result = np.zeros(length)
-    length = length-1 #  To be used for array indexing next
+    result = np.zeros(len(array))
 
     # get a list of the unmasked data - allow for array.mask = False (not an array)
     if array.mask is np.False_:
-        notmasked = np.arange(length+1)
+        notmasked = np.arange(len(array))
     else:
         notmasked = np.ma.where(~array.mask)[0]
+    values = np.ma.getdata(array)[notmasked].astype(float)
     # The starting point for the computation is the first notmasked sample.
-    old = array[notmasked[0]]
-    for index in notmasked:
-        new = array[index]
-
-        if new - old > quarter_range:
-            old = new  - quarter_range
-        elif new - old < -quarter_range:
-            old = new + quarter_range
-        half_done[index] = old
-
+    half_done = _hysteresis_pass(values, values[0], quarter_range)
     # Repeat the process in the "backwards" sense to remove phase effects.
-    for index in notmasked[::-1]:
-        new = half_done[index]
-        if new - old > quarter_range:
-            old = new  - quarter_range
-        elif new - old < -quarter_range:
-            old = new + quarter_range
-        result[index] = old
+    result[notmasked] = _hysteresis_pass(half_done[::-1], half_done[-1], quarter_range)[::-1]
 
     # At the end of the process we reinstate the mask, although the data
     # values may have affected the result.
     return np.ma.array(result, mask=array.mask)
 
 
+def _hysteresis_pass(values, initial, quarter_range):
+    '''
+    Apply hysteresis to values in one direction, where the output follows
+    each value once it moves further than quarter_range away, starting from
+    initial.
+
+    OPT: Rather than stepping through each value, the output is found by
+    clamping initial between the composed bounds of each value either side of
+    quarter_range. Where the clamp differs from comparing the rounded
+    difference with quarter_range the output is corrected and the remaining
+    values clamped again, which is rarely necessary.
+
+    :type values: np.ndarray
+    :type initial: float
+    :type quarter_range: float
+    :rtype: np.ndarray
+    '''
+    result = np.empty_like(values)
+    lower = values - quarter_range
+    upper = values + quarter_range
+    # Changes are not detected when comparing with NaN.
+    unbounded = np.isnan(values)
+    start = 0
+    while start < len(values):
+        scan_lower = np.where(unbounded[start:], -np.inf, lower[start:])
+        scan_upper = np.where(unbounded[start:], np.inf, upper[start:])
+        _clamp_scan(scan_lower, scan_upper)
+        result[start:] = np.minimum(np.maximum(initial, scan_lower), scan_upper)
+        previous = np.concatenate(([initial], result[start:-1]))
+        difference = values[start:] - previous
+        expected = np.where(difference > quarter_range, lower[start:],
+                            np.where(difference < -quarter_range, upper[start:], previous))
+        differs = np.flatnonzero((expected != result[start:]) &
+                                 ~(np.isnan(expected) & np.isnan(result[start:])))
+        if not len(differs):
+            break
+        index = start + differs[0]
+        result[index] = initial = expected[differs[0]]
+        start = index + 1
+    return result
+
+
+def _clamp_scan(lower, upper, span=None):
+    '''
+    Compose consecutive clamps in-place with a parallel prefix scan so that
+    clamping a value between lower[i] and upper[i] afterwards is the same as
+    clamping it between each of lower[:i + 1] and upper[:i + 1] in turn. A
+    clamp where lower equals upper resets the value, unless the bounds before
+    it are NaN.
+
+    :param lower: Lower bound of each clamp, not greater than upper.
+    :type lower: np.ndarray
+    :param upper: Upper bound of each clamp.
+    :type upper: np.ndarray
+    :param span: Number of consecutive clamps which need to be composed, e.g.
+        the longest run between resets. Defaults to all of them.
+    :type span: int or None
+    '''
+    span = len(lower) if span is None else span
+    step = 1
+    while step < span:
+        later_lower = lower[step:]
+        later_upper = upper[step:]
+        composed_lower = np.maximum(lower[:-step], later_lower)
+        np.minimum(composed_lower, later_upper, out=composed_lower)
+        composed_upper = np.maximum(upper[:-step], later_lower)
+        np.minimum(composed_upper, later_upper, out=composed_upper)
+        lower[step:] = composed_lower
+        upper[step:] = composed_upper
+        step *= 2
+
+
 def ils_established(array, _slice, hz, point='established'):
     '''
     Helper function for ILS established computations
@@ -5968,57 +6191,92 @@ def repair_mask(array, frequency=1, repair_duration=REPAIR_DURATION,
     if copy:
         array = array.copy()
 
+    # OPT: Find the start and stop of every masked section at once rather
+    # than repairing each section of np.ma.clump_masked within a loop.
+    edges = np.diff(np.concatenate(([0], array.mask.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+
     if repair_duration is not None:
         repair_samples = repair_duration * frequency
-    else:
-        repair_samples = None
+        too_long = (stops - starts) > repair_samples
+        if raise_duration_exceedance and too_long.any():
+            # Sections before the first which is too long are repaired
+            # before raising.
+            first = np.argmax(too_long)
+            _repair_masked_sections(array, starts[:first], stops[:first], extrapolate,
+                                    repair_above, method)
+            length = stops[first] - starts[first]
+            raise ValueError("Length of masked section '%s' exceeds "
+                             "repair duration '%s'." % (length * frequency,
+                                                        repair_duration))
+        starts = starts[~too_long]
+        stops = stops[~too_long]
+
+    _repair_masked_sections(array, starts, stops, extrapolate, repair_above, method)
+    return array
 
-    masked_sections = np.ma.clump_masked(array)
 
-    for section in masked_sections:
-        length = section.stop - section.start
-        if repair_samples is not None and length > repair_samples:
-            if raise_duration_exceedance:
-                raise ValueError("Length of masked section '%s' exceeds "
-                                 "repair duration '%s'." % (length * frequency,
-                                                            repair_duration))
-            else:
-                continue # Too long to repair
-        elif section.start == 0:
-            if extrapolate or method == 'fill_stop':
-                # TODO: Does it make sense to subtract 1 from the section stop??
-                #array.data[section] = array.data[section.stop - 1]
-                array[section] = array[section.stop]
-            else:
-                continue # Can't interpolate if we don't know the first sample
-
-        elif section.stop == len(array):
-            if extrapolate or method == 'fill_start':
-                array[section] = array[section.start - 1]
-            else:
-                continue # Can't interpolate if we don't know the last sample
+def _repair_masked_sections(array, starts, stops, extrapolate, repair_above, method):
+    '''
+    Repair masked sections of array in-place for repair_mask.
 
+    :param starts: Start index of each masked section.
+    :type starts: np.ndarray
+    :param stops: Stop index of each masked section.
+    :type stops: np.ndarray
+    '''
+    if not len(starts):
+        return
+    data = array.data
+    if starts[0] == 0:
+        if extrapolate or method == 'fill_stop':
+            array[:stops[0]] = data[stops[0]]
+        # Can't interpolate if we don't know the first sample
+        starts = starts[1:]
+        stops = stops[1:]
+    if len(starts) and stops[-1] == len(array):
+        last = starts[-1]
+        starts = starts[:-1]
+        stops = stops[:-1]
+    else:
+        last = None
+
+    if len(starts):
+        start_values = data[starts - 1]
+        stop_values = data[stops]
+        if method == 'interpolate':
+            if repair_above is not None:
+                repaired = (start_values > repair_above) & (stop_values > repair_above)
+                starts, stops = starts[repaired], stops[repaired]
+                start_values, stop_values = start_values[repaired], stop_values[repaired]
+        elif method not in ('fill_start', 'fill_stop'):
+            raise NotImplementedError('Repair method %s not implemented.',
+                                      method)
+        lengths = stops - starts
+        # Index of every masked sample and its position within its section.
+        offsets = np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+        indices = np.arange(lengths.sum()) - offsets
+        if method == 'interpolate':
+            # Evaluated as np.linspace(start_value, stop_value, length + 2)
+            # is, i.e. in at least double precision before being cast back to
+            # the dtype of the array, so that the repaired values are
+            # unchanged.
+            dtype = np.result_type(data.dtype, float)
+            start_values = start_values.astype(dtype)
+            steps = (stop_values.astype(dtype) - start_values) / (lengths + 1).astype(dtype)
+            values = (indices - np.repeat(starts - 1, lengths)).astype(dtype)
+            values *= np.repeat(steps, lengths)
+            values += np.repeat(start_values, lengths)
+            data[indices] = values
+            array.mask[indices] = False
+        elif method == 'fill_start':
+            array[indices] = np.repeat(start_values, lengths)
         else:
-            start_value = array[section.start - 1]
-            stop_value = array[section.stop]
-            if method == 'interpolate':
-                if (repair_above is None or
-                    (start_value > repair_above and stop_value > repair_above)):
-                    # XXX: Find neater solution, potentially
-                    # scipy.interpolate.InterpolatedUnivariateSpline, as
-                    # optimisation.
-                    array.data[section] = np.linspace(start_value, stop_value,
-                                                      length+2)[1:-1]
-                    array.mask[section] = False
-            elif method == 'fill_start':
-                array[section] = start_value
-            elif method == 'fill_stop':
-                array[section] = stop_value
-            else:
-                raise NotImplementedError('Repair method %s not implemented.',
-                                          method)
+            array[indices] = np.repeat(stop_values, lengths)
 
-    return array
+    if last is not None and (extrapolate or method == 'fill_start'):
+        array[last:] = data[last - 1]
 
 
 def resample(array, orig_hz, resample_hz):
@@ -7298,6 +7556,28 @@ def track_linking(pos, local_pos):
     return local_pos
 
 
+def smooth_track_weight(ac_type, hz):
+    '''
+    Weight of the errors from a straight line relative to the errors from the
+    recorded data within the smooth_track cost function.
+
+    :param ac_type: Aircraft Type attribute, or None.
+    :param hz: Sample rate of the latitude and longitude.
+    :type hz: float
+    :rtype: int
+    '''
+    if ac_type and ac_type.value=='helicopter':
+        return 100 # As helicopters fly more slowly so we don't need such smoothing.
+    elif hz == 1.0:
+        return 1000
+    elif hz == 0.5:
+        return 300
+    elif hz == 0.25:
+        return 100
+    else:
+        raise ValueError('Lat/Lon sample rate not recognised in smooth_track_cost_function.')
+
+
 def smooth_track_cost_function(lat_s, lon_s, lat, lon, ac_type, hz):
     # Summing the errors from the recorded data is easy.
     from_data = np.sum((lat_s - lat)**2)+np.sum((lon_s - lon)**2)
@@ -7307,16 +7587,7 @@ def smooth_track_cost_function(lat_s, lon_s, lat, lon, ac_type, hz):
     from_straight = np.sum(np.convolve(lat_s,slider,'valid')**2) + \
         np.sum(np.convolve(lon_s,slider,'valid')**2)
 
-    if ac_type and ac_type.value=='helicopter':
-        weight = 100 # As helicopters fly more slowly so we don't need such smoothing.
-    elif hz == 1.0:
-        weight = 1000
-    elif hz == 0.5:
-        weight = 300
-    elif hz == 0.25:
-        weight = 100
-    else:
-        raise ValueError('Lat/Lon sample rate not recognised in smooth_track_cost_function.')
+    weight = smooth_track_weight(ac_type, hz)
 
     cost = from_data + weight*from_straight
     return cost
@@ -7387,41 +7658,50 @@ def smooth_track(lat, lon, ac_type, hz):
     hz = sample rate
 
     Returns:
-    lat_last = Optimised latitude array
-    lon_last = optimised longitude array
+    lat_s = Optimised latitude array
+    lon_s = optimised longitude array
     Cost = cost function, used for testing satisfactory convergence.
     """
 
     if len(lat) <= 5:
         return lat, lon, 0.0 # Polite return of data too short to smooth.
 
+    weight = smooth_track_weight(ac_type, hz)
+
+    # OPT: The cost function is quadratic, so rather than iterating a
+    # smoothing filter until the cost stops falling, which takes thousands of
+    # iterations for long tracks, we solve for its minimum directly. The first
+    # and last two samples are held at their recorded values, as the filter
+    # left them unchanged. Setting the gradient to zero for the remaining
+    # samples gives (I + weight * D'D) s = x - weight * D'D e, where D takes
+    # the second differences and e holds the fixed end samples, a symmetric
+    # positive definite banded matrix with two diagonals either side which is
+    # solved in linear time.
+    data = np.column_stack((np.ma.getdata(lat), np.ma.getdata(lon))).astype(float)
+    ends = data.copy()
+    ends[2:-2] = 0
+    slider = np.array([1, -2, 1])
+    for column in range(2):
+        ends[:, column] = np.convolve(np.convolve(ends[:, column], slider, 'valid'),
+                                      slider, 'full')
+    n = len(lat) - 4
+    bands = np.zeros((3, n))
+    bands[0, 2:] = weight
+    bands[1, 1:] = -4 * weight
+    bands[2] = 6 * weight + 1
+    smoothed = data.copy()
+    smoothed[2:-2] = solveh_banded(bands, data[2:-2] - weight * ends[2:-2])
+
     lat_s = np.ma.copy(lat)
     lon_s = np.ma.copy(lon)
+    lat_s.data[:] = smoothed[:, 0]
+    lon_s.data[:] = smoothed[:, 1]
 
-    # Set up a weighted array that will slide past the data.
-    r = 0.7
-    # Values of r alter the speed to converge; 0.7 seems best.
-    slider = np.ma.ones(5)*r/4
-    slider[2] = 1-r
-
-    cost_0 = float('inf')
     cost = smooth_track_cost_function(lat_s, lon_s, lat, lon, ac_type, hz)
-
-    while cost < cost_0:  # Iterate to an optimal solution.
-        lat_last = np.ma.copy(lat_s)
-        lon_last = np.ma.copy(lon_s)
-
-        # Straighten out the middle of the arrays, leaving the ends unchanged.
-        lat_s.data[2:-2] = np.convolve(lat_last,slider,'valid')
-        lon_s.data[2:-2] = np.convolve(lon_last,slider,'valid')
-
-        cost_0 = cost
-        cost = smooth_track_cost_function(lat_s, lon_s, lat, lon, ac_type, hz)
-
     if cost>0.1:
         logger.warning("Smooth Track Cost Function closed with cost %f.3",cost)
 
-    return lat_last, lon_last, cost_0
+    return lat_s, lon_s, cost
 
 def straighten_altitudes(fine_array, coarse_array, limit, copy=False):
     '''
@@ -7861,6 +8141,110 @@ def index_at_value(array, threshold, _slice=slice(None), endpoint='exact'):
     return (begin + step * (n + r))
 
 
+def index_at_values(array, thresholds, _slice=slice(None), endpoint='exact'):
+    '''
+    Seek the moment when the parameter first crosses each of a number of
+    thresholds within the same slice, returning the same indices as calling
+    index_at_value for each threshold in turn.
+
+    Within each run of unmasked samples, the values crossed by the data so
+    far are bounded by the running minimum and maximum from the start of the
+    run, so the first crossing of every threshold is found with a binary
+    search rather than scanning the slice once per threshold. Thresholds
+    which are not crossed are passed to index_at_value so that the
+    'closing', 'first_closing' and 'nearest' endpoints behave as before.
+
+    :param array: input data
+    :type array: masked array
+    :param thresholds: values that we expect the array to cross in this slice.
+    :type thresholds: iterable of float
+    :param _slice: slice where we want to seek the threshold transits. To scan
+        backwards pass in a slice with a negative step.
+    :type _slice: slice
+    :param endpoint: type of end condition being sought, see index_at_value.
+    :type endpoint: str
+    :returns: interpolated index where the array first crossed each threshold
+        in the order of thresholds, or None where not found.
+    :rtype: [float or None]
+    '''
+    assert endpoint in ['exact', 'closing', 'nearest', 'first_closing']
+    thresholds = list(thresholds)
+    step = _slice.step or 1
+    max_index = len(array)
+
+    # OPT: Only the well defined scans are handled here, index_at_value
+    # handles slices outside of the array and non-finite data.
+    data = None
+    if step == 1:
+        begin = max(int(py2round(_slice.start or 0)), 0)
+        end = min(int(py2round(_slice.stop or max_index)), max_index)
+        if end - begin >= 2:
+            data = array[begin:end]
+    elif step == -1:
+        begin = min(int(py2round(_slice.start or max_index-1)), max_index-1)
+        end = None if _slice.stop is None else max(int(_slice.stop), 0)
+        if begin >= 1 and (end is None or begin - end >= 2):
+            data = array[begin:end:-1]
+
+    results = [None] * len(thresholds)
+    # Masked thresholds, e.g. the median of a masked section, are left to
+    # index_at_value.
+    masked = [t for t, threshold in enumerate(thresholds) if threshold is np.ma.masked]
+    unresolved = np.array([t for t in range(len(thresholds)) if t not in masked], dtype=int)
+    scanned = False
+    if data is not None and thresholds and \
+       not (_slice.stop == _slice.start and _slice.start is not None):
+        mask = np.ma.getmaskarray(data)
+        values = np.ma.getdata(data)
+        if values.dtype.kind in 'iuf' and np.isfinite(values[~mask]).all():
+            scanned = True
+            targets = np.zeros(len(thresholds))
+            targets[unresolved] = [thresholds[t] for t in unresolved]
+            # Pairs of samples which are both unmasked form runs, the run
+            # of pairs [start, stop) spanning samples start to stop.
+            valid = ~(mask[:-1] | mask[1:])
+            edges = np.diff(np.concatenate(([0], valid.view(np.int8), [0])))
+            starts = np.flatnonzero(edges == 1)
+            stops = np.flatnonzero(edges == -1)
+            for start, stop in zip(starts, stops):
+                run = values[start:stop + 1]
+                highest = np.maximum.accumulate(run)
+                lowest = np.minimum.accumulate(run)
+                pending = targets[unresolved]
+                within = (pending >= lowest[-1]) & (pending <= highest[-1])
+                if not within.any():
+                    continue
+                pending = pending[within]
+                # The first sample reaching the threshold closes the pair
+                # which crosses it, unless the run starts at the threshold.
+                rising = pending >= run[0]
+                samples = np.where(rising,
+                                   np.searchsorted(highest, pending),
+                                   np.searchsorted(-lowest, -pending))
+                for t, sample in zip(unresolved[within], samples):
+                    n = start + max(sample - 1, 0)
+                    a = data[n]
+                    b = data[n + 1]
+                    if a == b:
+                        r = 0.5
+                    else:
+                        r = (float(thresholds[t]) - a) / (b - a)
+                    results[t] = begin + step * (n + r)
+                unresolved = unresolved[~within]
+                if not len(unresolved):
+                    break
+
+    if scanned and endpoint == 'exact':
+        # The remaining thresholds are not crossed within the slice.
+        unresolved = masked
+    else:
+        unresolved = masked + list(unresolved)
+    for t in unresolved:
+        results[t] = index_at_value(array, thresholds[t], _slice=_slice,
+                                    endpoint=endpoint)
+    return results
+
+
 def indices_at_value(array, value):
     '''
     Find all the indices where array equals or crosses value.
@@ -8069,7 +8453,8 @@ def value_at_index(array, index, interpolate=True):
             low_value = array.data[low]
             high_value = array.data[high]
             # Crude handling of masked values. TODO: Must be a better way !
-            if array.mask.any(): # An element is masked
+            # OPT: Avoid scanning the whole mask with array.mask.any().
+            if np.ma.getmask(array) is not np.ma.nomask:
                 if array.mask[low]:
                     if array.mask[high]:
                         return None
@@ -8094,6 +8479,81 @@ def value_at_index(array, index, interpolate=True):
         return r * high_value + (1 - r) * low_value
 
 
+def values_at_indices(array, indices, interpolate=True):
+    '''
+    Finds the values of the data in array at many indices at once, handling
+    masked samples, fractional indices and indices outside of the array in
+    the same way as value_at_index.
+
+    :param array: input data
+    :type array: masked array
+    :param indices: indices into the array where we want to find the array
+        values. None is treated as an index before the start of the array.
+    :type indices: list or np.ndarray of float
+    :param interpolate: whether to interpolate the values at float indices.
+    :type interpolate: boolean
+    :returns: values from the array, masked where value_at_index would return
+        None or a masked value. States are returned for multi-state arrays.
+    :rtype: np.ma.masked_array
+    '''
+    if isinstance(array, MappedArray):
+        # States cannot be interpolated within the raw values, so source each
+        # state as value_at_index does, e.g. the nearest sample when not
+        # interpolating.
+        values = [value_at_index(array, index, interpolate=interpolate)
+                  for index in indices]
+        mask = [value is None or value is np.ma.masked for value in values]
+        return np.ma.array(
+            [None if masked else value for value, masked in zip(values, mask)],
+            mask=mask, dtype=object)
+    if not isinstance(indices, np.ndarray):
+        indices = [-1 if index is None else index for index in indices]
+    # Samples outside the array boundaries take the first or last value.
+    indices = np.clip(np.asarray(indices, dtype=float), 0, len(array) - 1)
+    data = np.ma.getdata(array)
+    mask = np.ma.getmaskarray(array)
+
+    low = indices.astype(int)
+    high = np.minimum(low + 1, len(array) - 1)
+    r = indices - low
+    low_value = data[low]
+    high_value = data[high]
+    if interpolate:
+        values = r * high_value + (1 - r) * low_value
+    else:
+        values = data[(indices + 0.5).astype(int)]
+    # Where one of the samples either side is masked, take the other.
+    low_masked = mask[low]
+    high_masked = mask[high]
+    values = np.where(low_masked, high_value, np.where(high_masked, low_value, values))
+    exact = r == 0
+    values = np.where(exact, low_value, values)
+    return np.ma.array(values, mask=np.where(exact, low_masked, low_masked & high_masked))
+
+
+def values_at_times(array, hz, offset, time_indices):
+    '''
+    Finds the values of the data in array at many times at once, as
+    value_at_time.
+
+    :param array: input data
+    :type array: masked array
+    :param hz: sample rate for the input data (sec-1)
+    :type hz: float
+    :param offset: fdr offset for the array (sec)
+    :type offset: float
+    :param time_indices: times into the array where we want to find the
+        array values.
+    :type time_indices: list or np.ndarray of float
+    :returns: interpolated values from the array
+    :rtype: np.ma.masked_array
+    '''
+    # Timedelta truncates to 6 digits, therefore round offset down.
+    time_into_array = np.asarray(time_indices, dtype=float) - round(offset - 0.0000005, 6)
+    # Overruns which arise from compensation for timing offsets are clipped
+    # by values_at_indices.
+    return values_at_indices(array, time_into_array * hz)
+
 def vstack_params(*params):
     '''
     Create a multi-dimensional masked array with a dimension per param.
@@ -8217,51 +8677,70 @@ def second_window(array, frequency, seconds, extend_window=False):
         # Array size is less than the window sample size.
         return window_array
 
-    # Make a view of a sliding window using a different stride.
-    # For 3 samples, the array [1, 2, 3, 4, 5, 6, 7, 8, 9] will become
-    # [[1, 2, 3],
-    #  [2, 3, 4],
-    #  [3, 4, 5],
-    #  [4, 5, 6],
-    #  [5, 6, 7],
-    #  [6, 7, 8],
-    #  [7, 8, 9]]
-
-    sliding_window = np.lib.stride_tricks.as_strided(
-        array, shape=(len(array) - samples, samples + 1),
-        strides=array.strides * 2)
-
-    # Calculate min and max over the last axis (for each sliding window)
-    # Optimization: convert array to list for indexing (161 ms -> 124 ms)
-    min_ = np.min(sliding_window, axis=-1).tolist()
-    max_ = np.max(sliding_window, axis=-1).tolist()
-
-    unmasked_slices = np.ma.clump_unmasked(array)
-
-    # Optimization: local namespace (17 ms -> 6 ms)
-    window_array_data = window_array.data
-
-    for unmasked_slice in filter_slices_length(unmasked_slices, samples):
-        start = unmasked_slice.start
-        last_value = array[start]
-        window_stop = unmasked_slice.stop - samples
-        # We set already the mask to False where we are going to insert
-        # values. That is from start up to stop-sample_idx
-        # Much faster than setting the value in the masked array item by item
-        window_array.mask[start:window_stop] = False
-        for idx in range(start, window_stop):
-            # Clip the last value between sliding window min and max
-            last_value = min(max(last_value, min_[idx]), max_[idx])
-            # Set this value in the data object of the masked array.
-            # Much faster than using window_array[start+i] = last_value
-            window_array_data[idx] = last_value
+    data = np.ma.getdata(array)
+    width = samples + 1
+    length = len(array) - samples
+    if data.dtype.kind in 'iuf' and not np.isnan(data).any():
+        # OPT: Sliding minimum and maximum in linear time rather than
+        # reducing a view of every window.
+        lower = filters.minimum_filter1d(data, width)[width // 2:width // 2 + length]
+        upper = filters.maximum_filter1d(data, width)[width // 2:width // 2 + length]
+    else:
+        # Make a view of a sliding window using a different stride.
+        # For 3 samples, the array [1, 2, 3, 4, 5, 6, 7, 8, 9] will become
+        # [[1, 2, 3],
+        #  [2, 3, 4],
+        #  [3, 4, 5],
+        #  [4, 5, 6],
+        #  [5, 6, 7],
+        #  [6, 7, 8],
+        #  [7, 8, 9]]
+        sliding_window = np.lib.stride_tricks.as_strided(
+            data, shape=(length, width), strides=data.strides * 2)
+        # Calculate min and max over the last axis (for each sliding window)
+        lower = np.min(sliding_window, axis=-1)
+        upper = np.max(sliding_window, axis=-1)
+        if lower.dtype.kind == 'f':
+            # Windows including NaN do not clamp the value.
+            lower[np.isnan(lower)] = -np.inf
+            upper[np.isnan(upper)] = np.inf
+
+    # Each unmasked section longer than the window starts from its first
+    # value, clipped between the first window's min and max.
+    edges = np.diff(np.concatenate(([0], (~np.ma.getmaskarray(array)).view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1) - samples
+    longer = stops > starts
+    starts = starts[longer]
+    stops = stops[longer]
+    if not len(starts):
+        return window_array
 
-    '''
-    import matplotlib.pyplot as plt
-    plt.plot(array)
-    plt.plot(window_array)
-    plt.show()
-    '''
+    # OPT: Clip the last value between each sliding window's min and max by
+    # composing the clips of each section with a prefix scan rather than a
+    # loop over every sample.
+    first_values = np.minimum(np.maximum(data[starts], lower[starts]), upper[starts])
+    # Sections starting with NaN remain NaN as NaN is never clipped. They
+    # start from zero within the scan so that NaN does not pass into the
+    # following sections, and are restored afterwards.
+    nan_starts = np.isnan(first_values) if first_values.dtype.kind == 'f' else None
+    if nan_starts is not None and nan_starts.any():
+        first_values[nan_starts] = 0
+    else:
+        nan_starts = None
+    lower[starts] = first_values
+    upper[starts] = first_values
+    _clamp_scan(lower, upper, span=np.max(stops - starts))
+
+    sections = np.zeros(length + 1, dtype=int)
+    sections[starts] += 1
+    sections[stops] -= 1
+    within = np.flatnonzero(np.cumsum(sections[:-1]))
+    window_array.data[within] = lower[within]
+    window_array.mask[within] = False
+    if nan_starts is not None:
+        for start, stop in zip(starts[nan_starts], stops[nan_starts]):
+            window_array.data[start:stop] = np.nan
 
     return window_array
 
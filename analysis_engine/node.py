@@ -1,9 +1,12 @@
+import ast
 import copy
 try:
     import cPickle
 except ImportError:
     import _pickle as cPickle
 import gzip
+import hashlib
+import importlib
 import inspect
 import logging
 import math
@@ -11,13 +14,19 @@ import numpy as np
 import pprint
 import re
 import six
+import sys
+import threading
+import weakref
 
 from abc import ABCMeta
-from collections import namedtuple, OrderedDict
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque, namedtuple, OrderedDict
 from collections.abc import Iterable
 from functools import total_ordering
 from itertools import product
 from operator import attrgetter
+from time import perf_counter
+from types import MemberDescriptorType
 
 from analysis_engine.library import (
     align,
@@ -37,8 +46,8 @@ from analysis_engine.library import (
     slices_between,
     slices_from_to,
     slices_remove_small_gaps,
-    value_at_index,
-    value_at_time,
+    values_at_indices,
+    values_at_times,
 )
 from analysis_engine.recordtype import recordtype
 from analysis_engine.settings import NODE_CACHE_OFFSET_DP
@@ -50,18 +59,156 @@ from flightdatautilities.numpy_utils import slices_int
 
 logger = logging.getLogger(name=__name__)
 
+# Fields of KPVs, KTIs and approaches held by sorted lookups.
+_ITEM_KEY_FIELDS = frozenset(('index', 'name', 'slice', 'type'))
+
+
+def _set_item_field(item, field, value):
+    '''
+    Sets a field of a KPV, KTI or approach, discarding the sorted lookups of
+    the lists holding the item if it is the index, name, slice or type.
+    '''
+    object.__setattr__(item, field, value)
+    if field in _ITEM_KEY_FIELDS:
+        refs = getattr(item, '_indexed_lists', None)
+        if refs:
+            # The lists register the item again when rebuilding lookups.
+            object.__setattr__(item, '_indexed_lists', None)
+            for ref in refs:
+                indexed_list = ref()
+                if indexed_list is not None:
+                    indexed_list._modified()
+
+
+def _item_recordtype(typename, field_names, **kwargs):
+    '''
+    Creates a recordtype whose items discard the sorted lookups holding them
+    when their index, name, slice or type is reassigned. The lists whose
+    lookups hold an item are weakly referenced by its _indexed_lists slot,
+    which is neither pickled nor copied. Fields are set directly when items
+    are initialised or unpickled so that creating items is not slowed down.
+
+    :param typename: Name of the recordtype.
+    :type typename: str
+    :param field_names: Passed into recordtype.
+    :param kwargs: Passed into recordtype.
+    :rtype: type
+    '''
+    base = recordtype(typename, field_names, **kwargs)
+    init = base.__init__
+    args = init.__code__.co_varnames[1:init.__code__.co_argcount]
+    defaults = init.__defaults__ or ()
+    required = len(args) - len(defaults)
+    namespace = {'_set_' + f: getattr(base, f).__set__ for f in base._fields}
+    namespace.update(('_default_' + a, d) for a, d in zip(args[required:], defaults))
+    params = list(args[:required]) + ['%s=_default_%s' % (a, a) for a in args[required:]]
+    source = 'def __init__(self, %s):\n    %s\n' % (
+        ', '.join(params), '; '.join('_set_%s(self, %s)' % (f, f) for f in base._fields))
+    exec(source, namespace)
+    setters = [namespace['_set_' + f] for f in base._fields]
+
+    def __setstate__(self, state):
+        for set_field, value in zip(setters, state):
+            set_field(self, value)
+
+    return type(typename, (base,), {
+        '__slots__': ('_indexed_lists',),
+        '__init__': namespace['__init__'],
+        '__setstate__': __setstate__,
+        '__setattr__': _set_item_field,
+        '__module__': __name__,
+    })
+
+
 # Define named tuples for KPV and KTI and FlightPhase
-ApproachItem = recordtype(
+ApproachItem = _item_recordtype(
     'ApproachItem',
     'type slice airport landing_runway approach_runway gs_est loc_est ils_freq turnoff lowest_lat lowest_lon lowest_hdg runway_change offset_ils',
     default=None)
 # XXX: The unused slice argument to KeyPointValue is deprecated to be removed at a later date.
-KeyPointValue = recordtype('KeyPointValue',
-                           OrderedDict([('index', None), ('value', None), ('name', None), ('slice', slice(None)), ('datetime', None), ('latitude', None), ('longitude', None)]))
-KeyTimeInstance = recordtype('KeyTimeInstance',
-                             'index name datetime latitude longitude',
-                             default=None)
+KeyPointValue = _item_recordtype('KeyPointValue',
+                                OrderedDict([('index', None), ('value', None), ('name', None), ('slice', slice(None)), ('datetime', None), ('latitude', None), ('longitude', None)]))
+KeyTimeInstance = _item_recordtype('KeyTimeInstance',
+                                  'index name datetime latitude longitude',
+                                  default=None)
 Section = namedtuple('Section', 'name slice start_edge stop_edge')  # Q: rename mask -> slice/section
+# Names of a FormattedNameNode in the order of the product of NAME_VALUES,
+# the set of names and the NAME_VALUES combination of each name.
+NameIndex = namedtuple('NameIndex', 'keys names name_set name_values')
+# Items of a SortedLookup group in sorted order with their positions within
+# the list, their sorted keys and the prefix maximum and suffix minimum of the
+# index tested by get_next and get_previous.
+SortedGroup = namedtuple('SortedGroup', 'items positions keys premax sufmin')
+# Fields of KPVs and KTIs within the columns created by item_columns. The
+# name field is the position of the item's name within the interned names.
+ITEM_COLUMNS_DTYPE = np.dtype([('index', np.float64), ('value', np.float64),
+                               ('latitude', np.float64),
+                               ('longitude', np.float64), ('name', np.int32)])
+
+
+def item_columns(items, fields=ITEM_COLUMNS_DTYPE.names):
+    '''
+    Columns of the fields of many KPVs or KTIs, so that they may be aligned,
+    geo-located and timestamped with array operations rather than one item at
+    a time. Fields which are None, e.g. the value of KTIs, are NaN.
+
+    :param items: KPVs or KTIs.
+    :type items: [KeyPointValue or KeyTimeInstance]
+    :param fields: Fields of ITEM_COLUMNS_DTYPE to include.
+    :type fields: [str]
+    :returns: Structured array of the fields of each item and the names of the items, each name included once.
+    :rtype: (np.ndarray, [str])
+    '''
+    dtype = np.dtype([(f, ITEM_COLUMNS_DTYPE.fields[f][0]) for f in fields])
+    columns = np.empty(len(items), dtype=dtype)
+    names = {}
+    for field in fields:
+        if field == 'name':
+            columns[field] = [names.setdefault(item.name, len(names))
+                              for item in items]
+        else:
+            columns[field] = [getattr(item, field, None) for item in items]
+    return columns, list(names)
+
+
+def set_item_fields(items, **fields):
+    '''
+    Sets fields of many KPVs or KTIs at once, e.g.
+    set_item_fields(kpvs, latitude=latitudes).
+
+    :param items: KPVs or KTIs.
+    :type items: [KeyPointValue or KeyTimeInstance]
+    :param fields: Values of each field in the order of items.
+    :type fields: dict of lists
+    '''
+    for field, values in fields.items():
+        if field in _ITEM_KEY_FIELDS:
+            for item, value in zip(items, values):
+                setattr(item, field, value)
+            continue
+        # OPT: Other fields are not held by sorted lookups, so are set with
+        # the slot of the field rather than through _set_item_field.
+        item_types = set(map(type, items))
+        slot = getattr(item_types.pop(), field, None) if len(item_types) == 1 else None
+        if isinstance(slot, MemberDescriptorType):
+            deque(map(slot.__set__, items, values), maxlen=0)
+        else:
+            for item, value in zip(items, values):
+                object.__setattr__(item, field, value)
+
+
+def _copy_items(items, indices):
+    '''
+    :param items: KPVs or KTIs.
+    :type items: [KeyPointValue or KeyTimeInstance]
+    :param indices: Index of each copy.
+    :type indices: [float]
+    :returns: Copies of the items with their index replaced.
+    :rtype: [KeyPointValue or KeyTimeInstance]
+    '''
+    # The index is the first field of both KPVs and KTIs.
+    return [type(item)(index, *item.__getstate__()[1:])
+            for item, index in zip(items, indices)]
 
 
 # Ref: django/db/models/options.py:20
@@ -175,6 +322,13 @@ def get_param_kwarg_names(method):
     return defaults
 
 
+# Cache of dependency names of derive methods. {NodeClass: (name, ...)}
+_DEPENDENCY_NAMES = {}
+# Cache of names of FormattedNameNodes keyed by the NAME_FORMAT and
+# NAME_VALUES they were built from. {NodeClass: (key, NameIndex)}
+_NAME_INDEXES = {}
+
+
 #------------------------------------------------------------------------------
 # Abstract Node Classes
 # =====================
@@ -187,6 +341,317 @@ def _calculate_offset(frequency, offset):
     return offset % (1.0 / frequency)
 
 
+def _node_nbytes(node):
+    '''
+    Estimate the memory used by a node's array including its mask.
+
+    :rtype: int
+    '''
+    array = getattr(node, 'array', None)
+    if array is None:
+        return 0
+    nbytes = np.ma.getdata(array).nbytes
+    mask = np.ma.getmask(array)
+    if mask is not np.ma.nomask:
+        nbytes += mask.nbytes
+    return nbytes
+
+
+class NodeCache(object):
+    '''
+    Cache of aligned nodes keyed by Node.cache_key to avoid repeated array
+    alignment.
+
+    The least recently used nodes are evicted once the arrays held exceed
+    max_bytes. Nodes may also be released by name once no further nodes
+    depend upon them. Access is thread-safe.
+    '''
+    def __init__(self, max_bytes=None):
+        '''
+        :param max_bytes: Maximum size of cached arrays. None is unlimited.
+        :type max_bytes: int or None
+        '''
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.released = 0
+        self.released_bytes = 0
+        self._nodes = OrderedDict()  # {key: (node, nbytes)}
+        self._keys = defaultdict(set)  # {name: {key, ...}}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, key):
+        return key in self._nodes
+
+    def get(self, key, default=None):
+        '''
+        :param key: Cache key (see Node.cache_key).
+        :type key: tuple
+        :returns: Cached node if it exists, else default.
+        :rtype: Node
+        '''
+        with self._lock:
+            try:
+                node, _ = self._nodes[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._nodes.move_to_end(key)
+            self.hits += 1
+            return node
+
+    def __setitem__(self, key, node):
+        nbytes = _node_nbytes(node)
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                return  # Would evict everything else and itself.
+            self._nodes[key] = (node, nbytes)
+            self._keys[key[0]].add(key)
+            self.nbytes += nbytes
+            while self.max_bytes is not None and self.nbytes > self.max_bytes:
+                evicted_key = next(iter(self._nodes))
+                self.evicted += 1
+                self.evicted_bytes += self._remove(evicted_key)
+
+    def _remove(self, key):
+        '''
+        Remove key from the cache. The lock must be held.
+
+        :returns: Size of the removed node's array.
+        :rtype: int
+        '''
+        try:
+            _, nbytes = self._nodes.pop(key)
+        except KeyError:
+            return 0
+        keys = self._keys[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._keys[key[0]]
+        self.nbytes -= nbytes
+        return nbytes
+
+    def release(self, name):
+        '''
+        Remove all aligned copies of the named node from the cache.
+
+        :param name: Name of node.
+        :type name: str
+        '''
+        with self._lock:
+            for key in list(self._keys.get(name, ())):
+                self.released += 1
+                self.released_bytes += self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._nodes.clear()
+            self._keys.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        '''
+        :returns: Cache statistics.
+        :rtype: dict
+        '''
+        return {
+            'entries': len(self._nodes),
+            'bytes': self.nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evicted': self.evicted,
+            'evicted_bytes': self.evicted_bytes,
+            'released': self.released,
+            'released_bytes': self.released_bytes,
+        }
+
+
+class PrivateNodeCache(object):
+    '''
+    View of a NodeCache for a node derived concurrently with others. Aligned
+    nodes are copied when stored and when returned so that derive methods
+    which modify their dependencies in-place cannot affect other nodes.
+    '''
+    def __init__(self, cache):
+        '''
+        :param cache: Cache shared between nodes.
+        :type cache: NodeCache
+        '''
+        self._cache = cache
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def get(self, key, default=None):
+        node = self._cache.get(key)
+        return default if node is None else copy_node(node)
+
+    def __setitem__(self, key, node):
+        self._cache[key] = copy_node(node)
+
+
+class HDFParameterCache(object):
+    '''
+    Accessor of an HDF file which holds the parameters within the file's
+    cache_param_list in memory once read, in place of the file's own cache
+    from which parameters cannot be removed. Parameters are released once no
+    further nodes depend upon them. Copies are returned so that derive methods
+    which modify their dependencies in-place cannot affect other nodes.
+
+    While entered, the file's cache_param_list is emptied. On exit it is
+    restored without the released parameters and the cache is cleared. Other
+    attributes are those of the HDF file. Access is thread-safe.
+    '''
+    def __init__(self, hdf):
+        '''
+        :param hdf: HDF file to read parameters from.
+        :type hdf: hdf_file
+        '''
+        self.hdf = hdf
+        self.cache_param_list = []
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.released = 0
+        self.released_bytes = 0
+        self._params = {}  # {name: (param, nbytes)}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.hdf, name)
+
+    def __enter__(self):
+        cache_param_list = getattr(self.hdf, 'cache_param_list', None)
+        if isinstance(cache_param_list, list):
+            self.cache_param_list = list(cache_param_list)
+            del cache_param_list[:]
+        return self
+
+    def __exit__(self, *exc_info):
+        cache_param_list = getattr(self.hdf, 'cache_param_list', None)
+        if isinstance(cache_param_list, list):
+            cache_param_list.extend(self.cache_param_list)
+        self.clear()
+        return False
+
+    def get_param(self, name, valid_only=False):
+        '''
+        :param name: Name of parameter.
+        :type name: str
+        :param valid_only: Whether to raise KeyError if the parameter is invalid.
+        :type valid_only: bool
+        :returns: Copy of the cached parameter, read from the HDF file and
+            cached if within cache_param_list.
+        :rtype: Parameter
+        :raises KeyError: If the parameter does not exist, or is invalid and valid_only.
+        '''
+        if name not in self.cache_param_list:
+            return self.hdf.get_param(name, valid_only=valid_only)
+        with self._lock:
+            cached = self._params.get(name)
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if cached is None:
+            param = self.hdf.get_param(name, valid_only=valid_only)
+            # Parameters read regardless of validity may not be returned when
+            # only valid parameters are requested.
+            if valid_only:
+                nbytes = _node_nbytes(param)
+                with self._lock:
+                    if name in self.cache_param_list and name not in self._params:
+                        self._params[name] = (param, nbytes)
+                        self.nbytes += nbytes
+        else:
+            param = cached[0]
+        return copy.deepcopy(param)
+
+    def set_param(self, param, *args, **kwargs):
+        '''
+        Write a parameter to the HDF file, replacing any cached copy.
+        '''
+        with self._lock:
+            self._remove(param.name)
+        return self.hdf.set_param(param, *args, **kwargs)
+
+    def _remove(self, name):
+        '''
+        Remove name from the cache. The lock must be held.
+
+        :returns: Size of the removed parameter's array.
+        :rtype: int
+        '''
+        try:
+            _, nbytes = self._params.pop(name)
+        except KeyError:
+            return 0
+        self.nbytes -= nbytes
+        return nbytes
+
+    def release(self, name):
+        '''
+        Stop caching the named parameter and remove it from the cache.
+
+        :param name: Name of parameter.
+        :type name: str
+        '''
+        with self._lock:
+            try:
+                self.cache_param_list.remove(name)
+            except ValueError:
+                return
+            self.released += 1
+            self.released_bytes += self._remove(name)
+
+    def clear(self):
+        with self._lock:
+            self._params.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        '''
+        :returns: Cache statistics.
+        :rtype: dict
+        '''
+        return {
+            'entries': len(self._params),
+            'bytes': self.nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'released': self.released,
+            'released_bytes': self.released_bytes,
+        }
+
+
+def copy_node(node, cache=None):
+    '''
+    Deep copy a node without copying the cache of aligned nodes it refers to.
+
+    :param node: Node to copy.
+    :type node: Node
+    :param cache: Cache for the copy to use instead of the node's cache.
+    :type cache: NodeCache, PrivateNodeCache or None
+    :returns: Copy of node.
+    :rtype: Node
+    '''
+    node_cache = getattr(node, '_cache', None)
+    if node_cache is None:
+        return copy.deepcopy(node)
+    if cache is None:
+        cache = node_cache
+    node = copy.deepcopy(node, {id(node_cache): cache})
+    node._cache = cache
+    return node
+
+
 class Node(six.with_metaclass(ABCMeta, object)):
     '''
     Note about aligning options
@@ -208,6 +673,7 @@ class Node(six.with_metaclass(ABCMeta, object)):
     align_frequency = None  # Force frequency of Node by overriding
     align_offset = None  # Force offset of Node by overriding
     data_type = None  # Q: What should the default be? Q: Should this dictate the numpy dtype saved to the HDF file or should it be inferred from the array?
+    _profile = None  # NodeProfile updated by get_derived when profiling
 
     def __init__(self, name='', frequency=1.0, offset=0.0, **kwargs):
         """
@@ -282,12 +748,19 @@ class Node(six.with_metaclass(ABCMeta, object)):
         :returns: A list of dependency names.
         :rtype: [str]
         """
+        # OPT: Inspecting derive is slow and called for every node of every
+        # flight, so names are cached per class.
+        try:
+            return list(_DEPENDENCY_NAMES[cls])
+        except KeyError:
+            pass
         # TypeError:'ABCMeta' object is not iterable?
         # this probably means dependencies for this class isn't a list!
         params = get_param_kwarg_names(cls.derive)
         # Here due to an AttributeError? Derive kwarg is a string not a Node:
         # e.g. derive(a='String') instead of derive(a=P('String'))
-        return [d.name or d.get_name() for d in params]
+        _DEPENDENCY_NAMES[cls] = names = tuple(d.name or d.get_name() for d in params)
+        return list(names)
 
     @classmethod
     def can_operate(cls, available):
@@ -365,7 +838,7 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
         :returns: Cached Node if it exists, else None.
         :rtype: Node or None
         '''
-        return self._cache.get(key) if self._cache else None
+        return self._cache.get(key) if self._cache is not None else None
 
     def set_cache(self, key, node):
         '''
@@ -404,6 +877,10 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
         dependencies_to_align = \
             [d for d in args if d is not None and d.frequency]
 
+        profile = self._profile
+        if profile is not None:
+            align_start = perf_counter()
+
         if dependencies_to_align and self.align:
 
             if self.align_frequency and self.align_offset is not None:
@@ -429,6 +906,11 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
             aligned_args = []
             for arg in args:
                 if arg in dependencies_to_align:
+                    if profile is not None:
+                        profile.dependencies_aligned += 1
+                        if self._cache is not None and \
+                           self.cache_key(arg.name, self.frequency, self.offset) in self._cache:
+                            profile.cache_hits += 1
                     try:
                         aligned_arg = arg.get_aligned(self)
                     except AttributeError:
@@ -444,6 +926,10 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
             self.frequency = dependencies_to_align[0].frequency
             self.offset = dependencies_to_align[0].offset
 
+        if profile is not None:
+            derive_start = perf_counter()
+            profile.align_time = derive_start - align_start
+
         try:
             res = self.derive(*args)
         except Exception:
@@ -451,6 +937,9 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
                            'Nodes used to derive:\n  %s',
                            self.name, '\n  '.join(repr(n) for n in args))
             raise
+        finally:
+            if profile is not None:
+                profile.derive_time = perf_counter() - derive_start
 
         if res is NotImplemented:
             raise NotImplementedError("Class '%s' derive method is not implemented." %
@@ -501,12 +990,13 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
 
     def __getstate__(self):
         '''
-        Do not pickle _cache attr when saving nodes.
+        Do not pickle _cache or _lookups attrs when saving nodes.
         '''
-        if '_cache' not in self.__dict__:
+        if '_cache' not in self.__dict__ and '_lookups' not in self.__dict__:
             return self.__dict__
         state = self.__dict__.copy()
-        del state['_cache']
+        state.pop('_cache', None)
+        state.pop('_lookups', None)
         return state
 
     def __setstate__(self, state):
@@ -667,7 +1157,8 @@ class DerivedParameterNode(Node):
         except AttributeError:
             # secs is a float
             secs = float(secs)
-        return value_at_time(self.array, self.frequency, self.offset, secs)
+        value = values_at_times(self.array, self.frequency, self.offset, [secs])[0]
+        return None if value is np.ma.masked else value
 
     def get_aligned(self, param):
         '''
@@ -997,7 +1488,202 @@ def derived_param_from_hdf(hdf_parameter, cache=None):
         )
 
 
-class SectionNode(Node, list):
+class SortedLookup(object):
+    '''
+    Items of a list stably sorted by an index and grouped by name or type,
+    e.g. KPVs by index and name, so that the first, last, next and previous
+    items are found with a binary search rather than by sorting the list for
+    each lookup. The prefix maximum and suffix minimum of a second index, e.g.
+    the stop of sections sorted by start, find the next and previous items
+    tested by that index in the same order.
+
+    The lookup is invalid if an index is None or NaN, in which case the
+    original implementations are used.
+    '''
+    def __init__(self, items, group_attr, order_attr, use_attr=None):
+        '''
+        :param items: Items to sort.
+        :type items: list
+        :param group_attr: Attribute to group items by, e.g. 'name'.
+        :type group_attr: str
+        :param order_attr: Attribute to sort items by, e.g. 'slice.start'.
+        :type order_attr: str
+        :param use_attr: Attribute tested by get_next and get_previous, by default order_attr.
+        :type use_attr: str or None
+        '''
+        self.valid = False
+        group_key = attrgetter(group_attr)
+        order_key = attrgetter(order_attr)
+        use_key = attrgetter(use_attr) if use_attr else order_key
+        try:
+            positions = sorted(range(len(items)),
+                               key=lambda p: order_key(items[p]))
+            keys = [order_key(items[p]) for p in positions]
+            uses = [use_key(items[p]) for p in positions]
+            members = {}
+            for i, p in enumerate(positions):
+                members.setdefault(group_key(items[p]), []).append(i)
+        except (AttributeError, TypeError):
+            return
+        if any(k is None or k != k for k in keys + uses):
+            return
+
+        def sorted_group(indices):
+            premax = [uses[i] for i in indices]
+            for i in range(1, len(premax)):
+                if premax[i] < premax[i - 1]:
+                    premax[i] = premax[i - 1]
+            sufmin = [uses[i] for i in indices]
+            for i in range(len(sufmin) - 2, -1, -1):
+                if sufmin[i] > sufmin[i + 1]:
+                    sufmin[i] = sufmin[i + 1]
+            return SortedGroup([items[positions[i]] for i in indices],
+                               [positions[i] for i in indices],
+                               [keys[i] for i in indices], premax, sufmin)
+
+        try:
+            self.all = sorted_group(range(len(positions)))
+            self.groups = {g: sorted_group(i) for g, i in members.items()}
+        except TypeError:
+            return
+        self.listed = {}
+        for item in items:
+            self.listed.setdefault(group_key(item), []).append(item)
+        self.valid = True
+
+    def group(self, group=None):
+        '''
+        :param group: Name or type of items, all items if falsy.
+        :type group: str or None
+        :returns: Items within the group sorted by index.
+        :rtype: SortedGroup
+        '''
+        if not group:
+            return self.all
+        return self.groups.get(group, _EMPTY_GROUP)
+
+    @staticmethod
+    def first(group, lo=0, hi=None):
+        '''
+        :returns: First item with the lowest index within the range of the group, as min() returns.
+        :rtype: item or None
+        '''
+        hi = len(group.keys) if hi is None else hi
+        return group.items[lo] if lo < hi else None
+
+    @staticmethod
+    def last(group, lo=0, hi=None):
+        '''
+        :returns: First item with the highest index within the range of the group, as max() returns.
+        :rtype: item or None
+        '''
+        hi = len(group.keys) if hi is None else hi
+        if lo >= hi:
+            return None
+        return group.items[bisect_left(group.keys, group.keys[hi - 1], lo, hi)]
+
+    @staticmethod
+    def next(group, index, lo=0, hi=None):
+        '''
+        :returns: First item in sorted order whose use index is greater than index.
+        :rtype: item or None
+        '''
+        hi = len(group.keys) if hi is None else hi
+        pos = bisect_right(group.premax, index, lo, hi)
+        return group.items[pos] if pos < hi else None
+
+    @staticmethod
+    def previous(group, index, inclusive=False, lo=0, hi=None):
+        '''
+        :param inclusive: Whether the use index may equal index.
+        :type inclusive: bool
+        :returns: Last item in sorted order whose use index is less than index.
+        :rtype: item or None
+        '''
+        if index != index:
+            # NaN is not comparable.
+            return None
+        hi = len(group.keys) if hi is None else hi
+        bisect = bisect_right if inclusive else bisect_left
+        pos = bisect(group.sufmin, index, lo, hi) - 1
+        return group.items[pos] if pos >= lo else None
+
+    @staticmethod
+    def in_list_order(group, lo, hi):
+        '''
+        :returns: Items within the range of the group in the order of the list.
+        :rtype: list
+        '''
+        order = sorted(range(lo, hi), key=group.positions.__getitem__)
+        return [group.items[i] for i in order]
+
+
+_EMPTY_GROUP = SortedGroup([], [], [], [], [])
+
+
+class IndexedList(list):
+    '''
+    List which keeps SortedLookups of its items, discarded whenever the list
+    is modified or the index, name, slice or type of an item is reassigned.
+    '''
+    def sorted_lookup(self, group_attr, order_attr, use_attr=None):
+        '''
+        :returns: The lookup, built if the items have changed since it was last requested, or None if the items cannot be sorted.
+        :rtype: SortedLookup or None
+        '''
+        # OPT: The first, last, next and previous items were found by sorting
+        # the matching items for every call, e.g. once per flight phase.
+        lookups = self.__dict__.setdefault('_lookups', {})
+        key = (group_attr, order_attr, use_attr)
+        lookup = lookups.get(key)
+        if lookup is None:
+            self._hold_items()
+            lookup = lookups[key] = SortedLookup(self, group_attr, order_attr,
+                                                 use_attr)
+        return lookup if lookup.valid else None
+
+    def _hold_items(self):
+        '''
+        Register the list with its items so that reassigning the index, name,
+        slice or type of an item discards the list's lookups.
+        '''
+        ref = weakref.ref(self)
+        for item in self:
+            refs = getattr(item, '_indexed_lists', None)
+            if refs is None:
+                try:
+                    object.__setattr__(item, '_indexed_lists', [ref])
+                except AttributeError:
+                    # Sections are immutable.
+                    return
+            elif not any(r is ref for r in refs):
+                refs.append(ref)
+
+    def _modified(self):
+        self.__dict__['_lookups'] = {}
+
+
+def _modifies_list(name):
+    method = getattr(list, name)
+
+    def modify(self, *args, **kwargs):
+        self._modified()
+        return method(self, *args, **kwargs)
+
+    modify.__name__ = name
+    modify.__doc__ = method.__doc__
+    return modify
+
+
+for _name in ('append', 'extend', 'insert', 'remove', 'pop', 'clear', 'sort',
+              'reverse', '__setitem__', '__delitem__', '__iadd__', '__imul__',
+              '__setslice__', '__delslice__'):
+    if hasattr(list, _name):
+        setattr(IndexedList, _name, _modifies_list(_name))
+del _name
+
+
+class SectionNode(Node, IndexedList):
     '''
     Derives from list to implement iteration and list methods.
 
@@ -1136,6 +1822,23 @@ class SectionNode(Node, list):
         return lambda e: (within_func(e, within_slice) and name_func(e) and
                           index_func(e))
 
+    def _sorted_lookup(self, order_by, kwargs, use=None):
+        '''
+        :param order_by: Index of slice to sort by, either 'start' or 'stop'.
+        :type order_by: str
+        :param kwargs: Conditions of the lookup.
+        :type kwargs: dict
+        :param use: Index of slice tested by get_next and get_previous.
+        :type use: str or None
+        :returns: Lookup of sections sorted by order_by if there are no conditions other than name, otherwise None.
+        :rtype: SortedLookup or None
+        '''
+        if not set(kwargs) <= {'name'} or order_by not in self.slice_attrgetters or \
+           use not in (None, 'start', 'stop'):
+            return None
+        return self.sorted_lookup('name', 'slice.' + order_by,
+                                  'slice.' + use if use else None)
+
     def get(self, **kwargs):
         '''
         Gets elements either within_slice or with name. Duplicated from
@@ -1146,6 +1849,12 @@ class SectionNode(Node, list):
         :returns: An object of the same type as self containing matching elements.
         :rtype: Section
         '''
+        name = kwargs.get('name')
+        lookup = self._sorted_lookup('start', kwargs) if name else None
+        if lookup:
+            matching = list(lookup.listed.get(name, ()))
+            return self.__class__(name=self.name, frequency=self.frequency,
+                                  offset=self.offset, items=matching)
         condition = self._get_condition(**kwargs)
         matching = [s for s in self if condition(s)]
         return self.__class__(name=self.name, frequency=self.frequency,
@@ -1159,6 +1868,9 @@ class SectionNode(Node, list):
         :returns: First Section matching conditions.
         :rtype: Section
         '''
+        lookup = self._sorted_lookup(first_by, kwargs)
+        if lookup:
+            return lookup.first(lookup.group(kwargs.get('name')))
         matching = self.get(**kwargs)
         if matching:
             return min(matching, key=self.slice_attrgetters[first_by])
@@ -1173,6 +1885,9 @@ class SectionNode(Node, list):
         :returns: Last Section matching conditions.
         :rtype: Section
         '''
+        lookup = self._sorted_lookup(last_by, kwargs)
+        if lookup:
+            return lookup.last(lookup.group(kwargs.get('name')))
         matching = self.get(**kwargs)
         if matching:
             return max(matching, key=self.slice_attrgetters[last_by])
@@ -1187,6 +1902,11 @@ class SectionNode(Node, list):
         :returns: An object of the same type as self containing elements ordered by index.
         :rtype: Section
         '''
+        lookup = self._sorted_lookup(order_by, kwargs)
+        if lookup:
+            return self.__class__(name=self.name, frequency=self.frequency,
+                                  offset=self.offset,
+                                  items=lookup.group(kwargs.get('name')).items)
         matching = self.get(**kwargs)
         ordered_by_start = sorted(matching,
                                   key=self.slice_attrgetters[order_by])
@@ -1210,6 +1930,9 @@ class SectionNode(Node, list):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
+        lookup = self._sorted_lookup('start', kwargs, use=use)
+        if lookup:
+            return lookup.next(lookup.group(kwargs.get('name')), index)
         ordered = self.get_ordered_by_index(**kwargs)
         for elem in ordered:
             if getattr(elem.slice, use) > index:
@@ -1233,6 +1956,10 @@ class SectionNode(Node, list):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
+        lookup = self._sorted_lookup('start', kwargs, use=use)
+        if lookup:
+            return lookup.previous(lookup.group(kwargs.get('name')), index,
+                                   inclusive=True)
         ordered = self.get_ordered_by_index(**kwargs)
         for elem in reversed(ordered):
             if getattr(elem.slice, use) <= index:
@@ -1275,6 +2002,15 @@ class SectionNode(Node, list):
         :returns: List of surrounding sections
         :rtype: List of sections
         '''
+        lookup = self.sorted_lookup('name', 'slice.start', 'slice.stop')
+        if lookup:
+            # Sections starting at or before index.
+            group = lookup.all
+            started = bisect_right(group.keys, index)
+            surrounded = [s for s in lookup.in_list_order(group, 0, started)
+                          if index <= s.slice.stop]
+            return self.__class__(name=self.name, frequency=self.frequency,
+                                  offset=self.offset, items=surrounded)
         surrounded = []
         for section in self:
             if section.slice.start <= index <= section.slice.stop or\
@@ -1304,7 +2040,7 @@ class FlightPhaseNode(SectionNode):
     create_phases = SectionNode.create_sections
 
 
-class ListNode(Node, list):
+class ListNode(Node, IndexedList):
     def __init__(self, *args, **kwargs):
         '''
         If the there is not an 'items' kwarg and the first argument is a list
@@ -1347,23 +2083,66 @@ class FormattedNameNode(ListNode):
         self.restrict_names = kwargs.get('restrict_names', True)
 
     @classmethod
-    def names(cls):
+    def name_index(cls):
         """
-        :returns: The product of all NAME_VALUES name combinations
-        :rtype: list
+        The index is built the first time it is requested and rebuilt if
+        NAME_FORMAT or NAME_VALUES have changed since, including when the
+        lists within NAME_VALUES are modified in place.
+
+        :returns: The names of this node and the NAME_VALUES of each name.
+        :rtype: NameIndex
         """
-        # XXX: cache option below disabled until required. Should we create this
-        # on init and remove the property instead?
-        ##if hasattr(cls, 'names'):
-        ##    return cls.names
         if not cls.NAME_FORMAT and not cls.NAME_VALUES:
-            return [cls.get_name()]
+            name = cls.get_name()
+            return NameIndex((), (name,), frozenset((name,)), {name: ()})
+        # OPT: Names were formatted for every call, e.g. validating the name
+        # of every KPV created, which is slow for nodes with hundreds of
+        # combinations of NAME_VALUES. Comparing the NAME_VALUES is cheap.
+        key = (cls.NAME_FORMAT,
+               tuple((k, tuple(v)) for k, v in cls.NAME_VALUES.items()))
+        try:
+            cached_key, index = _NAME_INDEXES[cls]
+            if cached_key == key:
+                return index
+        except KeyError:
+            pass
+        keys = tuple(cls.NAME_VALUES.keys())
         names = []
-        for a in product(*cls.NAME_VALUES.values()):
-            name = cls.NAME_FORMAT % dict(zip(cls.NAME_VALUES.keys(), a))
+        name_values = {}
+        for values in product(*cls.NAME_VALUES.values()):
+            name = cls.NAME_FORMAT % dict(zip(keys, values))
             names.append(name)
-        ##cls.names = names  #cache
-        return names
+            name_values.setdefault(name, values)
+        index = NameIndex(keys, tuple(names), frozenset(names), name_values)
+        _NAME_INDEXES[cls] = (key, index)
+        return index
+
+    @classmethod
+    def names(cls):
+        """
+        :returns: The product of all NAME_VALUES name combinations
+        :rtype: list
+        """
+        return list(cls.name_index().names)
+
+    @classmethod
+    def names_matching(cls, name_values):
+        """
+        :param name_values: Values of some or all of the NAME_VALUES keys, e.g.
+            {'altitude': 20}.
+        :type name_values: dict
+        :raises ValueError: If a key is not within NAME_VALUES.
+        :returns: Names formatted with matching NAME_VALUES combinations.
+        :rtype: set
+        """
+        index = cls.name_index()
+        try:
+            positions = [(index.keys.index(k), v) for k, v in name_values.items()]
+        except ValueError:
+            raise ValueError("Attempted to filter by invalid name values %s "
+                             "within '%s'." % (name_values, cls.__name__))
+        return {name for name, values in index.name_values.items()
+                if all(values[p] == v for p, v in positions)}
 
     def _validate_name(self, name):
         """
@@ -1372,7 +2151,7 @@ class FormattedNameNode(ListNode):
         :type name: str
         :rtype: bool
         """
-        return name in self.names()
+        return name in self.name_index().name_set
 
     def format_name(self, replace_values={}, **kwargs):
         """
@@ -1398,7 +2177,8 @@ class FormattedNameNode(ListNode):
             raise ValueError("invalid name '%s'" % name)
         return name  # return as a confirmation it was successful
 
-    def _get_condition(self, within_slice=None, within_slices=None, name=None):
+    def _get_condition(self, within_slice=None, within_slices=None, name=None,
+                       name_values=None):
         '''
         Returns a condition function which checks if the element is within
         a slice or has a specified name if they are provided.
@@ -1409,6 +2189,9 @@ class FormattedNameNode(ListNode):
         :type within_slices: [slice]
         :param name: Only return elements with this name.
         :type name: str
+        :param name_values: Only return elements with names formatted from
+            these NAME_VALUES, e.g. {'altitude': 20}.
+        :type name_values: dict
         :returns: Either a condition function or None.
         :rtype: func or None
         '''
@@ -1419,28 +2202,71 @@ class FormattedNameNode(ListNode):
 
         within_slices_func = \
             lambda e: is_index_within_slices(e.index, within_slices)
-        name_func = lambda e: e.name == name
+        if name_values:
+            names = self.names_matching(name_values)
+            if name:
+                names &= {name}
+            name_func = lambda e: e.name in names
+        else:
+            name_func = lambda e: e.name == name
 
-        if within_slices and name:
+        if within_slices and (name or name_values):
             return lambda e: within_slices_func(e) and name_func(e)
         elif within_slices:
             return within_slices_func
+        elif name_values:
+            return name_func
         elif name:
-            #Q: If restrict names BUT the named item is in the list of objects
-            # contained, should we not return it anyway rather than raise?
-            if self.restrict_names and name not in self.names():
-                raise ValueError("Attempted to filter by invalid name '%s' "
-                                 "within '%s'." % (name,
-                                                   self.__class__.__name__))
+            self._check_name(name)
             return name_func
         else:
             return None
 
-    def get(self, **kwargs):
+    def _check_name(self, name):
+        '''
+        :param name: Name to filter by.
+        :type name: str
+        :raises ValueError: If names are restricted and name is invalid.
         '''
-        Gets elements either within_slice or with name.
+        #Q: If restrict names BUT the named item is in the list of objects
+        # contained, should we not return it anyway rather than raise?
+        if self.restrict_names and name not in self.name_index().name_set:
+            raise ValueError("Attempted to filter by invalid name '%s' "
+                             "within '%s'." % (name, self.__class__.__name__))
 
-        Q: Could we get by name values rather than formatted name? For example
+    def _sorted_range(self, kwargs):
+        '''
+        :param kwargs: Conditions of the lookup.
+        :type kwargs: dict
+        :returns: Elements with the name within kwargs sorted by index and the range of them within within_slice if there are no other conditions, otherwise None.
+        :rtype: (SortedLookup, SortedGroup, int, int) or None
+        '''
+        if not set(kwargs) <= {'name', 'within_slice'}:
+            return None
+        name = kwargs.get('name')
+        within_slice = kwargs.get('within_slice')
+        if within_slice:
+            start, stop, step = within_slice.start, within_slice.stop, within_slice.step
+            if (step is not None and step < 0) or start != start or stop != stop:
+                return None
+        elif name:
+            self._check_name(name)
+        lookup = self.sorted_lookup('name', 'index')
+        if not lookup:
+            return None
+        group = lookup.group(name)
+        lo, hi = 0, len(group.keys)
+        if within_slice:
+            if start is not None:
+                lo = bisect_left(group.keys, start)
+            if stop is not None:
+                hi = max(lo, bisect_left(group.keys, stop))
+        return lookup, group, lo, hi
+
+    def get(self, **kwargs):
+        '''
+        Gets elements either within_slice or with name. Elements may be found
+        by name values rather than formatted name, for example
         .get(name_values={'altitude': 20}) rather than
         .get(name='20 Ft Descending').
 
@@ -1448,6 +2274,16 @@ class FormattedNameNode(ListNode):
         :returns: An object of the same type as self containing elements ordered by index.
         :rtype: self.__class__
         '''
+        found = self._sorted_range(kwargs) if kwargs else None
+        if found:
+            lookup, group, lo, hi = found
+            if 'within_slice' in kwargs:
+                matching = lookup.in_list_order(group, lo, hi)
+            else:
+                name = kwargs.get('name')
+                matching = list(lookup.listed.get(name, ())) if name else self
+            return self.__class__(name=self.name, frequency=self.frequency,
+                                  offset=self.offset, items=matching)
         condition = self._get_condition(**kwargs)
         matching = list(filter(condition, self)) if condition else self
         return self.__class__(name=self.name, frequency=self.frequency,
@@ -1462,6 +2298,11 @@ class FormattedNameNode(ListNode):
         :returns: An object of the same type as self containing elements ordered by index.
         :rtype: self.__class__
         '''
+        found = self._sorted_range(kwargs)
+        if found:
+            lookup, group, lo, hi = found
+            return self.__class__(name=self.name, frequency=self.frequency,
+                                  offset=self.offset, items=group.items[lo:hi])
         matching = self.get(**kwargs)
         ordered_by_index = sorted(matching, key=attrgetter('index'))
         return self.__class__(name=self.name, frequency=self.frequency,
@@ -1476,6 +2317,10 @@ class FormattedNameNode(ListNode):
         :returns: First element matching conditions.
         :rtype: item within self or None
         '''
+        found = self._sorted_range(kwargs)
+        if found:
+            lookup, group, lo, hi = found
+            return lookup.first(group, lo, hi)
         matching = self.get(**kwargs)
         if matching:
             return min(matching, key=attrgetter('index')) if matching else None
@@ -1491,6 +2336,10 @@ class FormattedNameNode(ListNode):
         :returns: Element with the lowest index matching criteria.
         :rtype: item within self or None
         '''
+        found = self._sorted_range(kwargs)
+        if found:
+            lookup, group, lo, hi = found
+            return lookup.last(group, lo, hi)
         matching = self.get(**kwargs)
         if matching:
             return max(matching, key=attrgetter('index')) if matching else None
@@ -1512,6 +2361,10 @@ class FormattedNameNode(ListNode):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
+        found = self._sorted_range(kwargs)
+        if found:
+            lookup, group, lo, hi = found
+            return lookup.next(group, index, lo, hi)
         ordered = self.get_ordered_by_index(**kwargs)
         for elem in ordered:
             if elem.index > index:
@@ -1533,6 +2386,10 @@ class FormattedNameNode(ListNode):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
+        found = self._sorted_range(kwargs)
+        if found:
+            lookup, group, lo, hi = found
+            return lookup.previous(group, index, lo=lo, hi=hi)
         ordered = self.get_ordered_by_index(**kwargs)
         for elem in reversed(ordered):
             if elem.index < index:
@@ -1746,14 +2603,12 @@ class KeyTimeInstanceNode(FormattedNameNode):
         offset = (self.offset - param.offset) * param.frequency
         aligned_node = self.__class__(self.name, param.frequency,
                                       param.offset)
-        for kti in self:
-            aligned_kti = copy.copy(kti)
-            index_aligned = (kti.index * multiplier) + offset
-            # TODO: check for negative index following downsampling if use
-            # case arrises
-            aligned_kti.index = index_aligned
-            aligned_node.append(aligned_kti)
-
+        # OPT: Align every index at once and create the copies with their
+        # aligned index rather than copying and then modifying each KTI.
+        indices = item_columns(self, ('index',))[0]['index']
+        # TODO: check for negative index following downsampling if use
+        # case arrises
+        aligned_node.extend(_copy_items(self, (indices * multiplier + offset).tolist()))
         return aligned_node
 
 
@@ -1846,14 +2701,13 @@ class KeyPointValueNode(FormattedNameNode):
         multiplier = param.frequency / self.frequency
         offset = (self.offset - param.offset) * param.frequency
         aligned_node = self.__class__(self.name, param.frequency, param.offset)
-        for kpv in self:
-            aligned_kpv = copy.copy(kpv)
-            aligned_kpv.index = (aligned_kpv.index * multiplier) + offset
-            # TODO: check for negative index following downsampling if use
-            # case arrises
-            ##if aligned_kpv.slice:
-            ##    aligned_kpv.slice = align_slice(param, self, aligned_kpv.slice)
-            aligned_node.append(aligned_kpv)
+        # OPT: Align every index at once as KeyTimeInstanceNode.get_aligned.
+        indices = item_columns(self, ('index',))[0]['index']
+        # TODO: check for negative index following downsampling if use
+        # case arrises
+        ##if aligned_kpv.slice:
+        ##    aligned_kpv.slice = align_slice(param, self, aligned_kpv.slice)
+        aligned_node.extend(_copy_items(self, (indices * multiplier + offset).tolist()))
         return aligned_node
 
     def get_max(self, **kwargs):
@@ -1914,9 +2768,12 @@ class KeyPointValueNode(FormattedNameNode):
         :returns None:
         :rtype: None
         '''
-        for kti in ktis:
-            value = value_at_index(array, kti.index, interpolate=interpolate)
-
+        ktis = list(ktis)
+        if not ktis:
+            return
+        # OPT: Source the values at every KTI at once.
+        values = values_at_indices(array, [kti.index for kti in ktis], interpolate=interpolate)
+        for kti, value in zip(ktis, values.tolist()):
             if not suppress_zeros or value:
                 self.create_kpv(kti.index, value)
 
@@ -2265,6 +3122,22 @@ class ApproachNode(ListNode):
     slice_attrgetters = {'start': attrgetter('slice.start'),
                          'stop': attrgetter('slice.stop')}
 
+    def _sorted_lookup(self, kwargs, use=None):
+        '''
+        :param kwargs: Conditions of the lookup.
+        :type kwargs: dict
+        :param use: Index of slice tested by get_previous.
+        :type use: str or None
+        :returns: Lookup of approaches sorted by slice start if there are no conditions other than type, otherwise None.
+        :rtype: SortedLookup or None
+        '''
+        if not set(kwargs) <= {'_type'} or use not in (None, 'start', 'stop'):
+            return None
+        if kwargs.get('_type'):
+            self._check_type(kwargs['_type'])
+        return self.sorted_lookup('type', 'slice.start',
+                                  'slice.' + use if use else None)
+
     def create_approach(self, _type, _slice, runway_change=None, offset_ils=None,
                         airport=None, landing_runway=None, approach_runway=None,
                         gs_est=None, loc_est=None, ils_freq=None, turnoff=None,
@@ -2324,6 +3197,11 @@ class ApproachNode(ListNode):
         '''
         if _type:
             self._check_type(_type)
+            if not within_slice:
+                lookup = self.sorted_lookup('type', 'slice.start')
+                if lookup:
+                    return ApproachNode(self.name, self.frequency, self.offset,
+                                        items=list(lookup.listed.get(_type, ())))
         type_func = lambda a: a.type == _type
         within_slice_func = lambda a: is_slice_within_slice(
             a.slice, within_slice, within_use=within_use)
@@ -2344,6 +3222,9 @@ class ApproachNode(ListNode):
         :returns: First approach which matches kwargs conditions.
         :rtype: Approach or None
         '''
+        lookup = self._sorted_lookup(kwargs)
+        if lookup:
+            return lookup.first(lookup.group(kwargs.get('_type')))
         approaches = sorted(self.get(**kwargs), key=attrgetter('slice.start'))
         return approaches[0] if approaches else None
 
@@ -2353,6 +3234,10 @@ class ApproachNode(ListNode):
         :returns: Last approach which matches kwargs conditions.
         :rtype: Approach or None
         '''
+        lookup = self._sorted_lookup(kwargs)
+        if lookup:
+            group = lookup.group(kwargs.get('_type'))
+            return group.items[-1] if group.items else None
         approaches = sorted(self.get(**kwargs), key=attrgetter('slice.start'))
         return approaches[-1] if approaches else None
 
@@ -2373,6 +3258,9 @@ class ApproachNode(ListNode):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
+        lookup = self._sorted_lookup(kwargs, use=use)
+        if lookup:
+            return lookup.previous(lookup.group(kwargs.get('_type')), index)
         ordered = self.get_ordered_by_index(**kwargs)
         for elem in reversed(ordered):
             if getattr(elem.slice, use) < index:
@@ -2431,6 +3319,163 @@ class ApproachNode(ListNode):
 App = ApproachNode
 
 
+# Cache of Attribute names accepted by can_operate methods. {NodeClass: (name, ...)}
+_CAN_OPERATE_ATTRIBUTE_NAMES = {}
+
+
+def get_can_operate_attribute_names(node):
+    '''
+    Inspects a node's can_operate method for Attribute keyword arguments.
+
+    :param node: Node class.
+    :type node: class
+    :returns: Names of Attributes passed into can_operate after the available dependencies.
+    :rtype: (str, ...)
+    :raises TypeError: If a keyword argument of can_operate is not an Attribute.
+    '''
+    try:
+        return _CAN_OPERATE_ATTRIBUTE_NAMES[node]
+    except KeyError:
+        pass
+    names = []
+    for default in inspect.getfullargspec(node.can_operate).defaults or ():
+        if not isinstance(default, Attribute):
+            raise TypeError('Only Attributes may be keyword arguments in can_operate methods.')
+        names.append(default.name)
+    _CAN_OPERATE_ATTRIBUTE_NAMES[node] = names = tuple(names)
+    return names
+
+
+class LazyNode(object):
+    '''
+    Stands in for a Node class described within a node manifest (see
+    analysis_engine.utils.save_node_manifest) so that the module defining the
+    class is only imported once the node is derived or a custom can_operate
+    method must be called. Other attributes are looked up on the Node class
+    after importing it.
+    '''
+    def __init__(self, entry):
+        '''
+        :param entry: Description of the Node class from a node manifest.
+        :type entry: dict
+        '''
+        self.name = entry['name']
+        self.__module__ = entry['module']
+        self.__qualname__ = entry['class']
+        self._node_type = entry['node_type']
+        self._dependencies = tuple(entry['dependencies'])
+        self._names = tuple(entry['names'])
+        self._custom_can_operate = entry['can_operate']
+        self._node = None
+        _CAN_OPERATE_ATTRIBUTE_NAMES[self] = tuple(entry['can_operate_attributes'])
+
+    def __repr__(self):
+        return '%s(%s.%s)' % (self.__class__.__name__, self.__module__, self.__qualname__)
+
+    def __getattr__(self, attr):
+        if attr == '_node':
+            raise AttributeError(attr)
+        return getattr(self.load(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    @property
+    def __base__(self):
+        for node_subclass in NODE_SUBCLASSES:
+            if node_subclass.__name__ == self._node_type:
+                return node_subclass
+        return self.load().__base__
+
+    def load(self):
+        '''
+        Import the module defining the Node class.
+
+        :returns: Node class.
+        :rtype: class
+        '''
+        if self._node is None:
+            logger.debug("Importing '%s' for node '%s'.", self.__module__, self.name)
+            module = importlib.import_module(self.__module__)
+            self._node = getattr(module, self.__qualname__)
+        return self._node
+
+    def get_name(self):
+        return self.name
+
+    def get_dependency_names(self):
+        return list(self._dependencies)
+
+    def names(self):
+        return list(self._names)
+
+    def can_operate(self, available, *attributes):
+        if self._custom_can_operate:
+            return self.load().can_operate(available, *attributes)
+        return all_deps(self, available)
+
+
+# Source of the top-level classes within each module. {module_name: {name: source}}
+_CLASS_SOURCES = {}
+# Cache of node class fingerprints. {NodeClass: str}
+_NODE_FINGERPRINTS = {}
+
+
+def _get_class_source(cls):
+    '''
+    Get the source of a class from its module. Each module is parsed once as
+    inspect.getsource parses the whole module for every class.
+
+    :type cls: class
+    :returns: Source of the class including any comments following it, or of
+        the whole module if the class is not defined at the top level.
+    :rtype: str
+    '''
+    module_name = cls.__module__
+    try:
+        sources = _CLASS_SOURCES[module_name]
+    except KeyError:
+        try:
+            text = inspect.getsource(sys.modules[module_name])
+        except (KeyError, OSError, TypeError):
+            text = ''
+        lines = text.splitlines(True)
+        statements = ast.parse(text).body
+        sources = {'': text}
+        for stmt, next_stmt in zip(statements, statements[1:] + [None]):
+            if isinstance(stmt, ast.ClassDef):
+                stop = next_stmt.lineno - 1 if next_stmt else len(lines)
+                sources[stmt.name] = ''.join(lines[stmt.lineno - 1:stop])
+        _CLASS_SOURCES[module_name] = sources
+    return sources.get(cls.__qualname__, sources[''])
+
+
+def get_node_fingerprint(node):
+    '''
+    Hash the source of a node class and of the base classes it inherits from
+    outside of this module, so that results derived by a different version of
+    the class can be identified. Changes to library functions used by the
+    class are not detected.
+
+    :param node: Node class.
+    :type node: class or LazyNode
+    :returns: Hex digest of the source.
+    :rtype: str
+    '''
+    if isinstance(node, LazyNode):
+        node = node.load()
+    try:
+        return _NODE_FINGERPRINTS[node]
+    except KeyError:
+        pass
+    sha = hashlib.sha256()
+    for cls in inspect.getmro(node):
+        if cls.__module__ not in (__name__, 'builtins'):
+            sha.update(_get_class_source(cls).encode('utf-8'))
+    _NODE_FINGERPRINTS[node] = fingerprint = sha.hexdigest()
+    return fingerprint
+
+
 class NodeManager(object):
     def __repr__(self):
         return 'NodeManager: x%d nodes in total' % (
@@ -2528,14 +3573,20 @@ class NodeManager(object):
 
         # Cache lookup of attributes to pass to .can_operate() for improved performance:
         if node not in self._node_attribute_cache:
-            attributes = []
-            for default in inspect.getfullargspec(node.can_operate).defaults or ():
-                if not isinstance(default, Attribute):
-                    raise TypeError('Only Attributes may be keyword arguments in can_operate methods.')
-                attributes.append(self.get_attribute(default.name))
-            self._node_attribute_cache[node] = attributes
+            self._node_attribute_cache[node] = [
+                self.get_attribute(name) for name in get_can_operate_attribute_names(node)]
         return node.can_operate(available, *self._node_attribute_cache[node])
 
+    def get_can_operate_attributes(self):
+        '''
+        :returns: Attributes which are passed into the can_operate methods of the derived nodes.
+        :rtype: dict
+        '''
+        names = set()
+        for node in self.derived_nodes.values():
+            names.update(get_can_operate_attribute_names(node))
+        return {name: self.get_attribute(name) for name in names}
+
     def node_type(self, node_name):
         '''
         :param node_name: Name of node to retrieve type for.
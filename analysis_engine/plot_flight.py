@@ -20,6 +20,7 @@ from analysis_engine.library import (
     latitudes_and_longitudes,
     repair_mask,
     value_at_index,
+    values_at_times,
 )
 from analysis_engine.node import derived_param_from_hdf, Parameter
 
@@ -528,16 +529,16 @@ def csv_flight_details(hdf_path, kti_list, kpv_list, phase_list,
         rows.append(end)
 
     # Append values of useful parameters at this time
+    timed_rows = [row for row in rows if row['index'] is not None]
     with hdf_file(hdf_path) as hdf:
         for param in params:
-            # Create DerivedParameterNode to utilise the .at() method
             if param not in hdf:
                 continue
             p = hdf[param]
-            dp = Parameter(name=p.name, array=p.array,
-                           frequency=p.frequency, offset=p.offset)
-            for row in rows:
-                row[param] = dp.at(row['index'])
+            values = values_at_times(p.array, p.frequency, p.offset,
+                                     [row['index'] for row in timed_rows])
+            for row, value in zip(timed_rows, values.tolist()):
+                row[param] = value
 
     # sort rows
     rows = sorted(rows, key=lambda x: x['index'])
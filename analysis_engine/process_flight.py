@@ -1,15 +1,21 @@
 from __future__ import print_function
 
 import argparse
+import heapq
 import itertools
 import logging
 import os
 import simplejson as json
 import six
 import sys
+import types
 from math import ceil
+from time import perf_counter
 
-from datetime import datetime, timedelta
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from datetime import datetime
 from networkx.readwrite import json_graph
 
 from flightdatautilities.filesystem_tools import copy_file
@@ -17,17 +23,26 @@ from flightdatautilities.filesystem_tools import copy_file
 from hdfaccess.file import hdf_file
 
 from analysis_engine import hooks, settings, __version__
-from analysis_engine.dependency_graph import dependency_order
+from analysis_engine.dependency_graph import dependency_order, dependent_nodes
+from analysis_engine.exceptions import FlightTimeoutError
 from analysis_engine.json_tools import json_to_process_flight, process_flight_to_nodes
-from analysis_engine.library import np_ma_masked_zeros, repair_mask
+from analysis_engine.library import (datetimes_of_indices, np_ma_masked_zeros, repair_mask,
+                                     values_at_times)
 from analysis_engine.node import (ApproachNode, Attribute,
+                                  copy_node,
                                   derived_param_from_hdf,
                                   DerivedParameterNode,
                                   FlightAttributeNode,
+                                  HDFParameterCache,
+                                  get_node_fingerprint,
+                                  item_columns,
                                   KeyPointValueNode,
                                   KeyTimeInstanceNode,
-                                  NodeManager, P, Section, SectionNode,
-                                  NODE_SUBCLASSES)
+                                  NodeCache, NodeManager, P,
+                                  PrivateNodeCache, Section,
+                                  SectionNode, NODE_SUBCLASSES,
+                                  set_item_fields)
+from analysis_engine.profiler import NodeProfiler
 from analysis_engine.settings import NODE_CACHE
 from analysis_engine.utils import get_aircraft_info, get_derived_nodes
 
@@ -64,9 +79,14 @@ def geo_locate(hdf, items):
     lat_pos.array = repair_mask(lat_pos.array, repair_duration=None, extrapolate=True)
     lon_pos.array = repair_mask(lon_pos.array, repair_duration=None, extrapolate=True)
 
-    for item in itertools.chain.from_iterable(six.itervalues(items)):
-        item.latitude = lat_pos.at(item.index) or None
-        item.longitude = lon_pos.at(item.index) or None
+    # OPT: Source the position of every item at once.
+    all_items = list(itertools.chain.from_iterable(six.itervalues(items)))
+    times = item_columns(all_items, ('index',))[0]['index']
+    latitudes = values_at_times(lat_pos.array, lat_pos.frequency, lat_pos.offset, times)
+    longitudes = values_at_times(lon_pos.array, lon_pos.frequency, lon_pos.offset, times)
+    set_item_fields(all_items,
+                    latitude=[latitude or None for latitude in latitudes.tolist()],
+                    longitude=[longitude or None for longitude in longitudes.tolist()])
     return items
 
 
@@ -79,8 +99,10 @@ def _timestamp(start_datetime, items):
     :param item_list: list of objects with a .index attribute
     :type item_list: list
     '''
-    for item in itertools.chain.from_iterable(six.itervalues(items)):
-        item.datetime = start_datetime + timedelta(seconds=float(item.index))
+    # OPT: Timestamp every item at once.
+    all_items = list(itertools.chain.from_iterable(six.itervalues(items)))
+    indices = item_columns(all_items, ('index',))[0]['index']
+    set_item_fields(all_items, datetime=datetimes_of_indices(start_datetime, indices))
     return items
 
 
@@ -101,7 +123,383 @@ def serialise_datetime(value):
     raise TypeError("Cannot serialise type: %s" % type(value))
 
 
-def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
+def _get_dependencies(hdf, node_mgr, node_class, params, cache, unavailable=()):
+    '''
+    Build the ordered list of dependencies for a node class. Dependencies
+    which are not available are represented as None.
+
+    :param unavailable: Dependency names which must be treated as not
+        available even if they have since been derived.
+    :type unavailable: set of strings
+    :returns: Dependencies in the order of the derive method's arguments.
+    :rtype: list
+    '''
+    deps = []
+    node_deps = node_class.get_dependency_names()
+    for dep_name in node_deps:
+        if dep_name in unavailable:
+            deps.append(None)
+        elif dep_name in params:  # already calculated KPV/KTI/Phase
+            deps.append(params[dep_name])
+        elif node_mgr.get_attribute(dep_name) is not None:
+            deps.append(node_mgr.get_attribute(dep_name))
+        elif dep_name in node_mgr.hdf_keys:
+            # LFL/Derived parameter
+            # all parameters (LFL or other) need get_aligned which is
+            # available on DerivedParameterNode
+            try:
+                dp = derived_param_from_hdf(hdf.get_param(
+                    dep_name, valid_only=True), cache=cache)
+            except KeyError:
+                # Parameter is invalid.
+                dp = None
+            deps.append(dp)
+        else:  # dependency not available
+            deps.append(None)
+    if all([d is None for d in deps]):
+        raise RuntimeError(
+            "No dependencies available - Nodes cannot "
+            "operate without ANY dependencies available! "
+            "Node: %s" % node_class.__name__)
+    return deps
+
+
+def _store_node(hdf, node_mgr, state, param_name, node, force=False):
+    '''
+    Validate the result of a derived node, align it to 1Hz where required and
+    store it within state (or the HDF file for parameters).
+    '''
+    duration = state.duration
+
+    if node.node_type is KeyPointValueNode:
+        state.params[param_name] = node
+
+        aligned_kpvs = []
+        for one_hz in node.get_aligned(P(frequency=1, offset=0)):
+            if not (0 <= one_hz.index <= duration+4):
+                raise IndexError(
+                    "KPV '%s' index %.2f is not between 0 and %d" %
+                    (one_hz.name, one_hz.index, duration))
+            aligned_kpvs.append(one_hz)
+        state.kpvs[param_name] = aligned_kpvs
+    elif node.node_type is KeyTimeInstanceNode:
+        state.params[param_name] = node
+
+        aligned_ktis = []
+        for one_hz in node.get_aligned(P(frequency=1, offset=0)):
+            if not (0 <= one_hz.index <= duration+4):
+                raise IndexError(
+                    "KTI '%s' index %.2f is not between 0 and %d" %
+                    (one_hz.name, one_hz.index, duration))
+            aligned_ktis.append(one_hz)
+        state.ktis[param_name] = aligned_ktis
+    elif node.node_type is FlightAttributeNode:
+        state.params[param_name] = node
+        try:
+            # only has one Attribute node, store as a list for consistency
+            state.flight_attrs[param_name] = [Attribute(node.name, node.value)]
+        except FlightTimeoutError:
+            raise
+        except:
+            logger.warning("Flight Attribute Node '%s' returned empty "
+                           "handed.", param_name)
+    elif issubclass(node.node_type, SectionNode):
+        aligned_section = node.get_aligned(P(frequency=1, offset=0))
+        for index, one_hz in enumerate(aligned_section):
+            # SectionNodes allow slice starts and stops being None which
+            # signifies the beginning and end of the data. To avoid
+            # TypeErrors in subsequent derive methods which perform
+            # arithmetic on section slice start and stops, replace with 0
+            # or hdf.duration.
+            fallback = lambda x, y: x if x is not None else y
+
+            duration = fallback(duration, 0)
+
+            start = fallback(one_hz.slice.start, 0)
+            stop = fallback(one_hz.slice.stop, duration)
+            start_edge = fallback(one_hz.start_edge, 0)
+            stop_edge = fallback(one_hz.stop_edge, duration)
+
+            slice_ = slice(start, stop)
+            one_hz = Section(one_hz.name, slice_, start_edge, stop_edge)
+            aligned_section[index] = one_hz
+
+            if not (0 <= start <= duration and 0 <= stop <= duration + 4):
+                msg = "Section '%s' (%.2f, %.2f) not between 0 and %d"
+                raise IndexError(
+                    msg % (one_hz.name, start, stop, duration))
+            if not 0 <= start_edge <= duration:
+                msg = "Section '%s' start_edge (%.2f) not between 0 and %d"
+                raise IndexError(msg % (one_hz.name, start_edge, duration))
+            if not 0 <= stop_edge <= duration + 4:
+                msg = "Section '%s' stop_edge (%.2f) not between 0 and %d"
+                raise IndexError(msg % (one_hz.name, stop_edge, duration))
+            #section_list.append(one_hz)
+        state.params[param_name] = aligned_section
+        state.sections[param_name] = list(aligned_section)
+    elif issubclass(node.node_type, DerivedParameterNode):
+        if duration:
+            # check that the right number of nodes were returned Allow a
+            # small tolerance. For example if duration in seconds is 2822,
+            # then there will be an array length of  1411 at 0.5Hz and 706
+            # at 0.25Hz (rounded upwards). If we combine two 0.25Hz
+            # parameters then we will have an array length of 1412.
+            expected_length = ceil(duration * node.frequency)
+            if node.array is None or (force and len(node.array) == 0):
+                logger.warning("No array set; creating a fully masked "
+                               "array for %s", param_name)
+                array_length = expected_length
+                # Where a parameter is wholly masked, we fill the HDF
+                # file with masked zeros to maintain structure.
+                node.array = \
+                    np_ma_masked_zeros(expected_length)
+            else:
+                array_length = len(node.array)
+            length_diff = array_length - expected_length
+            if length_diff == 0:
+                pass
+            elif 0 < length_diff < 5:
+                logger.warning("Cutting excess data for parameter '%s'. "
+                               "Expected length was '%s' while resulting "
+                               "array length was '%s'.", param_name,
+                               expected_length, len(node.array))
+                node.array = node.array[:expected_length]
+            else:
+                raise ValueError("Array length mismatch for parameter "
+                                 "'%s'. Expected '%s', resulting array "
+                                 "length '%s'." % (param_name,
+                                                   expected_length,
+                                                   array_length))
+
+        hdf.set_param(node)
+        # Keep hdf_keys up to date.
+        node_mgr.hdf_keys.append(param_name)
+    elif issubclass(node.node_type, ApproachNode):
+        aligned_approach = node.get_aligned(P(frequency=1, offset=0))
+        for approach in aligned_approach:
+            # Does not allow slice start or stops to be None.
+            valid_turnoff = (not approach.turnoff or
+                             (0 <= approach.turnoff <= duration))
+            valid_slice = ((0 <= approach.slice.start <= duration) and
+                           (0 <= approach.slice.stop <= duration))
+            valid_gs_est = (not approach.gs_est or
+                            ((0 <= approach.gs_est.start <= duration) and
+                             (0 <= approach.gs_est.stop <= duration)))
+            valid_loc_est = (not approach.loc_est or
+                             ((0 <= approach.loc_est.start <= duration) and
+                              (0 <= approach.loc_est.stop <= duration)))
+            if not all([valid_turnoff, valid_slice, valid_gs_est,
+                        valid_loc_est]):
+                raise ValueError('ApproachItem contains index outside of '
+                                 'flight data: %s' % approach)
+        state.params[param_name] = aligned_approach
+        state.approaches[param_name] = list(aligned_approach)
+    else:
+        raise NotImplementedError("Unknown Type %s" % node.__class__)
+
+
+def _store_initial_node(state, param_name):
+    '''
+    Populate the output of a node provided within the initial data (already at
+    1Hz).
+    '''
+    node = state.params[param_name]
+    if node.node_type is KeyPointValueNode:
+        state.kpvs[param_name] = list(node)
+    elif node.node_type is KeyTimeInstanceNode:
+        state.ktis[param_name] = list(node)
+    elif node.node_type is FlightAttributeNode:
+        state.flight_attrs[param_name] = [Attribute(node.name, node.value)]
+    elif node.node_type is SectionNode:
+        state.sections[param_name] = list(node)
+    # DerivedParameterNodes are not supported in initial data.
+
+
+def _init_node(hdf, node_mgr, node_class, params, cache, profile=None):
+    '''
+    Initialise a node ready for deriving.
+    '''
+    node = node_class(cache=cache)
+    # shhh, secret accessors for developing nodes in debug mode
+    node._p = params
+    node._h = hdf
+    node._n = node_mgr
+    if profile is not None:
+        node._profile = profile
+    return node
+
+
+def _derive_node(node, deps, force=False):
+    '''
+    Derive the node from its dependencies. Errors are raised unless force is
+    True in which case the partially derived node is returned.
+    '''
+    try:
+        node = node.get_derived(deps)
+    except FlightTimeoutError:
+        raise
+    except:
+        if not force:
+            raise
+
+    del node._p
+    del node._h
+    del node._n
+    node.__dict__.pop('_profile', None)
+    return node
+
+
+def _profile_node(profiler, param_name, node_class):
+    '''
+    Profile processing of a node if a profiler is provided.
+    '''
+    if profiler is None:
+        return nullcontext()
+    for base_class in node_class.__bases__:
+        if base_class in NODE_SUBCLASSES:
+            node_type = base_class.__name__
+            break
+    else:
+        node_type = node_class.__name__
+    return profiler.profile(param_name, node_type)
+
+
+def _dependency_uses(node_mgr, process_order, initial):
+    '''
+    Find the dependencies which each node within process_order will read,
+    i.e. those available before the node is derived.
+
+    :param initial: Names of nodes provided within the initial data.
+    :type initial: set of strings
+    :returns: Dependency names read by each node.
+    :rtype: dict of sets
+    '''
+    position = {name: index for index, name in enumerate(process_order)}
+    uses = {}
+    for index, param_name in enumerate(process_order):
+        if param_name in initial:
+            continue
+        dep_names = node_mgr.derived_nodes[param_name].get_dependency_names()
+        uses[param_name] = {d for d in dep_names if position.get(d, -1) < index}
+    return uses
+
+
+def _release_node(hdf, state, name):
+    '''
+    Release a node which no remaining node within the process order will read.
+
+    :type hdf: HDFParameterCache
+    '''
+    if settings.NODE_RELEASE:
+        if name not in state.initial:
+            state.params.pop(name, None)
+        hdf.release(name)
+
+
+def _release_dependencies(hdf, state, param_name):
+    '''
+    Release param_name's dependencies once param_name was their last consumer
+    and param_name itself if no remaining node will read it.
+    '''
+    for dep_name in state.uses.pop(param_name, ()):
+        state.consumers[dep_name] -= 1
+        if state.consumers[dep_name] <= 0:
+            del state.consumers[dep_name]
+            if state.cache is not None:
+                state.cache.release(dep_name)
+            _release_node(hdf, state, dep_name)
+    if param_name not in state.consumers:
+        # Nodes without consumers are never aligned, so are not cached.
+        _release_node(hdf, state, param_name)
+
+
+def _derive_parameters_parallel(hdf, node_mgr, process_order, state, force, workers):
+    '''
+    Derives parameters using a pool of worker threads. A node is submitted
+    once every dependency which precedes it within process_order has been
+    stored. Reading dependencies and storing results (including writing to
+    the HDF file) happen on the calling thread so that file access is
+    serialised, while derive methods run concurrently. Derived nodes are
+    buffered until every node preceding them within process_order has been
+    stored, so that results are stored in the same order as serial processing.
+
+    Dependencies which follow a node within process_order (circular
+    dependencies) are withheld from it, exactly as in serial processing.
+
+    Each node is given private copies of its dependencies and of the aligned
+    nodes it reads from the cache, as derive methods may modify them in-place.
+    '''
+    position = {name: index for index, name in enumerate(process_order)}
+    initial = state.initial
+    node_subclasses = NODE_SUBCLASSES
+    cache = PrivateNodeCache(state.cache) if state.cache is not None else None
+
+    # Nodes which must be stored before each node may be derived.
+    waiting = {}
+    # Names of nodes waiting on each node.
+    consumers = defaultdict(list)
+    # Dependencies which each node must not see.
+    unavailable = {}
+    ready = []
+    for index, param_name in enumerate(process_order):
+        if param_name in initial:
+            continue
+        dep_names = set(node_mgr.derived_nodes[param_name].get_dependency_names())
+        dep_names -= initial
+        waiting[param_name] = {d for d in dep_names if position.get(d, index) < index}
+        unavailable[param_name] = {d for d in dep_names if position.get(d, index) > index}
+        for dep_name in waiting[param_name]:
+            consumers[dep_name].append(param_name)
+        if not waiting[param_name]:
+            heapq.heappush(ready, index)
+
+    running = {}
+    # Derived nodes waiting for the nodes preceding them to be stored.
+    derived = {}
+    stored = 0
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            # Store nodes in process order.
+            while stored < len(process_order):
+                param_name = process_order[stored]
+                if param_name in initial:
+                    _store_initial_node(state, param_name)
+                elif stored in derived:
+                    _store_node(hdf, node_mgr, state, param_name, derived.pop(stored), force=force)
+                    _release_dependencies(hdf, state, param_name)
+                    for consumer in consumers.pop(param_name, ()):
+                        waiting[consumer].discard(param_name)
+                        if not waiting[consumer]:
+                            heapq.heappush(ready, position[consumer])
+                else:
+                    break
+                stored += 1
+            if not (ready or running):
+                break
+
+            # Submit ready nodes in process order.
+            while ready:
+                param_name = process_order[heapq.heappop(ready)]
+                node_class = node_mgr.derived_nodes[param_name]
+                deps = _get_dependencies(hdf, node_mgr, node_class, state.params,
+                                         cache, unavailable=unavailable[param_name])
+                deps = [None if dep is None else copy_node(dep, cache) for dep in deps]
+                node = _init_node(hdf, node_mgr, node_class, state.params, cache)
+                logger.debug("Processing %s `%s`", get_node_type(node, node_subclasses), param_name)
+                running[executor.submit(_derive_node, node, deps, force)] = param_name
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=lambda f: position[running[f]]):
+                derived[position[running.pop(future)]] = future.result()
+    finally:
+        for future in running:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def derive_parameters(hdf, node_mgr, process_order, params=None, force=False, workers=None,
+                      profiler=None):
     '''
     Derives parameters in process_order. Dependencies are sourced via the
     node_mgr.
@@ -114,213 +512,90 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
     :param process_order: Parameter / Node class names in the required order to
         be processed
     :type process_order: list of strings
+    :param workers: Number of worker threads deriving independent nodes
+        concurrently. Defaults to settings.DERIVE_PARAMETERS_WORKERS; None, 0
+        or 1 derive nodes serially.
+    :type workers: int or None
+    :param profiler: Records the time taken and memory allocated by each
+        node. Nodes are derived serially while profiling.
+    :type profiler: NodeProfiler or None
     '''
     if not params:
         params = {}
+    if workers is None:
+        workers = settings.DERIVE_PARAMETERS_WORKERS
+    if profiler is not None and workers and workers > 1:
+        logger.info("Deriving nodes serially while profiling.")
+        workers = None
+
+    state = types.SimpleNamespace(
+        params=params,
+        # store all derived params that aren't masked arrays
+        approaches={},
+        # duplicate storage, but maintaining types
+        kpvs={},
+        ktis={},
+        # 'Node Name' : node()  pass in node.get_accessor()
+        sections={},
+        flight_attrs={},
+        # cache of nodes to avoid repeated array alignment
+        cache=NodeCache(settings.NODE_CACHE_MAX_BYTES) if NODE_CACHE else None,
+        duration=hdf.duration,
+    )
+    # dependencies read by each node and the number of nodes reading each
+    # dependency, used to release nodes after their last use
+    state.initial = set(params)
+    state.uses = _dependency_uses(node_mgr, process_order, state.initial)
+    state.consumers = Counter(d for dep_names in state.uses.values() for d in dep_names)
+
+    # OPT: Parameters within hdf.cache_param_list are cached here rather than
+    # by hdf_file, which cannot remove a cached parameter, so that they are
+    # released after their last use.
+    with HDFParameterCache(hdf) as hdf:
+        if workers and workers > 1:
+            _derive_parameters_parallel(hdf, node_mgr, process_order, state, force, workers)
+        else:
+            with profiler.tracing() if profiler else nullcontext():
+                _derive_parameters_serial(hdf, node_mgr, process_order, state, force, profiler)
+        logger.debug("HDF parameter cache statistics: %s", hdf.stats())
+
+    if state.cache is not None:
+        logger.debug("Node cache statistics: %s", state.cache.stats())
+    return state.ktis, state.kpvs, state.sections, state.approaches, state.flight_attrs
+
+
+def _derive_parameters_serial(hdf, node_mgr, process_order, state, force, profiler=None):
+    '''
+    Derives parameters one at a time in process_order.
+    '''
+    params = state.params
     # OPT: local lookup is faster than module-level (small).
     node_subclasses = NODE_SUBCLASSES
 
-    # store all derived params that aren't masked arrays
-    approaches = {}
-    # duplicate storage, but maintaining types
-    kpvs = {}
-    ktis = {}
-    # 'Node Name' : node()  pass in node.get_accessor()
-    sections = {}
-    flight_attrs = {}
-    # cache of nodes to avoid repeated array alignment
-    cache = {} if NODE_CACHE else None
-    duration = hdf.duration
-
     for param_name in process_order:
         if param_name in params:
-            node = params[param_name]
             # populate output already at 1Hz
-            if node.node_type is KeyPointValueNode:
-                kpvs[param_name] = list(node)
-            elif node.node_type is KeyTimeInstanceNode:
-                ktis[param_name] = list(node)
-            elif node.node_type is FlightAttributeNode:
-                flight_attrs[param_name] = [Attribute(node.name, node.value)]
-            elif node.node_type is SectionNode:
-                sections[param_name] = list(node)
-            # DerivedParameterNodes are not supported in initial data.
+            _store_initial_node(state, param_name)
             continue
 
         #NB raises KeyError if Node is "unknown"
         node_class = node_mgr.derived_nodes[param_name]
 
-        # build ordered dependencies
-        deps = []
-        node_deps = node_class.get_dependency_names()
-        for dep_name in node_deps:
-            if dep_name in params:  # already calculated KPV/KTI/Phase
-                deps.append(params[dep_name])
-            elif node_mgr.get_attribute(dep_name) is not None:
-                deps.append(node_mgr.get_attribute(dep_name))
-            elif dep_name in node_mgr.hdf_keys:
-                # LFL/Derived parameter
-                # all parameters (LFL or other) need get_aligned which is
-                # available on DerivedParameterNode
-                try:
-                    dp = derived_param_from_hdf(hdf.get_param(
-                        dep_name, valid_only=True), cache=cache)
-                except KeyError:
-                    # Parameter is invalid.
-                    dp = None
-                deps.append(dp)
-            else:  # dependency not available
-                deps.append(None)
-        if all([d is None for d in deps]):
-            raise RuntimeError(
-                "No dependencies available - Nodes cannot "
-                "operate without ANY dependencies available! "
-                "Node: %s" % node_class.__name__)
-
-        # initialise node
-        node = node_class(cache=cache)
-        # shhh, secret accessors for developing nodes in debug mode
-        node._p = params
-        node._h = hdf
-        node._n = node_mgr
-        logger.debug("Processing %s `%s`", get_node_type(node, node_subclasses), param_name)
-        # Derive the resulting value
+        with _profile_node(profiler, param_name, node_class) as profile:
+            # build ordered dependencies
+            deps = _get_dependencies(hdf, node_mgr, node_class, params, state.cache)
 
-        try:
-            node = node.get_derived(deps)
-        except:
-            if not force:
-                raise
-
-        del node._p
-        del node._h
-        del node._n
-
-        if node.node_type is KeyPointValueNode:
-            params[param_name] = node
-
-            aligned_kpvs = []
-            for one_hz in node.get_aligned(P(frequency=1, offset=0)):
-                if not (0 <= one_hz.index <= duration+4):
-                    raise IndexError(
-                        "KPV '%s' index %.2f is not between 0 and %d" %
-                        (one_hz.name, one_hz.index, duration))
-                aligned_kpvs.append(one_hz)
-            kpvs[param_name] = aligned_kpvs
-        elif node.node_type is KeyTimeInstanceNode:
-            params[param_name] = node
-
-            aligned_ktis = []
-            for one_hz in node.get_aligned(P(frequency=1, offset=0)):
-                if not (0 <= one_hz.index <= duration+4):
-                    raise IndexError(
-                        "KTI '%s' index %.2f is not between 0 and %d" %
-                        (one_hz.name, one_hz.index, duration))
-                aligned_ktis.append(one_hz)
-            ktis[param_name] = aligned_ktis
-        elif node.node_type is FlightAttributeNode:
-            params[param_name] = node
-            try:
-                # only has one Attribute node, store as a list for consistency
-                flight_attrs[param_name] = [Attribute(node.name, node.value)]
-            except:
-                logger.warning("Flight Attribute Node '%s' returned empty "
-                               "handed.", param_name)
-        elif issubclass(node.node_type, SectionNode):
-            aligned_section = node.get_aligned(P(frequency=1, offset=0))
-            for index, one_hz in enumerate(aligned_section):
-                # SectionNodes allow slice starts and stops being None which
-                # signifies the beginning and end of the data. To avoid
-                # TypeErrors in subsequent derive methods which perform
-                # arithmetic on section slice start and stops, replace with 0
-                # or hdf.duration.
-                fallback = lambda x, y: x if x is not None else y
-
-                duration = fallback(duration, 0)
-
-                start = fallback(one_hz.slice.start, 0)
-                stop = fallback(one_hz.slice.stop, duration)
-                start_edge = fallback(one_hz.start_edge, 0)
-                stop_edge = fallback(one_hz.stop_edge, duration)
-
-                slice_ = slice(start, stop)
-                one_hz = Section(one_hz.name, slice_, start_edge, stop_edge)
-                aligned_section[index] = one_hz
-
-                if not (0 <= start <= duration and 0 <= stop <= duration + 4):
-                    msg = "Section '%s' (%.2f, %.2f) not between 0 and %d"
-                    raise IndexError(
-                        msg % (one_hz.name, start, stop, duration))
-                if not 0 <= start_edge <= duration:
-                    msg = "Section '%s' start_edge (%.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, start_edge, duration))
-                if not 0 <= stop_edge <= duration + 4:
-                    msg = "Section '%s' stop_edge (%.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, stop_edge, duration))
-                #section_list.append(one_hz)
-            params[param_name] = aligned_section
-            sections[param_name] = list(aligned_section)
-        elif issubclass(node.node_type, DerivedParameterNode):
-            if duration:
-                # check that the right number of nodes were returned Allow a
-                # small tolerance. For example if duration in seconds is 2822,
-                # then there will be an array length of  1411 at 0.5Hz and 706
-                # at 0.25Hz (rounded upwards). If we combine two 0.25Hz
-                # parameters then we will have an array length of 1412.
-                expected_length = ceil(duration * node.frequency)
-                if node.array is None or (force and len(node.array) == 0):
-                    logger.warning("No array set; creating a fully masked "
-                                   "array for %s", param_name)
-                    array_length = expected_length
-                    # Where a parameter is wholly masked, we fill the HDF
-                    # file with masked zeros to maintain structure.
-                    node.array = \
-                        np_ma_masked_zeros(expected_length)
-                else:
-                    array_length = len(node.array)
-                length_diff = array_length - expected_length
-                if length_diff == 0:
-                    pass
-                elif 0 < length_diff < 5:
-                    logger.warning("Cutting excess data for parameter '%s'. "
-                                   "Expected length was '%s' while resulting "
-                                   "array length was '%s'.", param_name,
-                                   expected_length, len(node.array))
-                    node.array = node.array[:expected_length]
-                else:
-                    raise ValueError("Array length mismatch for parameter "
-                                     "'%s'. Expected '%s', resulting array "
-                                     "length '%s'." % (param_name,
-                                                       expected_length,
-                                                       array_length))
-
-            hdf.set_param(node)
-            # Keep hdf_keys up to date.
-            node_mgr.hdf_keys.append(param_name)
-        elif issubclass(node.node_type, ApproachNode):
-            aligned_approach = node.get_aligned(P(frequency=1, offset=0))
-            for approach in aligned_approach:
-                # Does not allow slice start or stops to be None.
-                valid_turnoff = (not approach.turnoff or
-                                 (0 <= approach.turnoff <= duration))
-                valid_slice = ((0 <= approach.slice.start <= duration) and
-                               (0 <= approach.slice.stop <= duration))
-                valid_gs_est = (not approach.gs_est or
-                                ((0 <= approach.gs_est.start <= duration) and
-                                 (0 <= approach.gs_est.stop <= duration)))
-                valid_loc_est = (not approach.loc_est or
-                                 ((0 <= approach.loc_est.start <= duration) and
-                                  (0 <= approach.loc_est.stop <= duration)))
-                if not all([valid_turnoff, valid_slice, valid_gs_est,
-                            valid_loc_est]):
-                    raise ValueError('ApproachItem contains index outside of '
-                                     'flight data: %s' % approach)
-            params[param_name] = aligned_approach
-            approaches[param_name] = list(aligned_approach)
-        else:
-            raise NotImplementedError("Unknown Type %s" % node.__class__)
-        continue
-    return ktis, kpvs, sections, approaches, flight_attrs
+            # initialise node
+            node = _init_node(hdf, node_mgr, node_class, params, state.cache, profile=profile)
+            logger.debug("Processing %s `%s`", get_node_type(node, node_subclasses), param_name)
+            # Derive the resulting value
+            node = _derive_node(node, deps, force=force)
+
+            store_start = perf_counter()
+            _store_node(hdf, node_mgr, state, param_name, node, force=force)
+            if profile is not None:
+                profile.store_time = perf_counter() - store_start
+        _release_dependencies(hdf, state, param_name)
 
 
 def parse_analyser_profiles(analyser_profiles, filter_modules=None):
@@ -353,11 +628,78 @@ def parse_analyser_profiles(analyser_profiles, filter_modules=None):
     return additional_modules, required_nodes
 
 
+def _get_dependency_tree(hdf):
+    '''
+    :returns: Spanning tree graph stored within the HDF file by the previous
+        run of process_flight or None if not stored.
+    :rtype: nx.DiGraph or None
+    '''
+    tree = hdf.dependency_tree
+    if tree and isinstance(tree, six.string_types):
+        tree = json.loads(tree)
+    return json_graph.node_link_graph(tree) if tree else None
+
+
+def _get_node_fingerprints(hdf):
+    '''
+    :returns: Fingerprints of the node classes which derived each node stored
+        within the HDF file by the previous run of process_flight.
+    :rtype: dict
+    '''
+    fingerprints = hdf.get_attr('node_fingerprints')
+    return json.loads(fingerprints) if fingerprints else {}
+
+
+def _stale_nodes(derived_nodes, graph, fingerprints):
+    '''
+    Find the nodes within the previous dependency tree which were derived by
+    a different version of their class and the nodes which depend upon them.
+
+    :type derived_nodes: dict
+    :param graph: Spanning tree graph of the previous run.
+    :type graph: nx.DiGraph
+    :param fingerprints: Fingerprints of node classes from the previous run.
+    :type fingerprints: dict
+    :rtype: set of str
+    '''
+    changed = {
+        name for name in graph if name in derived_nodes
+        and fingerprints.get(name) != get_node_fingerprint(derived_nodes[name])
+    }
+    return dependent_nodes(graph, changed)
+
+
+def _node_fingerprints(node_mgr, gr_st, process_order, initial, previous):
+    '''
+    Fingerprint the node classes which derived each node within the spanning
+    tree. Nodes which were not derived, i.e. read from the HDF file or provided
+    within initial, keep the fingerprint of the previous run.
+
+    :type node_mgr: NodeManager
+    :type gr_st: nx.DiGraph
+    :type process_order: list of str
+    :param initial: Names of nodes provided within initial.
+    :type initial: set of str
+    :param previous: Fingerprints stored by the previous run.
+    :type previous: dict
+    :rtype: dict
+    '''
+    derived = set(process_order) - initial
+    fingerprints = {}
+    for name in gr_st:
+        if name in derived:
+            fingerprints[name] = get_node_fingerprint(node_mgr.derived_nodes[name])
+        elif name in previous:
+            fingerprints[name] = previous[name]
+    return fingerprints
+
+
 def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_record={},
                    requested=[], required=[], include_flight_attributes=True,
                    additional_modules=[], pre_flight_kwargs={}, force=False,
                    initial={}, reprocess=False, requested_only=False,
-                   dependency_tree_log=False):
+                   dependency_tree_log=False, workers=None, profiler=None,
+                   incremental=False):
     '''
     Processes the HDF file (segment_info['File']) to derive the required_params (Nodes)
     within python modules (settings.NODE_MODULES).
@@ -391,6 +733,12 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
     :type reprocess: bool
     :param requested_only: Process only requested parameters, not dependencies or children.
     :type requested_only: bool
+    :param workers: Number of worker threads used to derive independent nodes concurrently (see derive_parameters).
+    :type workers: int or None
+    :param profiler: Records the time taken and memory allocated by each node (see derive_parameters).
+    :type profiler: NodeProfiler or None
+    :param incremental: Only derive nodes whose class has changed since the previous run stored within the HDF file and the nodes which depend upon them. Other derived parameters are read from the HDF file and other nodes are taken from initial, i.e. the results of the previous run. Ignored if reprocess is True. Fingerprints of the node classes are stored for the next run when incremental is True or settings.STORE_NODE_FINGERPRINTS is enabled.
+    :type incremental: bool
 
     :returns: See below:
     :rtype: Dict
@@ -567,9 +915,9 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
     else:
         node_modules = settings.NODE_MODULES + additional_modules
     # go through modules to get derived nodes
-    derived_nodes = get_derived_nodes(node_modules)
+    derived_nodes = get_derived_nodes(node_modules, manifest_path=settings.NODE_MANIFEST_PATH)
 
-    if segment_info['Segment Type'] == 'GROUND_ONLY':
+    if segment_info['Segment Type'] == 'GROUND_ONLY' and settings.DEPENDENCY_RESOLVER == 'recursive':
         # Owing to the huge increase in circular dependancies when building
         # the process_order for GROUND_ONLY segments. Logging on clery workers
         # run out of disk space and then stops. Processing time also increases.
@@ -578,7 +926,8 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
         # for certain events. This reduce the circlar dependencies from
         # 17,860 to 908 (worst case frame) and reduces frames with circular
         # dependency issues from 100 to 33
-        # TODO: Fix circular dependancies for GROUND_ONLY
+        # The iterative resolver (settings.DEPENDENCY_RESOLVER) avoids
+        # re-traversing inoperable nodes and resolves the full node set.
         requested = [
             'Groundspeed During Rejected Takeoff Max',
             #'Eng Torque During Taxi Max',
@@ -605,9 +954,12 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
             requested_subset + list(get_derived_nodes(
                 ['analysis_engine.flight_attribute']).keys())))
 
+    store_fingerprints = incremental or settings.STORE_NODE_FINGERPRINTS
+    incremental = incremental and not reprocess and not requested_only
     initial = process_flight_to_nodes(initial)
-    for node_name in requested_subset:
-        initial.pop(node_name, None)
+    if not incremental:
+        for node_name in requested_subset:
+            initial.pop(node_name, None)
 
     # open HDF for reading
     with hdf_file(hdf_path) as hdf:
@@ -626,7 +978,27 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
             hdf.valid_param_names()
         pre_process_parameters(hdf, segment_info, param_names, required,
                                aircraft_info, achieved_flight_record, force=force,
-                               dependency_tree_log=dependency_tree_log)
+                               dependency_tree_log=dependency_tree_log, profiler=profiler)
+
+        if store_fingerprints and not reprocess:
+            previous_fingerprints = _get_node_fingerprints(hdf)
+        else:
+            previous_fingerprints = {}
+        if incremental:
+            previous_tree = _get_dependency_tree(hdf)
+            if previous_tree is None or not previous_fingerprints:
+                logger.warning("Dependency tree or node fingerprints of the previous run not stored "
+                               "within '%s' - deriving all nodes.", hdf_path)
+                stale = set(requested_subset)
+            else:
+                stale = _stale_nodes(derived_nodes, previous_tree, previous_fingerprints)
+                logger.info("Deriving %d nodes changed since the previous run or depending upon "
+                            "changed nodes.", len(stale))
+            # Re-derive stale parameters rather than reading them from the HDF.
+            lfl_param_names = set(hdf.valid_lfl_param_names())
+            param_names = [n for n in param_names if n in lfl_param_names or n not in stale]
+            for node_name in stale:
+                initial.pop(node_name, None)
 
         if requested_only:
             param_names = list(set(param_names) - set(requested_subset))
@@ -654,8 +1026,10 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
                              hdf.cache_param_list)
 
         # derive parameters
+        initial_names = set(initial)
         ktis, kpvs, sections, approaches, flight_attrs = \
-            derive_parameters(hdf, node_mgr, process_order, params=initial, force=force)
+            derive_parameters(hdf, node_mgr, process_order, params=initial, force=force,
+                              workers=workers, profiler=profiler)
 
         # geo locate KTIs
         ktis = geo_locate(hdf, ktis)
@@ -671,6 +1045,10 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
 
             # Store dependency tree
             hdf.dependency_tree = json.dumps(json_graph.node_link_data(gr_st))
+            if store_fingerprints:
+                # Store fingerprints of node classes for incremental processing
+                hdf.set_attr('node_fingerprints', json.dumps(_node_fingerprints(
+                    node_mgr, gr_st, process_order, initial_names, previous_fingerprints)))
 
             # Store aircraft info
             hdf.set_attr('aircraft_info', json.dumps(aircraft_info))
@@ -687,7 +1065,7 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
 
 def pre_process_parameters(hdf, segment_info, param_names, required,
                      aircraft_info, achieved_flight_record, force=False,
-                     dependency_tree_log=None):
+                     dependency_tree_log=None, profiler=None):
     '''
     Perform actions prior to main processing run.
 
@@ -704,7 +1082,7 @@ def pre_process_parameters(hdf, segment_info, param_names, required,
         achieved_flight_record)
     process_order, _ = dependency_order(node_mgr, dependency_tree_log=dependency_tree_log)
 
-    derive_parameters(hdf, node_mgr, process_order, force=force)
+    derive_parameters(hdf, node_mgr, process_order, force=force, profiler=profiler)
 
 
 def main():
@@ -789,6 +1167,15 @@ def main():
                         help='Path to initial nodes in json format.')
     parser.add_argument('--dependency-log', dest='dependency_tree_log', type=str,
                         help='Dependency tree log filename.')
+    parser.add_argument('--workers', dest='workers', type=int, default=None,
+                        help='Number of threads used to derive independent nodes concurrently.')
+    parser.add_argument('--profile', dest='profile', type=str,
+                        help='Path to write per-node timings to (CSV if the extension is .csv, otherwise JSON).')
+    parser.add_argument('--profile-memory', dest='profile_memory', action='store_true',
+                        help='Include the peak memory allocated by each node within the profile.')
+    parser.add_argument('--incremental', dest='incremental', action='store_true',
+                        help='Only derive nodes changed since the file was last processed and nodes '
+                        'depending upon them. Previous results should be provided with -initial.')
 
     args = parser.parse_args()
 
@@ -856,12 +1243,18 @@ def main():
         'File': hdf_copy,
         'Segment Type': args.segment_type,
     }
+    profiler = NodeProfiler(trace_memory=args.profile_memory) if args.profile else None
     res = process_flight(
         segment_info, args.tail_number, aircraft_info=aircraft_info,
         requested=args.requested, required=args.required, initial=initial,
         include_flight_attributes=False,
         dependency_tree_log=dependency_tree_log,
+        workers=args.workers,
+        profiler=profiler,
+        incremental=args.incremental,
     )
+    if profiler:
+        profiler.write(args.profile)
     # Flatten results.
     res = {k: list(itertools.chain.from_iterable(six.itervalues(v)))
            for k, v in six.iteritems(res)}
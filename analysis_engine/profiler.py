@@ -0,0 +1,119 @@
+import csv
+import logging
+import simplejson as json
+import threading
+import tracemalloc
+
+from contextlib import contextmanager
+from time import perf_counter
+
+from analysis_engine.recordtype import recordtype
+
+
+logger = logging.getLogger(__name__)
+
+
+NodeProfile = recordtype(
+    'NodeProfile',
+    'name node_type total_time align_time derive_time store_time peak_bytes dependencies_aligned cache_hits',
+    default=0)
+
+
+class NodeProfiler(object):
+    '''
+    Records the time taken and memory allocated while processing each node
+    within derive_parameters.
+
+    Times are split between aligning dependencies, the derive method and
+    storing the result; the remainder of total_time is spent reading
+    dependencies. Memory is only traced when trace_memory is True as
+    tracemalloc significantly slows processing.
+
+    profiler = NodeProfiler()
+    process_flight(segment_info, tail_number, profiler=profiler)
+    profiler.to_csv('profile.csv')
+    '''
+
+    def __init__(self, trace_memory=False):
+        '''
+        :param trace_memory: Whether to record peak allocated bytes per node.
+        :type trace_memory: bool
+        '''
+        self.trace_memory = trace_memory
+        self.profiles = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, name, node_type):
+        '''
+        Profile processing of a node. The yielded NodeProfile is updated by
+        Node.get_derived with alignment and derive times.
+
+        :param name: Name of the node.
+        :type name: str
+        :param node_type: Type of the node, e.g. 'KeyPointValueNode'.
+        :type node_type: str
+        :rtype: NodeProfile
+        '''
+        profile = NodeProfile(name=name, node_type=node_type)
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.clear_traces()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+        start = perf_counter()
+        try:
+            yield profile
+        finally:
+            profile.total_time = perf_counter() - start
+            if tracing:
+                profile.peak_bytes = max(tracemalloc.get_traced_memory()[1] - start_bytes, 0)
+            with self._lock:
+                self.profiles.append(profile)
+
+    @contextmanager
+    def tracing(self):
+        '''
+        Trace memory allocations, if enabled, for the duration of the context.
+        '''
+        started = self.trace_memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            yield
+        finally:
+            if started:
+                tracemalloc.stop()
+
+    def report(self):
+        '''
+        :returns: Node profiles ordered by total time, slowest first.
+        :rtype: list of dict
+        '''
+        with self._lock:
+            profiles = list(self.profiles)
+        return [p._asdict() for p in sorted(profiles, key=lambda p: p.total_time, reverse=True)]
+
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def to_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=NodeProfile._fields)
+            writer.writeheader()
+            writer.writerows(self.report())
+
+    def write(self, path):
+        '''
+        Write the report as CSV if path has a .csv extension, otherwise JSON.
+
+        :type path: str
+        '''
+        if path.lower().endswith('.csv'):
+            self.to_csv(path)
+        else:
+            self.to_json(path)
+        logger.info("Node profile of %d nodes written to: %s", len(self.profiles), path)
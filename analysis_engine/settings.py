@@ -47,6 +47,18 @@ PRE_PROCESSING_MODULE_PATHS = [ # Cant end with _MODULES as will be added to NOD
     'analysis_engine.pre_processing.merge_parameters',
 ]
 
+# Path of a node manifest written by 'python -m analysis_engine.utils manifest'.
+# Node modules within the manifest are only imported once one of their nodes
+# is derived, reducing the time taken to start processing. The manifest is
+# ignored once a node module has changed. A value of None imports all node
+# modules.
+NODE_MANIFEST_PATH = None
+
+# Store a fingerprint of each node class within the HDF file after processing so
+# that the file may later be reprocessed incrementally. Fingerprints are always
+# stored when process_flight is called with incremental=True.
+STORE_NODE_FINGERPRINTS = False
+
 API_HTTP_HANDLER = 'analysis_engine.api_handler.HTTPHandler'
 API_HTTP_BASE_URL = None
 
@@ -105,6 +117,84 @@ NODE_CACHE = True
 # accurate to. A value of None will retain full accuracy.
 NODE_CACHE_OFFSET_DP = None
 
+# Maximum size in bytes of the arrays held by the node cache. The least recently
+# used aligned nodes are evicted once exceeded. Cached nodes are also released
+# once every node which depends upon them has been derived. A value of None
+# does not limit the size of the cache.
+NODE_CACHE_MAX_BYTES = None
+
+# Release nodes derived during processing, and parameters cached from the HDF
+# file, once every node which depends upon them has been derived to reduce peak
+# memory usage. Disable to keep nodes available within the debug accessor
+# node._p.
+NODE_RELEASE = True
+
+# Number of alignment kernels (the slices and interpolation coefficients used
+# to align an array of a given length, frequency and offset to another
+# frequency and offset) cached by library.align_args.
+ALIGN_KERNEL_CACHE_SIZE = 16
+
+
+##############################################################################
+# Dependency Order Cache
+
+
+# Number of processing orders cached in memory by dependency_order. Processing
+# orders are keyed by a fingerprint of the available parameters, requested and
+# required nodes, node modules and the attribute values used by can_operate. A
+# value of 0 disables the in-memory cache.
+DEPENDENCY_ORDER_CACHE_SIZE = 0
+
+# Directory in which to store processing orders so that they are shared between
+# processes. A value of None disables the on-disk cache.
+DEPENDENCY_ORDER_CACHE_DIR = None
+
+# Algorithm used to resolve the processing order. 'recursive' traverses the
+# dependency graph with recursion. 'iterative' resolves the same order using an
+# explicit stack, memoising can_operate results and skipping nodes which have
+# already been found to be inoperable where they do not depend on a circular
+# dependency. GROUND_ONLY segments resolve the full node set with the iterative
+# resolver rather than a restricted list of requested nodes.
+DEPENDENCY_RESOLVER = 'recursive'
+
+
+##############################################################################
+# Parallel Processing
+
+
+# Number of worker threads used by derive_parameters to derive independent
+# nodes concurrently. Dependencies are read and results are written to the HDF
+# file by a single thread in the process order. A value of 0 or 1 derives nodes
+# serially in the process order.
+DERIVE_PARAMETERS_WORKERS = 0
+
+# Number of worker processes used by split_hdf_to_segments to write segment
+# files and calculate their information concurrently. A value of 0 or 1 writes
+# segments one after another. Segments are written serially within the worker
+# processes of analysis_engine.batch.
+SPLIT_SEGMENT_WORKERS = 0
+
+# Data files longer than this duration in seconds are split by
+# split_segments_streaming, which reads the split parameters in blocks of
+# SPLIT_BLOCK_DURATION seconds rather than whole, so that memory is bounded by
+# the longest segment rather than the data file. Segments are identical to
+# those found by split_segments. None splits every data file in memory.
+SPLIT_STREAMING_DURATION = None
+SPLIT_BLOCK_DURATION = 3600
+
+# Number of worker processes used by analysis_engine.batch to split and process
+# data files concurrently. None uses the number of CPUs.
+BATCH_PROCESSES = None
+
+# Number of files each batch worker process handles before it is replaced,
+# releasing any memory it has accumulated. None keeps workers for the whole
+# batch.
+BATCH_MAX_FILES_PER_PROCESS = None
+
+# Maximum number of seconds allowed to split a data file or process a flight
+# within a batch before it is abandoned. A value of 0 disables the timeout.
+BATCH_FLIGHT_TIMEOUT = 0
+
 
 ##############################################################################
 # Parameter Analysis
@@ -3,12 +3,14 @@
 
 from __future__ import print_function
 
-from copy import deepcopy
+import multiprocessing
 import os
 import logging
 import pytz
 import numpy as np
 
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from math import floor
@@ -26,8 +28,9 @@ from analysis_engine.library import (align,
                                      min_value,
                                      mask_outside_slices,
                                      normalise,
+                                     np_ma_masked_zeros_like,
                                      repair_mask,
-                                     rate_of_change,
+                                     rate_of_change_array,
                                      runs_of_ones,
                                      slices_and_not,
                                      slices_multiply,
@@ -82,7 +85,7 @@ def _segment_type_and_slice(speed_array, speed_frequency,
                             heading_array, heading_frequency,
                             start, stop, eng_arrays,
                             aircraft_info, thresholds, hdf,
-                            vspeed=None):
+                            vspeed=None, split_params=None, offset=0):
     """
     Uses the Heading to determine whether the aircraft moved about at all and
     the airspeed to determine if it was a full or partial flight.
@@ -115,14 +118,23 @@ def _segment_type_and_slice(speed_array, speed_frequency,
     * 'START_ONLY'
     * 'STOP_ONLY'
     * 'MID_FLIGHT'
+
+    Parameters are read with split_params, if provided, so that they are read
+    from the HDF file once for all segments.
+
+    offset is the time in seconds of the first sample of speed_array,
+    heading_array, eng_arrays and vspeed when they hold a block of the data
+    file rather than all of it (aeroplanes only), while start and stop remain
+    relative to the start of the data file.
     """
+    get_param = split_params.get if split_params else hdf.get
 
-    speed_start = int(start * speed_frequency)
-    speed_stop = int(stop * speed_frequency)
+    speed_start = int((start - offset) * speed_frequency)
+    speed_stop = int((stop - offset) * speed_frequency)
     speed_array = speed_array[speed_start:speed_stop]
 
-    heading_start = int(start * heading_frequency)
-    heading_stop = int(stop * heading_frequency)
+    heading_start = int((start - offset) * heading_frequency)
+    heading_stop = int((stop - offset) * heading_frequency)
     heading_array = heading_array[heading_start:heading_stop]
 
     # remove small gaps between valid data, e.g. brief data spikes
@@ -145,7 +157,8 @@ def _segment_type_and_slice(speed_array, speed_frequency,
     vspd_threshold_exceedance = None
 
     if vspeed:
-        vert_spd_array = vspeed.array[int(start * vspeed.frequency):int(stop * vspeed.frequency)]
+        vert_spd_array = vspeed.array[int((start - offset) * vspeed.frequency):
+                                      int((stop - offset) * vspeed.frequency)]
         vspd_threshold_exceedance = \
             (np.ma.sum(vert_spd_array > thresholds['vertical_speed_max']) / vspeed.frequency) > thresholds['min_duration'] or \
             (np.ma.sum(vert_spd_array < thresholds['vertical_speed_min']) / vspeed.frequency) > thresholds['min_duration']
@@ -153,7 +166,7 @@ def _segment_type_and_slice(speed_array, speed_frequency,
     # Find out if the aircraft moved
     if aircraft_info and aircraft_info['Aircraft Type'] == 'helicopter':
         # if any gear params use them
-        gog = next((p for p in (hdf.get(n) for n in ('Gear On Ground', 'Gear (R) On Ground', 'Gear (L) On Ground')) if p), None)
+        gog = next((p for p in (get_param(n) for n in ('Gear On Ground', 'Gear (R) On Ground', 'Gear (L) On Ground')) if p), None)
         if gog:
             gog_start_idx = int(start * gog.frequency)
             gog_stop_idx = int(stop * gog.frequency)
@@ -184,7 +197,7 @@ def _segment_type_and_slice(speed_array, speed_frequency,
 
         # Test the collective. If the collective is below the COLLECTIVE_ON_GROUND_THRESHOLD
         # then the helicopter is likely be on the ground and we can test for slow_start and slow_stop.
-        col = next((p for p in (hdf.get(n) for n in ('Collective', 'Collective (1)', 'Collective (2)')) if p), None)
+        col = next((p for p in (get_param(n) for n in ('Collective', 'Collective (1)', 'Collective (2)')) if p), None)
         if col:
             col_window_sample = int(120 * col.frequency)
             col_min_sample = int(4 * col.frequency)
@@ -266,6 +279,139 @@ def _segment_type_and_slice(speed_array, speed_frequency,
     return segment_type, segment, array_start_secs
 
 
+# Engine and Groundspeed parameters used to find splits within slow slices.
+ENG_SPLIT_PARAMS = (
+    'Eng (1) N1', 'Eng (2) N1', 'Eng (3) N1', 'Eng (4) N1',
+    'Eng (1) N2', 'Eng (2) N2', 'Eng (3) N2', 'Eng (4) N2',
+    'Eng (1) Np', 'Eng (2) Np', 'Eng (3) Np', 'Eng (4) Np',
+    'Eng (1) Fuel Flow', 'Eng (2) Fuel Flow', 'Eng (3) Fuel Flow', 'Eng (4) Fuel Flow'
+)
+GROUNDSPEED_SPLIT_PARAMS = ('Groundspeed', 'Groundspeed (1)', 'Groundspeed (2)')
+
+
+class SplitParameters(object):
+    '''
+    Parameters shared by the splitting methods of split_segments and the
+    identification of the type of each segment.
+
+    The engine and Groundspeed parameters available within the HDF file are
+    read in a single pass and aligned once to align_param, or to the first
+    available if align_param is None. Other parameters requested with get are
+    read from the HDF file once.
+
+    If _slice is provided, only the samples of the engine and Groundspeed
+    parameters within _slice (in seconds) are read, e.g. a block of the data
+    file read by split_segments_streaming.
+    '''
+    def __init__(self, hdf, align_param=None, _slice=None):
+        '''
+        :param hdf: hdf_file object.
+        :type hdf: hdfaccess.file.hdf_file
+        :param align_param: Parameter to align the engine and Groundspeed
+            parameters to.
+        :type align_param: Parameter or None
+        :param _slice: Slice of the data file to read in seconds.
+        :type _slice: slice or None
+        '''
+        self.hdf = hdf
+        self.arrays = OrderedDict()
+        self.frequency = None
+        self._params = {}
+        for param_name in ENG_SPLIT_PARAMS + GROUNDSPEED_SPLIT_PARAMS:
+            try:
+                if _slice:
+                    param = hdf.get_param(param_name, _slice=_slice)
+                else:
+                    param = hdf[param_name]
+            except KeyError:
+                continue
+            if align_param:
+                # Align all other parameters to provided param or first
+                # available.  #Q: Why not force to 1Hz?
+                self.arrays[param_name] = align(param, align_param)
+            else:
+                align_param = param
+                self.arrays[param_name] = param.array
+        if self.arrays:
+            self.frequency = align_param.frequency
+
+    def get(self, name):
+        '''
+        :param name: Name of the parameter.
+        :type name: str
+        :returns: Parameter from the HDF file or None if it is not available.
+        :rtype: Parameter or None
+        '''
+        try:
+            return self._params[name]
+        except KeyError:
+            param = self._params[name] = self.hdf.get(name)
+            return param
+
+    def eng_average(self):
+        '''
+        :returns: Average of the engine parameters along with its frequency.
+            Will return None, None if no engine parameters are available.
+        :rtype: (None, None) or (np.ma.masked_array, float)
+        '''
+        arrays = [a for n, a in self.arrays.items() if n in ENG_SPLIT_PARAMS]
+        if not arrays:
+            return None, None
+        return np.ma.average(vstack_params(*arrays), axis=0), self.frequency
+
+    def maxima(self):
+        '''
+        :returns: Maximum of each engine and Groundspeed parameter, masked if
+            the parameter is entirely masked.
+        :rtype: OrderedDict
+        '''
+        if not self.arrays:
+            return OrderedDict()
+        return OrderedDict(zip(self.arrays, (a.max() for a in vstack_params(*self.arrays.values()))))
+
+    def normalised_average(self, maxima=None):
+        '''
+        :param maxima: Maximum of each parameter to normalise against, e.g.
+            the maxima of the whole data file when the parameters are a block
+            of it. If None, the maximum of each array is used.
+        :type maxima: OrderedDict or None
+        :returns: Average of the engine and Groundspeed parameters normalised
+            on a scale from 0-1.0 along with its frequency. Will return None,
+            None if no split parameters are available.
+        :rtype: (None, None) or (np.ma.masked_array, float)
+        '''
+        if not self.arrays:
+            return None, None
+        # We normalise each in turn to the range 0-1 so they have equal weight
+        if maxima is None:
+            normalised_params = [normalise(a) for a in vstack_params(*self.arrays.values())]
+        else:
+            normalised_params = [_normalise_to(a, maxima[n]) for n, a in
+                                 zip(self.arrays, vstack_params(*self.arrays.values()))]
+        # Using a true minimum leads to bias to a zero value. We take the average
+        # to allow each parameter equal weight, then (later) seek the minimum.
+        return np.ma.average(normalised_params, axis=0), self.frequency
+
+
+def _normalise_to(array, maximum):
+    '''
+    Normalise array against maximum as normalise does against the maximum of
+    array, which is masked when array is entirely masked.
+
+    :type array: np.ma.masked_array
+    :param maximum: Maximum to normalise against.
+    :type maximum: float or np.ma.masked
+    :rtype: np.ma.masked_array
+    '''
+    if maximum is np.ma.masked:
+        # Masked within every block, so array is entirely masked.
+        return normalise(array)
+    if maximum == 0:
+        # normalise would use the maximum of array as scale_max is 0.
+        return np_ma_masked_zeros_like(array)
+    return normalise(array, scale_max=maximum)
+
+
 def _get_normalised_split_params(hdf, align_param=None):
     '''
     Get split parameters (currently engine power and Groundspeed) from hdf,
@@ -277,39 +423,7 @@ def _get_normalised_split_params(hdf, align_param=None):
         Will return None, None if no split parameters are available.
     :rtype: (None, None) or (np.ma.masked_array, float)
     '''
-    params = []
-
-    split_params = (
-        'Eng (1) N1', 'Eng (2) N1', 'Eng (3) N1', 'Eng (4) N1',
-        'Eng (1) N2', 'Eng (2) N2', 'Eng (3) N2', 'Eng (4) N2',
-        'Eng (1) Np', 'Eng (2) Np', 'Eng (3) Np', 'Eng (4) Np',
-        'Eng (1) Fuel Flow', 'Eng (2) Fuel Flow', 'Eng (3) Fuel Flow', 'Eng (4) Fuel Flow',
-        'Groundspeed', 'Groundspeed (1)', 'Groundspeed (2)'
-    )
-    for param_name in split_params:
-        try:
-            param = hdf[param_name]
-        except KeyError:
-            continue
-        if align_param:
-            # Align all other parameters to first available.  #Q: Why not force
-            # to 1Hz?
-            param.array = align(param, align_param)
-        else:
-            align_param = param
-        params.append(param)
-
-    if not len(params):
-        return None, None
-    # If there is at least one split parameter available.
-    # normalise the parameters we'll use for splitting the data
-    stacked_params = vstack_params(*params)
-    # We normalise each in turn to the range 0-1 so they have equal weight
-    normalised_params = [normalise(i) for i in stacked_params]
-    # Using a true minimum leads to bias to a zero value. We take the average
-    # to allow each parameter equal weight, then (later) seek the minimum.
-    split_params_min = np.ma.average(normalised_params, axis=0)
-    return split_params_min, align_param.frequency
+    return SplitParameters(hdf, align_param).normalised_average()
 
 
 def _get_eng_params(hdf, align_param=None):
@@ -322,33 +436,7 @@ def _get_eng_params(hdf, align_param=None):
         Will return None, None if no split parameters are available.
     :rtype: (None, None) or (np.ma.masked_array, float)
     '''
-    params = []
-
-    eng_params = (
-        'Eng (1) N1', 'Eng (2) N1', 'Eng (3) N1', 'Eng (4) N1',
-        'Eng (1) N2', 'Eng (2) N2', 'Eng (3) N2', 'Eng (4) N2',
-        'Eng (1) Np', 'Eng (2) Np', 'Eng (3) Np', 'Eng (4) Np',
-        'Eng (1) Fuel Flow', 'Eng (2) Fuel Flow', 'Eng (3) Fuel Flow', 'Eng (4) Fuel Flow'
-    )
-
-    for param_name in eng_params:
-        try:
-            param = hdf[param_name]
-        except KeyError:
-            continue
-        if align_param:
-            # Align all other parameters to provided param or first available.
-            param.array = align(param, align_param)
-        else:
-            align_param = param
-        params.append(param)
-
-    if not len(params):
-        return None, None
-    # If there is at least one split parameter available.
-    stacked_params = vstack_params(*params)
-    split_params_avg = np.ma.average(stacked_params, axis=0)
-    return split_params_avg, align_param.frequency
+    return SplitParameters(hdf, align_param).eng_average()
 
 
 def _rate_of_turn(heading):
@@ -358,11 +446,26 @@ def _rate_of_turn(heading):
     :param heading: Heading parameter.
     :type heading: Parameter
     '''
-    heading = deepcopy(heading)
-    heading.array = repair_mask(straighten_headings(heading.array),
+    # straighten_headings copies the array, so Heading is not modified.
+    return _straightened_rate_of_turn(straighten_headings(heading.array),
+                                      heading.frequency)
+
+
+def _straightened_rate_of_turn(heading_array, heading_frequency,
+                               raise_entirely_masked=True):
+    '''
+    Create rate of turn from straightened heading, which is repaired in-place.
+
+    :param heading_array: Straightened heading.
+    :type heading_array: np.ma.masked_array
+    :param heading_frequency: Frequency of heading_array.
+    :type heading_frequency: int or float
+    '''
+    heading_array = repair_mask(heading_array,
                                 copy=False,
-                                repair_duration=None)
-    rate_of_turn = np.ma.abs(rate_of_change(heading, 8))
+                                repair_duration=None,
+                                raise_entirely_masked=raise_entirely_masked)
+    rate_of_turn = np.ma.abs(rate_of_change_array(heading_array, heading_frequency, 8))
     rate_of_turn_masked = \
         np.ma.masked_greater(rate_of_turn,
                              settings.HEADING_RATE_SPLITTING_THRESHOLD)
@@ -510,7 +613,10 @@ def split_segments(hdf, aircraft_info):
         # try Heading True, otherwise fail loudly with a KeyError
         heading = hdf.get_param('Heading True', valid_only=True)
 
-    eng_arrays, _ = _get_eng_params(hdf, align_param=heading)
+    # OPT: Engine and Groundspeed parameters are read and aligned to Heading
+    # once, and shared by each splitting method and segment.
+    split_params = SplitParameters(hdf, align_param=heading)
+    eng_arrays, _ = split_params.eng_average()
 
     # Look for speed
     try:
@@ -524,7 +630,7 @@ def split_segments(hdf, aircraft_info):
         return [_segment_type_and_slice(
             speed.array, speed.frequency, heading.array,
             heading.frequency, 0, hdf.duration, eng_arrays,
-            aircraft_info, thresholds, hdf, vspeed)]
+            aircraft_info, thresholds, hdf, vspeed, split_params)]
 
     speed_secs = len(speed_array) / speed.frequency
 
@@ -540,21 +646,21 @@ def split_segments(hdf, aircraft_info):
                 segments.append(_segment_type_and_slice(
                     speed_array, speed.frequency, heading.array,
                     heading.frequency, start, split_idx, eng_arrays,
-                    aircraft_info, thresholds, hdf, vspeed))
+                    aircraft_info, thresholds, hdf, vspeed, split_params))
                 start = split_idx
                 logger.info("Split Flag found at at index '%d'.", split_idx)
             # Add remaining data to a segment.
             segments.append(_segment_type_and_slice(
                 speed_array, speed.frequency, heading.array, heading.frequency,
                 start, speed_secs, eng_arrays, aircraft_info, thresholds, hdf,
-                vspeed))
+                vspeed, split_params))
         else:
             # if no split flags use whole file.
             logger.info("'Segment Split' found but no Splits found, using whole file.")
             segments.append(_segment_type_and_slice(
                 speed_array, speed.frequency, heading.array, heading.frequency,
                 start, speed_secs, eng_arrays, aircraft_info, thresholds, hdf,
-                vspeed))
+                vspeed, split_params))
         return segments
 
     slow_array = np.ma.masked_less_equal(speed_array,
@@ -571,7 +677,7 @@ def split_segments(hdf, aircraft_info):
         return [_segment_type_and_slice(
             speed_array, speed.frequency, heading.array,
             heading.frequency, 0, speed_secs, eng_arrays,
-            aircraft_info, thresholds, hdf, vspeed)]
+            aircraft_info, thresholds, hdf, vspeed, split_params)]
 
     # suppress transient changes in speed around 80 kts
     slow_slices = slices_remove_small_slices(np.ma.clump_masked(slow_array), 10, speed.frequency)
@@ -586,8 +692,7 @@ def split_segments(hdf, aircraft_info):
 
     rate_of_turn = _rate_of_turn(heading)
 
-    split_params_min, split_params_frequency \
-        = _get_normalised_split_params(hdf, heading)
+    split_params_min, split_params_frequency = split_params.normalised_average()
     if split_params_min is not None and not split_params_min.mask.all():
         split_params_min = repair_mask(split_params_min,
                                        frequency=split_params_frequency,
@@ -663,7 +768,7 @@ def split_segments(hdf, aircraft_info):
                 segments.append(_segment_type_and_slice(
                     speed_array, speed.frequency, heading.array,
                     heading.frequency, start, dfc_split_index, eng_arrays,
-                    aircraft_info, thresholds, hdf, vspeed))
+                    aircraft_info, thresholds, hdf, vspeed, split_params))
                 start = dfc_split_index
                 logger.info("'Frame Counter' jumped within slow_slice '%s' "
                             "at index '%d'.", slow_slice, dfc_split_index)
@@ -685,7 +790,7 @@ def split_segments(hdf, aircraft_info):
             segments.append(_segment_type_and_slice(
                 speed_array, speed.frequency, heading.array, heading.frequency,
                 start, eng_split_index, eng_arrays, aircraft_info, thresholds,
-                hdf, vspeed))
+                hdf, vspeed, split_params))
             start = eng_split_index
             continue
         else:
@@ -708,7 +813,7 @@ def split_segments(hdf, aircraft_info):
             segments.append(_segment_type_and_slice(
                 speed_array, speed.frequency, heading.array, heading.frequency,
                 start, rot_split_index, eng_arrays, aircraft_info, thresholds,
-                hdf, vspeed))
+                hdf, vspeed, split_params))
             start = rot_split_index
             logger.info("Splitting at index '%s' where rate of turn was below "
                         "'%s'.", rot_split_index,
@@ -728,7 +833,7 @@ def split_segments(hdf, aircraft_info):
         segments.append(_segment_type_and_slice(
             speed_array, speed.frequency, heading.array, heading.frequency,
             start, speed_secs, eng_arrays, aircraft_info, thresholds, hdf,
-            vspeed))
+            vspeed, split_params))
 
     '''
     import matplotlib.pyplot as plt
@@ -742,9 +847,535 @@ def split_segments(hdf, aircraft_info):
     return segments
 
 
+# Blocks read by split_segments_streaming start on a multiple of this duration
+# in seconds, which is a whole number of superframes and an even number of
+# samples of parameters recorded at 1/64Hz or faster, so that indices within a
+# block round as they do within the data file.
+SPLIT_BLOCK_ALIGNMENT = 128
+
+
+def _read_block(hdf, name, start, stop, valid_only=False):
+    '''
+    Read the samples of a parameter between start and stop seconds.
+
+    :type hdf: hdfaccess.file.hdf_file
+    :type name: str
+    :type start: int or float
+    :type stop: int or float
+    :rtype: Parameter
+    '''
+    return hdf.get_param(name, valid_only=valid_only, _slice=slice(start, stop))
+
+
+def _block_slice(array, frequency, offset, start, stop):
+    '''
+    :param array: Samples of a parameter from offset seconds.
+    :type array: np.ma.masked_array
+    :returns: Samples of array between start and stop seconds.
+    :rtype: np.ma.masked_array
+    '''
+    return array[int((start - offset) * frequency):int((stop - offset) * frequency)]
+
+
+def _slices_of_mask(mask, offset):
+    '''
+    :param mask: Boolean array.
+    :type mask: np.ndarray
+    :param offset: Index of the first element of mask.
+    :type offset: int
+    :returns: Slices where mask is True.
+    :rtype: [slice]
+    '''
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1) + offset
+    stops = np.flatnonzero(edges == -1) + offset
+    return [slice(int(a), int(b)) for a, b in zip(starts, stops)]
+
+
+def _extend_slices(slices, new_slices):
+    '''
+    Extend slices with new_slices, joining the first of new_slices to the last
+    of slices if they are adjacent.
+    '''
+    if slices and new_slices and slices[-1].stop == new_slices[0].start:
+        slices[-1] = slice(slices[-1].start, new_slices[0].stop)
+        new_slices = new_slices[1:]
+    slices.extend(new_slices)
+
+
+def _straighten_block(array, state, limit=360.0):
+    '''
+    Straighten a block of headings, continuing from the state returned for the
+    previous block, with the same operations as straighten_headings applies to
+    the whole array so that the values are identical.
+
+    :param array: Block of headings.
+    :type array: np.ma.masked_array
+    :param state: Last value of the previous unmasked section, and the start
+        value, cumulative sum and last heading of the section continuing into
+        this block, or None for the first block.
+    :type state: tuple or None
+    :returns: Straightened headings and the state for the next block.
+    :rtype: (np.ma.masked_array, tuple)
+    '''
+    raw = array
+    array = array.copy()
+    last_value, start_value, total, previous = state or (None, None, None, None)
+    for clump in np.ma.clump_unmasked(array):
+        if clump.start == 0 and previous is not None:
+            # Continue the section from the previous block.
+            diff = np.ediff1d(np.ma.concatenate((previous, array[clump])))
+            diff -= limit * np.trunc(diff * 2.0 / limit)
+            if total is None:
+                total = np.cumsum(diff)
+            else:
+                total = np.cumsum(np.ma.concatenate((total, diff)))[1:]
+            array[clump] = total + start_value
+        else:
+            start_value = array[clump.start]
+            if last_value is not None:
+                # shift array section to be consistent with previous
+                start_value += limit * np.round((last_value - start_value) / limit)
+            diff = np.ediff1d(array[clump])
+            diff -= limit * np.trunc(diff * 2.0 / limit)
+            array[clump][0] = start_value
+            if len(diff):
+                total = np.cumsum(diff)
+                array[clump][1:] = total + start_value
+            else:
+                total = None
+        last_value = array[clump][-1]
+        if total is not None:
+            total = total[-1:]
+
+    if len(raw) and not np.ma.getmaskarray(raw)[-1]:
+        previous = raw[-1:]
+    else:
+        previous = total = None
+    return array, (last_value, start_value, total, previous)
+
+
+class _StreamingSplitter(object):
+    '''
+    Reads the blocks of a data file for split_segments_streaming, keeping the
+    samples of the split parameters from shortly before the start of the
+    current segment.
+    '''
+    def __init__(self, hdf, aircraft_info, block_duration):
+        '''
+        :type hdf: hdfaccess.file.hdf_file
+        :type aircraft_info: dict
+        :param block_duration: Duration of each block in seconds.
+        :type block_duration: int or float
+        '''
+        self.hdf = hdf
+        self.aircraft_info = aircraft_info
+        self.thresholds = _get_speed_thresholds(aircraft_info)
+        self.duration = hdf.duration
+        block_duration = max(int(np.ceil(block_duration / SPLIT_BLOCK_ALIGNMENT)), 1) * SPLIT_BLOCK_ALIGNMENT
+        self.blocks = [(start, min(start + block_duration, self.duration))
+                       for start in range(0, int(np.ceil(self.duration)), block_duration)]
+        try:
+            # Fetch Heading if available
+            _read_block(hdf, 'Heading', 0, SPLIT_BLOCK_ALIGNMENT, valid_only=True)
+            self.heading_name = 'Heading'
+        except KeyError:
+            # try Heading True, otherwise fail loudly with a KeyError
+            _read_block(hdf, 'Heading True', 0, SPLIT_BLOCK_ALIGNMENT, valid_only=True)
+            self.heading_name = 'Heading True'
+        self.arrays = OrderedDict()
+        self.frequencies = {}
+        self.buffer_start = 0
+        self.buffer_stop = 0
+        self._straighten_state = None
+
+    def _read_aligned(self, start, stop):
+        '''
+        Heading and the engine and Groundspeed parameters are read with a
+        margin either side of the block, so that they are aligned as they are
+        within the whole data file.
+
+        :returns: Heading between start and stop seconds and the
+            SplitParameters of the block aligned to it.
+        :rtype: (np.ma.masked_array, SplitParameters)
+        '''
+        lo = max(start - SPLIT_BLOCK_ALIGNMENT, 0)
+        hi = min(stop + SPLIT_BLOCK_ALIGNMENT, self.duration)
+        heading = _read_block(self.hdf, self.heading_name, lo, hi, valid_only=True)
+        self.frequencies['heading'] = heading.frequency
+        split_params = SplitParameters(self.hdf, align_param=heading, _slice=slice(lo, hi))
+        for name, array in split_params.arrays.items():
+            split_params.arrays[name] = _block_slice(array, heading.frequency, lo, start, stop)
+        return _block_slice(heading.array, heading.frequency, lo, start, stop), split_params
+
+    def scan(self):
+        '''
+        Read every block to find the slow slices, the number of sections of
+        data where speed is above the splitting threshold (counting no more
+        than two) and the maximum of each split parameter.
+        '''
+        hdf = self.hdf
+        threshold = self.thresholds['speed_threshold']
+        self.speed_samples = 0
+        self.speed_valid = False
+        self.heading_valid = False
+        self.speedy_slices = 0
+        self.maxima = OrderedDict()
+        self.slow_slices = []
+        frame_count_samples = 0
+        slow_runs = []
+        drops = []
+        # Last unmasked speed sample and the number of masked samples after
+        # it, which are repaired once the next unmasked sample is read.
+        last_unmasked = None
+        masked_samples = 0
+        previous_slow = True
+        for start, stop in self.blocks:
+            eof = stop >= self.duration
+            speed = _read_block(hdf, 'Airspeed', start, stop)
+            self.speed_frequency = speed.frequency
+            self.speed_valid |= bool(np.ma.count(speed.array))
+            base = self.speed_samples - masked_samples
+            self.speed_samples += len(speed.array)
+
+            first = 0 if last_unmasked is None else 1
+            speed_array = np.ma.concatenate(
+                ([] if last_unmasked is None else [last_unmasked]) +
+                [np.ma.masked_all(masked_samples, dtype=speed.array.dtype), speed.array])
+            speed_array = repair_mask(speed_array, repair_duration=None,
+                                      repair_above=threshold, raise_entirely_masked=False)
+            slow = np.ma.getmaskarray(np.ma.masked_less_equal(speed_array, threshold))
+            if eof:
+                resolved = len(speed_array)
+            else:
+                unmasked = np.flatnonzero(~np.ma.getmaskarray(speed_array))
+                resolved = unmasked[-1] + 1 if len(unmasked) else 0
+            slow = slow[first:resolved]
+            if resolved:
+                last_unmasked = speed_array[resolved - 1:resolved]
+            masked_samples = len(speed_array) - max(resolved, first)
+
+            _extend_slices(slow_runs, _slices_of_mask(slow, base))
+            if eof or not slow_runs or slow_runs[-1].stop < base + len(slow):
+                closed = slow_runs
+            else:
+                closed = slow_runs[:-1]
+            # suppress transient changes in speed around 80 kts
+            self.slow_slices.extend(
+                slices_remove_small_slices(closed, 10, self.speed_frequency))
+            slow_runs = slow_runs[len(closed):]
+
+            if len(slow):
+                fast = ~slow
+                self.speedy_slices += np.count_nonzero(fast[1:] & slow[:-1]) + \
+                    int(fast[0] and previous_slow)
+                previous_slow = slow[-1]
+
+            if 'FDRS Frame Counter' in hdf:
+                frame_count = _read_block(hdf, 'FDRS Frame Counter', start, stop)
+                frame_count_frequency = frame_count.frequency
+                block_drops = np.ma.clump_masked(np.ma.where(frame_count.array == 0.0, np.ma.masked, 1.0))
+                _extend_slices(drops, [slice(s.start + frame_count_samples, s.stop + frame_count_samples)
+                                       for s in block_drops])
+                frame_count_samples += len(frame_count.array)
+
+            heading, split_params = self._read_aligned(start, stop)
+            self.heading_valid |= bool(np.ma.count(heading))
+            for name, maximum in split_params.maxima().items():
+                current = self.maxima.get(name, np.ma.masked)
+                if current is np.ma.masked or (maximum is not np.ma.masked and maximum > current):
+                    self.maxima[name] = maximum
+
+        self.speed_secs = self.speed_samples / self.speed_frequency
+        # Whether the normalised split parameters have any unmasked values.
+        self.split_params_valid = any(m is not np.ma.masked and m != 0 and np.isfinite(1.0 / m)
+                                      for m in self.maxima.values())
+        if 'FDRS Frame Counter' in hdf:
+            # Skip dropouts in HDF5 files (first identified on H175 helicopter)
+            dropouts = slices_multiply(slices_remove_small_gaps(drops, hz=frame_count_frequency),
+                                       self.speed_frequency / frame_count_frequency)
+            self.slow_slices = slices_and_not(self.slow_slices, dropouts)
+
+    def _read(self, start, stop):
+        '''
+        Read the block between start and stop seconds into the buffer.
+        '''
+        hdf = self.hdf
+        heading, split_params = self._read_aligned(start, stop)
+        straight, self._straighten_state = _straighten_block(heading, self._straighten_state)
+        speed = _read_block(hdf, 'Airspeed', start, stop)
+        block = OrderedDict([('speed', speed.array), ('heading', heading), ('straight', straight)])
+        self.frequencies['speed'] = speed.frequency
+        self.frequencies['straight'] = self.frequencies['heading']
+        eng_arrays, frequency = split_params.eng_average()
+        if eng_arrays is not None:
+            block['eng'] = eng_arrays
+            self.frequencies['eng'] = frequency
+        split_params_min, frequency = split_params.normalised_average(self.maxima)
+        if split_params_min is not None:
+            block['split'] = split_params_min
+            self.frequencies['split'] = frequency
+        names = []
+        if 'Vertical Speed' in hdf:
+            names.append(('vspeed', 'Vertical Speed'))
+        if hdf.reliable_frame_counter:
+            names.append(('dfc', 'Frame Counter'))
+        for key, name in names:
+            param = _read_block(hdf, name, start, stop)
+            block[key] = param.array
+            self.frequencies[key] = param.frequency
+        for key, array in block.items():
+            self.arrays[key] = np.ma.concatenate((self.arrays[key], array)) if key in self.arrays else array
+        self.buffer_stop = stop
+
+    def _index(self, key, secs):
+        return int((secs - self.buffer_start) * self.frequencies[key])
+
+    def _last_valid(self, key, secs):
+        '''
+        :returns: Time in seconds of the last unmasked sample within the
+            buffer at or before secs, or the start of the buffer.
+        :rtype: int or float
+        '''
+        if secs <= self.buffer_start:
+            return self.buffer_start
+        valid = np.flatnonzero(~np.ma.getmaskarray(self.arrays[key][:self._index(key, secs) + 1]))
+        return self.buffer_start + valid[-1] / self.frequencies[key] if len(valid) else self.buffer_start
+
+    def _valid_after(self, key, secs):
+        '''
+        :returns: Whether the buffer has an unmasked sample at or after secs.
+        :rtype: bool
+        '''
+        return not np.ma.getmaskarray(self.arrays[key][self._index(key, secs):]).all()
+
+    def _window_start(self, secs):
+        '''
+        Masked sections of straightened Heading and the normalised split
+        parameters are repaired from the samples either side of them, so
+        windows start before the last unmasked sample preceding secs.
+
+        :returns: Start in seconds of a window of the buffer within which the
+            samples after secs are repaired as they are within the whole data
+            file.
+        :rtype: int
+        '''
+        start = secs - SPLIT_BLOCK_ALIGNMENT
+        keys = ('straight', 'split') if self.split_params_valid else ('straight',)
+        start = min([start] + [self._last_valid(k, start) for k in keys])
+        return max(int(start // SPLIT_BLOCK_ALIGNMENT) * SPLIT_BLOCK_ALIGNMENT, self.buffer_start)
+
+    def _window(self, key, start):
+        return self.arrays[key][self._index(key, start):]
+
+    def _ready(self, slice_stop_secs):
+        '''
+        :returns: Whether enough blocks have been read to split within a slow
+            slice stopping at slice_stop_secs.
+        :rtype: bool
+        '''
+        if self.buffer_stop >= self.duration:
+            return True
+        # The rate of turn is calculated over 8 seconds of repaired Heading.
+        return self.buffer_stop >= slice_stop_secs + SPLIT_BLOCK_ALIGNMENT and \
+            self._valid_after('straight', slice_stop_secs + 8) and \
+            (not self.split_params_valid or self._valid_after('split', slice_stop_secs))
+
+    def _trim(self, secs):
+        '''
+        Discard the samples of the buffer no longer required once a segment
+        has been split at secs.
+        '''
+        start = self._window_start(secs)
+        for key, array in self.arrays.items():
+            self.arrays[key] = array[self._index(key, start):]
+        self.buffer_start = start
+
+    def _segment(self, start, stop):
+        '''
+        :returns: Segment type, slice and start padding of the segment between
+            start and stop seconds.
+        :rtype: (str, slice, int)
+        '''
+        try:
+            speed_array = repair_mask(self.arrays['speed'], repair_duration=None,
+                                      repair_above=self.thresholds['speed_threshold'])
+        except ValueError:
+            # Masked sections overlapping the segment start or stop on slow
+            # samples, so are not repaired within the whole data file either.
+            speed_array = self.arrays['speed']
+        vspeed = self.arrays.get('vspeed')
+        if vspeed is not None:
+            vspeed = P('Vertical Speed', array=vspeed, frequency=self.frequencies['vspeed'])
+        return _segment_type_and_slice(
+            speed_array, self.frequencies['speed'], self.arrays['heading'],
+            self.frequencies['heading'], start, stop, self.arrays.get('eng'),
+            self.aircraft_info, self.thresholds, self.hdf, vspeed,
+            offset=self.buffer_start)
+
+    def _split(self, slice_start_secs, slice_stop_secs, last_slow_slice):
+        '''
+        Split within a slow slice as split_segments does, within a window of
+        the buffer.
+
+        :returns: Split index in seconds or None if the splitting methods
+            failed to split within the slow slice.
+        :rtype: int or float or None
+        '''
+        min_split_duration = self.thresholds['min_split_duration']
+        window = self._window_start(slice_start_secs)
+        start_secs = slice_start_secs - window
+        stop_secs = slice_stop_secs - window
+
+        # Find split based on minimum of engine parameters.
+        eng_split_index, eng_split_value = None, None
+        if 'split' in self.arrays:
+            split_params_min = self._window('split', window)
+            if self.split_params_valid:
+                split_params_min = repair_mask(split_params_min,
+                                               frequency=self.frequencies['split'],
+                                               repair_duration=None)
+            eng_split_index, eng_split_value = _split_on_eng_params(
+                start_secs, stop_secs, split_params_min, self.frequencies['split'])
+
+        # Split using 'Frame Counter'.
+        if 'dfc' in self.arrays:
+            dfc_frequency = self.frequencies['dfc']
+            dfc_diff = np.ma.masked_equal(np.ma.masked_equal(
+                np.ma.diff(self._window('dfc', window)), 1), -4095)
+            dfc_split_index = _split_on_dfc(
+                start_secs, stop_secs, dfc_frequency, (1 / dfc_frequency) / 2,
+                dfc_diff, eng_split_index=eng_split_index)
+            if dfc_split_index:
+                dfc_split_index += window
+                if last_slow_slice and slice_stop_secs - dfc_split_index < min_split_duration:
+                    dfc_split_index = slice_stop_secs
+                return dfc_split_index
+
+        # Split using minimum of engine parameters.
+        if eng_split_value is not None and \
+           eng_split_value < settings.MINIMUM_SPLIT_PARAM_VALUE:
+            eng_split_index += window
+            if last_slow_slice and slice_stop_secs - eng_split_index < min_split_duration:
+                eng_split_index = slice_stop_secs
+            return eng_split_index
+
+        # Split using rate of turn.
+        rate_of_turn = _straightened_rate_of_turn(
+            self._window('straight', window).copy(), self.frequencies['heading'],
+            raise_entirely_masked=False)
+        rot_split_index = _split_on_rot(start_secs, stop_secs,
+                                        self.frequencies['heading'], rate_of_turn)
+        if rot_split_index:
+            rot_split_index += window
+            if last_slow_slice and slice_stop_secs - rot_split_index < min_split_duration:
+                rot_split_index = slice_stop_secs
+            return rot_split_index
+
+        logger.warning("Splitting methods failed to split within slow_slice "
+                       "between '%s' and '%s' seconds.", slice_start_secs, slice_stop_secs)
+
+    def segments(self):
+        '''
+        Read the blocks in turn and yield each segment once the splitting
+        methods have split within the slow slice at its end.
+
+        :returns: Segment type, slice and start padding of each segment.
+        :rtype: generator of (str, slice, int)
+        '''
+        if not self.heading_valid:
+            # As split_segments does when repairing Heading for rate of turn.
+            raise ValueError("Array cannot be repaired as it is entirely masked")
+        if not self.hdf.reliable_frame_counter:
+            logger.info("'Frame Counter' will not be used for splitting since "
+                        "'reliable_frame_counter' is False.")
+
+        slow_slices = deque(self.slow_slices)
+        start = 0
+        last_fast_index = None
+        for block_start, block_stop in self.blocks:
+            self._read(block_start, block_stop)
+            while slow_slices:
+                slow_slice = slow_slices[0]
+                # Get start and stop at 1Hz.
+                slice_start_secs = slow_slice.start / self.speed_frequency
+                slice_stop_secs = slow_slice.stop / self.speed_frequency
+                if slow_slice.start == 0:
+                    # Do not split if slow_slice is at the beginning of the data.
+                    slow_slices.popleft()
+                    continue
+                if last_fast_index is not None and \
+                   (slow_slice.start - last_fast_index) / self.speed_frequency < settings.MINIMUM_FAST_DURATION:
+                    slow_slices.popleft()
+                    continue
+                if slice_stop_secs - slice_start_secs < self.thresholds['min_split_duration']:
+                    slow_slices.popleft()
+                    continue
+                if not self._ready(slice_stop_secs):
+                    break
+                slow_slices.popleft()
+                last_fast_index = slow_slice.stop
+
+                split_index = self._split(slice_start_secs, slice_stop_secs,
+                                          slow_slice.stop == self.speed_samples)
+                if split_index is not None:
+                    yield self._segment(start, split_index)
+                    start = split_index
+                    self._trim(start)
+
+        # Add remaining data to a segment.
+        if start < self.speed_secs:
+            yield self._segment(start, self.speed_secs)
+
+
+def split_segments_streaming(hdf, aircraft_info, block_duration=None):
+    '''
+    Find the segments of a data file as split_segments does, while reading
+    the split parameters in blocks rather than whole, so that the memory used
+    is bounded by the duration of the longest segment rather than of the data
+    file.
+
+    Blocks are read twice. The first pass finds the slow slices and the
+    maximum of each split parameter used to normalise them. The second reads
+    the blocks in turn, carrying the straightened Heading and the samples
+    since the start of the current segment from one block to the next, and
+    yields each segment once every slow slice before its end has been split.
+    Segments are identical to those returned by split_segments.
+
+    Helicopters, data files with a 'Segment Split' parameter and data files
+    which can only be a single segment are split by split_segments.
+
+    :param hdf: hdf_file object.
+    :type hdf: hdfaccess.file.hdf_file
+    :param aircraft_info: Information which identify the aircraft.
+    :type aircraft_info: dict
+    :param block_duration: Duration of each block in seconds, rounded up to a
+        multiple of SPLIT_BLOCK_ALIGNMENT. Defaults to
+        settings.SPLIT_BLOCK_DURATION.
+    :type block_duration: int or float or None
+    :returns: Segment type, slice and start padding of each segment in turn.
+    :rtype: generator of (str, slice, int)
+    '''
+    if block_duration is None:
+        block_duration = settings.SPLIT_BLOCK_DURATION
+
+    if aircraft_info.get('Aircraft Type') == 'helicopter' or \
+       aircraft_info.get('Engine Propulsion', None) == 'ROTOR' or \
+       'Segment Split' in hdf:
+        yield from split_segments(hdf, aircraft_info)
+        return
+
+    splitter = _StreamingSplitter(hdf, aircraft_info, block_duration)
+    splitter.scan()
+    if not splitter.speed_valid or splitter.speedy_slices <= 1:
+        # The whole data file is a single segment.
+        yield from split_segments(hdf, aircraft_info)
+        return
+    yield from splitter.segments()
+
+
 def _get_speed_parameter(hdf, aircraft_info):
 
-    thresholds = {}
     if aircraft_info.get('Engine Propulsion', None) == 'ROTOR':
 
         try:
@@ -754,7 +1385,16 @@ def _get_speed_parameter(hdf, aircraft_info):
             # Alternative if dual sources available
             parameter = blend_parameters((hdf['Nr (1)'], hdf['Nr (2)']))
             parameter = P(name='Nr', array=parameter, data_type=parameter.dtype)
+    else:
+        parameter = hdf['Airspeed']
+    vspeed = hdf.get('Vertical Speed')
+    return parameter, vspeed, _get_speed_thresholds(aircraft_info)
+
+
+def _get_speed_thresholds(aircraft_info):
 
+    thresholds = {}
+    if aircraft_info.get('Engine Propulsion', None) == 'ROTOR':
         thresholds['speed_threshold'] = settings.ROTORSPEED_THRESHOLD
         thresholds['min_duration'] = settings.ROTORSPEED_THRESHOLD_TIME
         # Very short dips in rotor speed before recording stops.
@@ -764,15 +1404,13 @@ def _get_speed_parameter(hdf, aircraft_info):
         # TODO: add to settings
         thresholds['hash_min_samples'] = settings.AIRSPEED_HASH_MIN_SAMPLES
     else:
-        parameter = hdf['Airspeed']
         thresholds['speed_threshold'] = settings.AIRSPEED_THRESHOLD
         thresholds['min_split_duration'] = settings.MINIMUM_SPLIT_DURATION
         thresholds['hash_min_samples'] = settings.AIRSPEED_HASH_MIN_SAMPLES
         thresholds['min_duration'] = settings.AIRSPEED_THRESHOLD_TIME
-    vspeed = hdf.get('Vertical Speed')
     thresholds['vertical_speed_max'] = settings.VERTICAL_SPEED_FOR_CLIMB_PHASE
     thresholds['vertical_speed_min'] = settings.VERTICAL_SPEED_FOR_DESCENT_PHASE
-    return parameter, vspeed, thresholds
+    return thresholds
 
 
 def _mask_invalid_years(array, latest_year):
@@ -793,13 +1431,38 @@ def _mask_invalid_years(array, latest_year):
     return array
 
 
+def _datetime64_component(times, name):
+    '''
+    :param times: Datetimes to the second.
+    :type times: np.ndarray of datetime64[s]
+    :param name: Name of the date or time parameter, e.g. 'Month'.
+    :type name: str
+    :returns: Values of the component of each datetime, as datetime's year,
+        month, day, hour, minute or second attribute.
+    :rtype: np.ndarray of int
+    '''
+    if name == 'Year':
+        return times.astype('datetime64[Y]').astype(np.int64) + 1970
+    months = times.astype('datetime64[M]')
+    if name == 'Month':
+        return months.astype(np.int64) % 12 + 1
+    dates = times.astype('datetime64[D]')
+    if name == 'Day':
+        return (dates - months).astype(np.int64) + 1
+    seconds = (times - dates).astype(np.int64)
+    return {
+        'Hour': seconds // 3600,
+        'Minute': seconds // 60 % 60,
+        'Second': seconds % 60,
+    }[name]
+
+
 def get_dt_arrays(hdf, fallback_dt, validation_dt, valid_slices=[]):
     now = datetime.utcnow().replace(tzinfo=pytz.utc)
 
-    if fallback_dt:
-        fallback_dts = []
-        for secs in range(0, int(hdf.duration)):
-            fallback_dts.append(fallback_dt + timedelta(seconds=secs))
+    # OPT: Fallback date and time arrays are calculated from a single range
+    # of datetime64 only for the parameters which are missing.
+    fallback_times = None
 
     onehz = P(frequency=1)
     dt_arrays = []
@@ -827,7 +1490,10 @@ def get_dt_arrays(hdf, fallback_dt, validation_dt, valid_slices=[]):
 
         if fallback_dt:
             precise = False
-            array = np.ma.array([getattr(dt, name.lower()) for dt in fallback_dts])
+            if fallback_times is None:
+                fallback_times = np.datetime64(fallback_dt.replace(tzinfo=None), 's') + \
+                    np.arange(int(hdf.duration)).astype('timedelta64[s]')
+            array = np.ma.array(_datetime64_component(fallback_times, name))
             logger.warning("%s not available, using range from %d to %d from fallback_dt %s",
                            name, array[0], array[-1], fallback_dt)
             dt_arrays.append(array)
@@ -1085,10 +1751,40 @@ def append_segment_info(hdf_segment_path, segment_type, segment_slice, part,
     return segment
 
 
+def _write_segment(hdf_path, dest_path, boundary, segment_type,
+                   segment_slice, part, fallback_dt, validation_dt,
+                   aircraft_info):
+    '''
+    Write a segment of the HDF file to a new file and get information about
+    it. Segments are independent, so may be written by separate processes.
+
+    :param hdf_path: Path of the HDF file being split.
+    :type hdf_path: str
+    :param dest_path: Path of the segment file to write.
+    :type dest_path: str
+    :param boundary: Boundary in seconds which the segment is padded to.
+    :type boundary: int
+    :param fallback_dt: Fallback datetime at the start of the segment,
+        including any padding.
+    :type fallback_dt: datetime
+    :returns: Segment named tuple
+    :rtype: Segment
+    '''
+    logger.debug(f"Writing segment {part}: {dest_path}")
+
+    write_segment(hdf_path, segment_slice, dest_path, boundary,
+                  submasks=('arinc', 'invalid_states', 'padding', 'saturation'))
+
+    return append_segment_info(
+        dest_path, segment_type, segment_slice, part,
+        fallback_dt=fallback_dt, validation_dt=validation_dt,
+        aircraft_info=aircraft_info)
+
+
 def split_hdf_to_segments(hdf_path, aircraft_info, fallback_dt=None,
                           validation_dt=None, fallback_relative_to_start=True,
                           draw=False, dest_dir=None, pre_file_kwargs={},
-                          dt_origin_kwargs={}):
+                          dt_origin_kwargs={}, workers=None):
     """
     Main method - analyses an HDF file for flight segments and splits each
     flight into a new segment appropriately.
@@ -1109,6 +1805,11 @@ def split_hdf_to_segments(hdf_path, aircraft_info, fallback_dt=None,
     :type dest_dir: str
     :param pre_file_kwargs: Pre-file analysis keyword arguments.
     :type pre_file_kwargs: dict
+    :param workers: Number of worker processes writing segments and getting
+        their information concurrently. Defaults to
+        settings.SPLIT_SEGMENT_WORKERS; None, 0 or 1 write segments one after
+        another.
+    :type workers: int or None
     :returns: List of Segments
     :rtype: List of Segment recordtypes ('slice type part duration path hash')
     """
@@ -1150,7 +1851,13 @@ def split_hdf_to_segments(hdf_path, aircraft_info, fallback_dt=None,
             # For CSV and similar single frequency formats, there is no boundary constraint.
             boundary = 4
 
-        segment_tuples = split_segments(hdf, aircraft_info)
+        if settings.SPLIT_STREAMING_DURATION is not None and \
+           hdf.duration > settings.SPLIT_STREAMING_DURATION:
+            # OPT: Long data files are split reading the split parameters in
+            # blocks rather than whole.
+            segment_tuples = list(split_segments_streaming(hdf, aircraft_info))
+        else:
+            segment_tuples = split_segments(hdf, aircraft_info)
         frame_doubled = aircraft_info.get('Frame Doubled', False)
 
         fallback_dt = calculate_fallback_dt(hdf, fallback_dt, validation_dt,
@@ -1158,39 +1865,51 @@ def split_hdf_to_segments(hdf_path, aircraft_info, fallback_dt=None,
                                             frame_doubled, dt_origin_kwargs)
 
     # process each segment (into a new file) having closed original hdf_path
-    segments = []
-    previous_stop_dt = None
+    jobs = []
     for part, (segment_type, segment_slice, start_padding) in enumerate(segment_tuples,
                                                          start=1):
         # write segment to new split file (.001)
         basename = os.path.basename(hdf_path)
         dest_basename = os.path.splitext(basename)[0] + '.%03d.hdf5' % part
         dest_path = os.path.join(dest_dir, dest_basename)
-        logger.debug(f"Writing segment {part}: {dest_path}")
-
-        write_segment(hdf_path, segment_slice, dest_path, boundary,
-                      submasks=('arinc', 'invalid_states', 'padding', 'saturation'))
 
         # adjust fallback time to account for any padding added at start of segment
         segment_start_dt = fallback_dt - timedelta(seconds=start_padding)
 
-        segment = append_segment_info(
-            dest_path, segment_type, segment_slice, part,
-            fallback_dt=segment_start_dt, validation_dt=validation_dt,
-            aircraft_info=aircraft_info)
+        jobs.append((hdf_path, dest_path, boundary, segment_type, segment_slice,
+                     part, segment_start_dt, validation_dt, aircraft_info))
+
+        if fallback_dt:
+            # move the fallback_dt on to be relative to start of next segment slice
+            fallback_dt += timedelta(seconds=(segment_slice.stop - segment_slice.start))
+
+    if workers is None:
+        workers = settings.SPLIT_SEGMENT_WORKERS
+    parallel = workers and workers > 1 and len(jobs) > 1
+    if parallel and multiprocessing.current_process().daemon:
+        # Worker processes of analysis_engine.batch cannot start processes.
+        logger.debug("Writing segments serially within daemonic process.")
+        parallel = False
+
+    if parallel:
+        # OPT: Segments are independent once the fallback datetime of each is
+        # known, so are written and their information calculated by a pool
+        # of processes. Results are returned in the order of the segments.
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            segments = list(executor.map(_write_segment, *zip(*jobs)))
+    else:
+        segments = [_write_segment(*job) for job in jobs]
+
+    previous_stop_dt = None
+    for segment in segments:
         if previous_stop_dt and segment.start_dt < previous_stop_dt - timedelta(0, 4):
             # In theory, this should not happen - but be warned of superframe
             # padding?
             logger.warning(
                 f"Segment start_dt '{segment.start_dt}' comes before the previous segment ended '{previous_stop_dt}'")
         previous_stop_dt = segment.stop_dt
-
-        if fallback_dt:
-            # move the fallback_dt on to be relative to start of next segment slice
-            fallback_dt += timedelta(seconds=(segment_slice.stop - segment_slice.start))
-        segments.append(segment)
         if draw:
-            plot_essential(dest_path)
+            plot_essential(segment.path)
 
     if draw:
         # show all figures together
@@ -1225,6 +1944,8 @@ def parse_cmdline():
         '-d', '--validation-datetime', type=valid_date, default=now, metavar='DATETIME',
         help='Date and time used to validate time parameters, usually upload time (%%Y-%%m-%%d %%H:%%M)',
     )
+    parser.add_argument('--workers', dest='workers', type=int, default=None,
+                        help='Number of processes used to write segments concurrently.')
     parser.add_argument('-L', '--log-level', default=None, help='Log level')
     parser.add_argument('-q', '--quiet', action='store_true', help="Don't output messages")
 
@@ -1270,7 +1991,8 @@ def main():
         fallback_dt=args.fallback_datetime,
         validation_dt=args.validation_datetime,
         fallback_relative_to_start=False,
-        draw=False)
+        draw=False,
+        workers=args.workers)
 
     # Rename the segment filenames to be able to use glob()
     for segment in segments:
@@ -1,11 +1,13 @@
 from __future__ import print_function
 
 import argparse
+import importlib.util
 import logging
 import os
 import re
 import simplejson
 import six
+import sys
 import zipfile
 
 from collections import defaultdict, deque
@@ -19,10 +21,10 @@ from flightdatautilities import api
 from analysis_engine.dependency_graph import dependency_order
 # node classes required for unpickling
 from analysis_engine.node import (
-    loads, save, Node, NodeManager,
+    get_can_operate_attribute_names, loads, save, LazyNode, Node, NodeManager,
     NODE_SUBCLASSES,
 )
-from analysis_engine import settings
+from analysis_engine import __version__, settings
 
 
 logger = logging.getLogger(__name__)
@@ -140,16 +142,22 @@ def get_aircraft_info(tail_number):
     return aircraft_info
 
 
-def get_derived_nodes(modules):
-    '''
-    Create a key:value pair of each node_name to Node class for all Nodes
-    within modules provided.
+# Node classes found within each imported module name, so that modules are
+# only inspected once per process. {module_name: (module, {name: NodeClass})}
+_MODULE_NODES = {}
+# Node manifests loaded within this process. {path: manifest or None}
+_NODE_MANIFESTS = {}
+# Stand-ins for Node classes created from node manifests.
+# {(path, module_name): {name: LazyNode}}
+_LAZY_MODULE_NODES = {}
 
-    sample module_names = ['path_to.module', 'analysis_engine.flight_phase',..]
 
-    :param module_names: Modules or module names to import as locations on PYTHON PATH
-    :type module_names: [str or module]
-    :returns: Modules or module name to Classes
+def _find_module_nodes(module):
+    '''
+    Find Node classes defined within a module.
+
+    :type module: module
+    :returns: Node name to Node class.
     :rtype: dict
     '''
     # OPT: local variable to avoid module-level lookup.
@@ -165,41 +173,218 @@ def get_derived_nodes(modules):
                 return True
         return issubclass(value, superclass)
 
+    nodes = {}
+    for c in vars(module).values():
+        if isclassandsubclass(c, node_subclasses, Node) \
+                and c.__module__ != 'analysis_engine.node':
+            try:
+                #TODO: Alert when dupe node_name found which overrides previous
+                ##name = c.get_name()
+                ##if name in nodes:
+                    ### alert about overide happening or raise out?
+                ##nodes[name] = c
+                nodes[c.get_name()] = c
+            except TypeError:
+                #TODO: Handle the expected error of top level classes
+                # Can't instantiate abstract class DerivedParameterNode
+                # - but don't know how to detect if we're at that level without resorting to 'if c.get_name() in 'derived parameter node',..
+                logger.exception('Failed to import class: %s' % c.get_name())
+    return nodes
+
+
+def _get_lazy_nodes(manifest_path, module):
+    '''
+    Create stand-ins for the Node classes within a module from a node manifest.
+
+    :param manifest_path: Path of the node manifest.
+    :type manifest_path: str
+    :param module: Module name.
+    :type module: str
+    :returns: Node name to LazyNode or None if the manifest is missing, stale
+        or does not include the module.
+    :rtype: dict or None
+    '''
+    if manifest_path not in _NODE_MANIFESTS:
+        manifest = _NODE_MANIFESTS[manifest_path] = load_node_manifest(manifest_path)
+        if manifest is None:
+            logger.warning("Node manifest '%s' is missing or stale - importing node modules.",
+                           manifest_path)
+    manifest = _NODE_MANIFESTS[manifest_path]
+    if manifest is None or module not in manifest['nodes']:
+        return None
+    key = (manifest_path, module)
+    if key not in _LAZY_MODULE_NODES:
+        _LAZY_MODULE_NODES[key] = {e['name']: LazyNode(e) for e in manifest['nodes'][module]}
+    return _LAZY_MODULE_NODES[key]
+
+
+def get_derived_nodes(modules, manifest_path=None):
+    '''
+    Create a key:value pair of each node_name to Node class for all Nodes
+    within modules provided.
+
+    sample module_names = ['path_to.module', 'analysis_engine.flight_phase',..]
+
+    Modules provided by name are only inspected the first time they are
+    requested within a process, or again after clear_derived_nodes_cache is
+    called. Module objects are inspected on every call.
+
+    If manifest_path is provided, modules which have not been imported and are
+    within the node manifest are not imported. LazyNode stand-ins are returned
+    instead which import the module once the node is derived.
+
+    :param module_names: Modules or module names to import as locations on PYTHON PATH
+    :type module_names: [str or module]
+    :param manifest_path: Path of a node manifest written by save_node_manifest.
+    :type manifest_path: str or None
+    :returns: Modules or module name to Classes
+    :rtype: dict
+    '''
     if isinstance(modules, six.string_types) or ismodule(modules):
         # This has been done too often!
         modules = [modules]
     nodes = {}
     for module in modules:
-        #Ref:
-        #http://code.activestate.com/recipes/223972-import-package-modules-at-runtime/
-        # You may notice something odd about the call to __import__(): why is
-        # the last parameter a list whose only member is an empty string? This
-        # hack stems from a quirk about __import__(): if the last parameter is
-        # empty, loading class "A.B.C.D" actually only loads "A". If the last
-        # parameter is defined, regardless of what its value is, we end up
-        # loading "A.B.C"
-        ##abstract_nodes = ['Node', 'Derived Parameter Node', 'Key Point Value Node', 'Flight Phase Node'
-        ##print('importing', name)
-        if not ismodule(module):
-            module = __import__(module, globals(), locals(), [''])
-        for c in vars(module).values():
-            if isclassandsubclass(c, node_subclasses, Node) \
-                    and c.__module__ != 'analysis_engine.node':
-                try:
-                    #TODO: Alert when dupe node_name found which overrides previous
-                    ##name = c.get_name()
-                    ##if name in nodes:
-                        ### alert about overide happening or raise out?
-                    ##nodes[name] = c
-                    nodes[c.get_name()] = c
-                except TypeError:
-                    #TODO: Handle the expected error of top level classes
-                    # Can't instantiate abstract class DerivedParameterNode
-                    # - but don't know how to detect if we're at that level without resorting to 'if c.get_name() in 'derived parameter node',..
-                    logger.exception('Failed to import class: %s' % c.get_name())
+        if ismodule(module):
+            nodes.update(_find_module_nodes(module))
+            continue
+        cached = _MODULE_NODES.get(module)
+        if cached is None or sys.modules.get(module) is not cached[0]:
+            lazy_nodes = None
+            if manifest_path and module not in sys.modules:
+                lazy_nodes = _get_lazy_nodes(manifest_path, module)
+            if lazy_nodes is not None:
+                nodes.update(lazy_nodes)
+                continue
+            #Ref:
+            #http://code.activestate.com/recipes/223972-import-package-modules-at-runtime/
+            # You may notice something odd about the call to __import__(): why is
+            # the last parameter a list whose only member is an empty string? This
+            # hack stems from a quirk about __import__(): if the last parameter is
+            # empty, loading class "A.B.C.D" actually only loads "A". If the last
+            # parameter is defined, regardless of what its value is, we end up
+            # loading "A.B.C"
+            imported = __import__(module, globals(), locals(), [''])
+            cached = _MODULE_NODES[module] = (imported, _find_module_nodes(imported))
+        nodes.update(cached[1])
     return nodes
 
 
+def clear_derived_nodes_cache():
+    '''
+    Forget the Node classes found within modules so that they are inspected
+    again by get_derived_nodes, e.g. after a module is reloaded or classes are
+    added to it at runtime.
+    '''
+    _MODULE_NODES.clear()
+    _NODE_MANIFESTS.clear()
+    _LAZY_MODULE_NODES.clear()
+
+
+def _source_fingerprint(module_name):
+    '''
+    Identify the version of a module from its source file without importing
+    it (parent packages are imported).
+
+    :type module_name: str
+    :returns: Modification time in nanoseconds and size of the source file or
+        None if the source cannot be found.
+    :rtype: [int, int] or None
+    '''
+    try:
+        spec = importlib.util.find_spec(module_name)
+        stat = os.stat(spec.origin)
+    except (ImportError, AttributeError, OSError, TypeError, ValueError):
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def node_manifest(modules):
+    '''
+    Describe the Node classes within modules: the information needed to
+    resolve dependencies and to list node names without inspecting the
+    classes again.
+
+    :param modules: Module names.
+    :type modules: [str]
+    :returns: Version, module fingerprints and node descriptions per module
+        in the order provided.
+    :rtype: dict
+    '''
+    manifest = {
+        'version': __version__,
+        'modules': {},
+        'nodes': {},
+    }
+    for module in modules:
+        entries = []
+        for name, node in sorted(get_derived_nodes(module).items()):
+            entries.append({
+                'name': name,
+                'module': node.__module__,
+                'class': node.__name__,
+                'node_type': node.__base__.__name__,
+                'dependencies': node.get_dependency_names(),
+                'can_operate': getattr(node.can_operate, '__func__', None) is not Node.can_operate.__func__,
+                'can_operate_attributes': list(get_can_operate_attribute_names(node)),
+                # FormattedNameNode (KPV/KTI) can have many names
+                'names': node.names() if hasattr(node, 'names') else [name],
+            })
+        manifest['modules'][module] = _source_fingerprint(module)
+        manifest['nodes'][module] = entries
+    return manifest
+
+
+def save_node_manifest(path, modules=None):
+    '''
+    Write a manifest of the Node classes within modules to a JSON file.
+
+    :param path: Path of the manifest file.
+    :type path: str
+    :param modules: Module names. Defaults to settings.NODE_MODULES.
+    :type modules: [str] or None
+    :returns: The manifest written.
+    :rtype: dict
+    '''
+    if modules is None:
+        modules = settings.NODE_MODULES
+    manifest = node_manifest(modules)
+    with open(path, 'w') as fh:
+        simplejson.dump(manifest, fh, indent=1)
+    return manifest
+
+
+def load_node_manifest(path, modules=None):
+    '''
+    Load a manifest written by save_node_manifest if it is still valid, i.e.
+    it covers all modules, was written by this version of the analyser and no
+    module source files have changed since.
+
+    :param path: Path of the manifest file.
+    :type path: str
+    :param modules: Module names. Defaults to all modules within the manifest.
+    :type modules: [str] or None
+    :returns: The manifest or None if missing, unreadable or stale.
+    :rtype: dict or None
+    '''
+    try:
+        with open(path) as fh:
+            manifest = simplejson.load(fh)
+    except (IOError, OSError, ValueError):
+        return None
+    if modules is None:
+        modules = manifest['modules']
+    if manifest.get('version') != __version__:
+        logger.info("Node manifest '%s' was written by a different version.", path)
+        return None
+    for module in modules:
+        fingerprint = manifest['modules'].get(module)
+        if fingerprint is None or fingerprint != _source_fingerprint(module):
+            logger.info("Node manifest '%s' is stale for module '%s'.", path, module)
+            return None
+    return manifest
+
+
 def derived_trimmer(hdf_path, node_names, dest):
     '''
     Trims an HDF file of parameters which are not dependencies of nodes in
@@ -345,7 +530,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     subparser = parser.add_subparsers(dest='command',
                                       description="Utility command, currently "
-                                      "'trimmer' and 'list' are supported",
+                                      "'trimmer', 'list' and 'manifest' are supported",
                                       help='Additional help')
     trimmer_parser = subparser.add_parser('trimmer')
     trimmer_parser.add_argument('input_file_path', help='Input hdf filename.')
@@ -360,6 +545,11 @@ if __name__ == '__main__':
     list_parser.add_argument('--additional-modules', nargs='+',
                              help='Additional modules')
 
+    manifest_parser = subparser.add_parser('manifest')
+    manifest_parser.add_argument('output_file_path', help='Output JSON filename.')
+    manifest_parser.add_argument('--additional-modules', nargs='+',
+                                 help='Additional modules')
+
     #list_parser.add_argument('--list', action='store_true',
     #                         help='Output as Python list')
 
@@ -387,5 +577,12 @@ if __name__ == '__main__':
         if args.additional_modules:
             modules += args.additional_modules
         print(_get_names(modules, **kwargs))
+    elif args.command == 'manifest':
+        modules = list(settings.NODE_MODULES)
+        if args.additional_modules:
+            modules += args.additional_modules
+        manifest = save_node_manifest(args.output_file_path, modules)
+        print('Manifest of %d nodes written to: %s' % (
+            sum(len(n) for n in manifest['nodes'].values()), args.output_file_path))
     else:
         parser.error("'%s' is not a known command." % args.command)
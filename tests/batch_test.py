@@ -0,0 +1,107 @@
+import mock
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from datetime import datetime, timedelta
+
+from analysis_engine.batch import find_files, process_file, summarise, time_limit
+from analysis_engine.datastructures import Segment
+from analysis_engine.exceptions import FlightTimeoutError
+
+
+class TestFindFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for name in ('b.hdf5', 'a.hdf5', 'c.HDF', 'notes.txt'):
+            open(os.path.join(self.temp_dir, name), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_find_files(self):
+        manifest = os.path.join(self.temp_dir, 'manifest.txt')
+        with open(manifest, 'w') as f:
+            f.write('# Comment\n\nd.hdf5\na.hdf5\n')
+        path = lambda name: os.path.join(self.temp_dir, name)
+        self.assertEqual(find_files([self.temp_dir]), [path('a.hdf5'), path('b.hdf5'), path('c.HDF')])
+        self.assertEqual(find_files([manifest, self.temp_dir, path('e.hdf5')]),
+                         [path('d.hdf5'), path('a.hdf5'), path('b.hdf5'), path('c.HDF'), path('e.hdf5')])
+
+
+class TestTimeLimit(unittest.TestCase):
+
+    def test_time_limit(self):
+        with self.assertRaises(FlightTimeoutError):
+            with time_limit(0.05, 'flight.hdf5'):
+                time.sleep(1)
+        with time_limit(1, 'flight.hdf5'):
+            pass
+        with time_limit(None, 'flight.hdf5'):
+            pass
+
+
+class TestProcessFile(unittest.TestCase):
+
+    def setUp(self):
+        start_dt = datetime(2020, 1, 1)
+        self.segments = [
+            Segment(slice(0, 3600), 'START_AND_STOP', 1, 'flight.001.hdf5', start_dt=start_dt,
+                    stop_dt=start_dt + timedelta(hours=1)),
+            Segment(slice(3600, 3900), 'GROUND_ONLY', 2, 'flight.002.hdf5', start_dt=start_dt,
+                    stop_dt=start_dt + timedelta(seconds=300)),
+        ]
+
+    @mock.patch('analysis_engine.batch.process_flight')
+    @mock.patch('analysis_engine.batch.split_hdf_to_segments')
+    @mock.patch('analysis_engine.batch.copy_file')
+    def test_process_file(self, copy_file, split_hdf_to_segments, process_flight):
+        copy_file.return_value = 'flight_split.hdf5'
+        split_hdf_to_segments.return_value = self.segments
+        process_flight.side_effect = [{}, ValueError('Invalid')]
+        aircraft_info = {'Tail Number': 'G-FDSL'}
+        result = process_file('flight.hdf5', 'G-FDSL', aircraft_info=aircraft_info,
+                              process_kwargs={'force': True})
+        split_hdf_to_segments.assert_called_once_with(
+            'flight_split.hdf5', aircraft_info, fallback_dt=None, validation_dt=None,
+            fallback_relative_to_start=False)
+        process_flight.assert_called_with(
+            {'File': 'flight.002.hdf5', 'Segment Type': 'GROUND_ONLY', 'Start Datetime': datetime(2020, 1, 1)},
+            'G-FDSL', aircraft_info=aircraft_info, force=True)
+        self.assertIsNone(result['error'])
+        self.assertEqual([s['duration'] for s in result['segments']], [3600, 300])
+        self.assertEqual([s['error'] for s in result['segments']], [None, 'Invalid'])
+
+    @mock.patch('analysis_engine.batch.split_hdf_to_segments')
+    @mock.patch('analysis_engine.batch.copy_file')
+    def test_process_file_split_error(self, copy_file, split_hdf_to_segments):
+        split_hdf_to_segments.side_effect = FlightTimeoutError('flight.hdf5', 10)
+        result = process_file('flight.hdf5', 'G-FDSL', aircraft_info={})
+        self.assertTrue(result['timed_out'])
+        self.assertEqual(result['segments'], [])
+        self.assertIn('exceeded the timeout', result['error'])
+
+
+class TestSummarise(unittest.TestCase):
+
+    def test_summarise(self):
+        results = [
+            {'file': 'a.hdf5', 'error': None, 'timed_out': False, 'segments': [
+                {'duration': 3600, 'error': None, 'timed_out': False},
+                {'duration': 600, 'error': 'Timeout', 'timed_out': True},
+            ]},
+            {'file': 'b.hdf5', 'error': 'Invalid', 'timed_out': False, 'segments': []},
+        ]
+        summary = summarise(results, 1800)
+        self.assertEqual(summary['files'], 2)
+        self.assertEqual(summary['files_failed'], 1)
+        self.assertEqual(summary['segments'], 2)
+        self.assertEqual(summary['segments_processed'], 1)
+        self.assertEqual(summary['segments_failed'], 1)
+        self.assertEqual(summary['timed_out'], 1)
+        self.assertEqual(summary['flight_hours'], 1)
+        self.assertEqual(summary['flights_per_hour'], 2)
+        self.assertAlmostEqual(summary['segments_per_second'], 2 / 1800.0)
@@ -0,0 +1,514 @@
+'''
+Micro-benchmarks of optimised processing steps on representative data. Each
+benchmark is a sub-command reporting the fastest of several timings, e.g.
+
+    python -m tests.benchmark dependency-order --repeat 3
+
+dependency-order
+    Resolves the processing order of the example recorded parameters used by
+    the dependency graph tests with the recursive and iterative resolvers for
+    START_AND_STOP and GROUND_ONLY segments.
+
+align
+    Aligns parameters recorded at each combination of frequency (0.25-16Hz)
+    and offset which requires interpolation between samples.
+
+repair-mask
+    Repairs arrays with many short gaps, such as ARINC 717 data with frequent
+    sync losses, with each repair method.
+
+cycle-finder
+    Finds the turning points of long noisy arrays, such as 16Hz control
+    surface positions, with a range of noise levels and minimum steps.
+
+calculate-timebase
+    Calculates the timebase of long recordings with a clock correction part
+    way through, a few corrupt values and a range of masked proportions.
+
+hysteresis
+    Applies hysteresis and second_window to noisy 16Hz data, and hysteresis
+    to the masked ramp previously timed by the library tests.
+
+node-release
+    Derives parameters from many long recorded parameters, each read by
+    several nodes and so cached, with and without NODE_RELEASE, reporting the
+    peak resident memory of each in a separate process.
+'''
+import argparse
+import itertools
+import mock
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import timeit
+
+from datetime import datetime
+
+import numpy as np
+
+from analysis_engine import settings
+from analysis_engine.dependency_graph import dependency_order
+from analysis_engine.library import (
+    _align_kernel,
+    align_args,
+    calculate_timebase,
+    cycle_finder,
+    hysteresis,
+    max_value,
+    min_value,
+    repair_mask,
+    second_window,
+)
+from analysis_engine.node import DerivedParameterNode, KeyPointValueNode, NodeManager, P
+from analysis_engine.process_flight import derive_parameters
+
+
+FREQUENCIES = (0.25, 0.5, 1, 2, 4, 8, 16)
+# Offsets as a proportion of the sample interval of each parameter.
+OFFSETS = (0, 0.1, 0.5, 0.9)
+# Proportions of samples masked, each sample being masked independently.
+MASKED = (0.01, 0.05, 0.2, 0.5)
+REPAIRS = (
+    {},
+    {'repair_duration': None},
+    {'extrapolate': True},
+    {'repair_above': 50},
+    {'method': 'fill_start'},
+    {'method': 'fill_stop'},
+)
+# Standard deviation of the noise added to each sample and minimum steps.
+NOISE = (0.05, 0.5)
+MIN_STEPS = (0.5, 2.0, 5.0)
+# Proportions of date and time samples masked.
+TIMEBASE_MASKED = (0.0, 0.01, 0.2)
+
+
+def dependency_order_benchmark(repeat=3):
+    '''
+    :param repeat: Number of times each order is resolved, the fastest being
+        reported.
+    :type repeat: int
+    :returns: Segment type, resolver, length of the processing order and time
+        taken.
+    :rtype: [dict]
+    '''
+    from tests.dependency_graph_test import TestDependencyGraph
+
+    graph_test = TestDependencyGraph()
+    aircraft_info, lfl_params = graph_test._example_recorded_parameters()
+    results = []
+    for segment_type in ('START_AND_STOP', 'GROUND_ONLY'):
+        segment_info = {'Start Datetime': datetime.now(), 'Segment Type': segment_type}
+        resolve = lambda: graph_test._get_dependency_order([], aircraft_info, lfl_params,
+                                                           segment_info)
+        for resolver in ('recursive', 'iterative'):
+            with mock.patch.object(settings, 'DEPENDENCY_RESOLVER', resolver):
+                results.append({
+                    'segment_type': segment_type,
+                    'resolver': resolver,
+                    'nodes': len(resolve()),
+                    'time': min(timeit.repeat(resolve, number=1, repeat=repeat)),
+                })
+    return results
+
+
+def print_dependency_order(args):
+    results = dependency_order_benchmark(repeat=args.repeat)
+    print('%-14s %-9s %5s %8s' % ('segment type', 'resolver', 'nodes', 'time (s)'))
+    for r in results:
+        print('%-14s %-9s %5d %8.3f' % (r['segment_type'], r['resolver'], r['nodes'], r['time']))
+
+
+def align_benchmark(duration=3600, repeat=5, masked=0.01):
+    '''
+    :param duration: Seconds of data to align, a multiple of 4.
+    :type duration: int
+    :param repeat: Number of times each alignment is timed, the fastest
+        being reported.
+    :type repeat: int
+    :param masked: Proportion of slave samples masked.
+    :type masked: float
+    :returns: Frequencies and offsets of each alignment and time taken.
+    :rtype: [dict]
+    '''
+    rng = np.random.RandomState(0)
+    results = []
+    for slave_frequency, master_frequency in itertools.product(FREQUENCIES, repeat=2):
+        for slave_offset, master_offset in itertools.product(OFFSETS, repeat=2):
+            slave_offset /= float(slave_frequency)
+            master_offset /= float(master_frequency)
+            if slave_offset == master_offset:
+                # Served by the power of 2 fast path of align_args.
+                continue
+            length = int(duration * slave_frequency)
+            slave_array = np.ma.array(rng.rand(length) * 100, mask=rng.rand(length) < masked)
+            args = (slave_array, slave_frequency, slave_offset, master_frequency, master_offset)
+            results.append({
+                'slave_frequency': slave_frequency,
+                'slave_offset': slave_offset,
+                'master_frequency': master_frequency,
+                'master_offset': master_offset,
+                'time': min(timeit.repeat(lambda: align_args(*args), number=1, repeat=repeat)),
+            })
+    return results
+
+
+def print_align(args):
+    results = align_benchmark(duration=args.duration, repeat=args.repeat, masked=args.masked)
+    print('%8s %8s %9s %8s %9s' % ('slave Hz', 'offset', 'master Hz', 'offset', 'time (ms)'))
+    for r in results:
+        print('%8s %8.4f %9s %8.4f %9.3f' % (
+            r['slave_frequency'], r['slave_offset'], r['master_frequency'], r['master_offset'],
+            r['time'] * 1000))
+    print('Total: %.3fs, %d kernels cached.' % (
+        sum(r['time'] for r in results), _align_kernel.cache_info().currsize))
+
+
+def repair_mask_benchmark(samples=100000, repeat=5):
+    '''
+    :param samples: Length of each array.
+    :type samples: int
+    :param repeat: Number of times each repair is timed, the fastest being
+        reported.
+    :type repeat: int
+    :returns: Proportion masked, number of gaps, repair_mask arguments and
+        time taken.
+    :rtype: [dict]
+    '''
+    rng = np.random.RandomState(0)
+    results = []
+    for masked in MASKED:
+        array = np.ma.array(rng.rand(samples) * 100, mask=rng.rand(samples) < masked)
+        gaps = len(np.ma.clump_masked(array))
+        for kwargs in REPAIRS:
+            results.append({
+                'masked': masked,
+                'gaps': gaps,
+                'kwargs': kwargs,
+                'time': min(timeit.repeat(lambda: repair_mask(array, **kwargs), number=1, repeat=repeat)),
+            })
+    return results
+
+
+def print_repair_mask(args):
+    results = repair_mask_benchmark(samples=args.samples, repeat=args.repeat)
+    print('%6s %7s %-32s %9s' % ('masked', 'gaps', 'arguments', 'time (ms)'))
+    for r in results:
+        print('%6.2f %7d %-32s %9.3f' % (r['masked'], r['gaps'], r['kwargs'] or 'defaults', r['time'] * 1000))
+
+
+def cycle_finder_benchmark(samples=100000, repeat=3, hz=16.0):
+    '''
+    :param samples: Length of each array.
+    :type samples: int
+    :param repeat: Number of times each search is timed, the fastest being
+        reported.
+    :type repeat: int
+    :param hz: Frequency of each array.
+    :type hz: float
+    :returns: Noise, minimum step, number of turning points found and time
+        taken.
+    :rtype: [dict]
+    '''
+    rng = np.random.RandomState(0)
+    t = np.arange(samples) / hz
+    results = []
+    for noise in NOISE:
+        # Slowly cycling control surface position with a few masked samples.
+        data = 10 * np.sin(t / 7.0) + 3 * np.sin(t * 1.3) + rng.randn(samples) * noise
+        array = np.ma.array(data, mask=rng.rand(samples) < 0.001)
+        for min_step in MIN_STEPS:
+            results.append({
+                'noise': noise,
+                'min_step': min_step,
+                'turning_points': len(cycle_finder(array, min_step=min_step)[0]),
+                'time': min(timeit.repeat(lambda: cycle_finder(array, min_step=min_step),
+                                          number=1, repeat=repeat)),
+            })
+    return results
+
+
+def print_cycle_finder(args):
+    results = cycle_finder_benchmark(samples=args.samples, repeat=args.repeat)
+    print('%6s %8s %14s %9s' % ('noise', 'min_step', 'turning points', 'time (ms)'))
+    for r in results:
+        print('%6.2f %8.1f %14d %9.3f' % (r['noise'], r['min_step'], r['turning_points'], r['time'] * 1000))
+
+
+def recording(hours, masked, rng):
+    '''
+    :returns: 1Hz two digit year, month, day, hour, minute and second
+        parameters of a recording starting shortly before midnight on the
+        28th February 2024, with the clock corrected by a few seconds part way
+        through, a few corrupt values and each sample masked with probability
+        masked.
+    :rtype: [np.ma.masked_array]
+    '''
+    samples = int(hours * 3600)
+    clock = np.arange(samples, dtype=np.int64)
+    clock[samples // 3:] += 7
+    times = np.datetime64('2024-02-28T23:50:00') + clock.astype('timedelta64[s]')
+    years = times.astype('datetime64[Y]')
+    months = times.astype('datetime64[M]')
+    dates = times.astype('datetime64[D]')
+    seconds = (times - dates).astype(int)
+    arrays = [
+        years.astype(int) + 1970 - 2000,
+        (months - years).astype(int) + 1,
+        (dates - months).astype(int) + 1,
+        seconds // 3600,
+        seconds // 60 % 60,
+        seconds % 60,
+    ]
+    parameters = []
+    for array in arrays:
+        corrupt = rng.rand(samples) < 0.001
+        array[corrupt] = rng.randint(0, 100, corrupt.sum())
+        parameters.append(np.ma.array(array, mask=rng.rand(samples) < masked))
+    return parameters
+
+
+def calculate_timebase_benchmark(hours=20, repeat=3):
+    '''
+    :param hours: Duration of each recording.
+    :type hours: float
+    :param repeat: Number of times each calculation is timed, the fastest
+        being reported.
+    :type repeat: int
+    :returns: Proportion masked, timebase and time taken.
+    :rtype: [dict]
+    '''
+    rng = np.random.RandomState(0)
+    results = []
+    for masked in TIMEBASE_MASKED:
+        parameters = recording(hours, masked, rng)
+        results.append({
+            'masked': masked,
+            'timebase': calculate_timebase(*parameters),
+            'time': min(timeit.repeat(lambda: calculate_timebase(*parameters), number=1, repeat=repeat)),
+        })
+    return results
+
+
+def print_calculate_timebase(args):
+    results = calculate_timebase_benchmark(hours=args.hours, repeat=args.repeat)
+    print('%6s %-25s %9s' % ('masked', 'timebase', 'time (ms)'))
+    for r in results:
+        print('%6.2f %-25s %9.3f' % (r['masked'], r['timebase'], r['time'] * 1000))
+
+
+def hysteresis_benchmark(samples=100000, repeat=3, hz=16.0):
+    '''
+    :param samples: Length of each array.
+    :type samples: int
+    :param repeat: Number of times each filter is timed, the fastest being
+        reported.
+    :type repeat: int
+    :param hz: Frequency of the noisy array.
+    :type hz: float
+    :returns: Data, filter and time taken.
+    :rtype: [dict]
+    '''
+    rng = np.random.RandomState(0)
+    t = np.arange(samples) / hz
+    noisy = np.ma.array(10 * np.sin(t / 7.0) + rng.randn(samples), mask=rng.rand(samples) < 0.001)
+    ramp = np.ma.arange(samples)
+    ramp[0] = np.ma.masked
+    ramp[-1000:] = np.ma.masked
+    filters = (
+        ('noisy', 'hysteresis', lambda: hysteresis(noisy, 2)),
+        ('noisy', 'second_window', lambda: second_window(noisy, hz, 3)),
+        ('ramp', 'hysteresis', lambda: hysteresis(ramp, 10)),
+    )
+    return [{'data': data, 'filter': name,
+             'time': min(timeit.repeat(function, number=1, repeat=repeat))}
+            for data, name, function in filters]
+
+
+def print_hysteresis(args):
+    results = hysteresis_benchmark(samples=args.samples, repeat=args.repeat)
+    print('%-6s %-14s %9s' % ('data', 'filter', 'time (ms)'))
+    for r in results:
+        print('%-6s %-14s %9.3f' % (r['data'], r['filter'], r['time'] * 1000))
+
+
+class DiskHDF(object):
+    '''
+    Stand-in for hdf_file storing each parameter within a file, read every
+    time it is requested unless named within cache_param_list.
+    '''
+    def __init__(self, path, duration):
+        self.path = path
+        self.duration = duration
+        self.cache_param_list = []
+        self._cache = {}
+
+    def get_param(self, name, valid_only=False):
+        if name in self._cache:
+            return self._cache[name]
+        with np.load(os.path.join(self.path, name + '.npz')) as f:
+            param = P(name, np.ma.array(f['data'], mask=f['mask']),
+                      frequency=float(f['frequency']), offset=float(f['offset']))
+        if name in self.cache_param_list:
+            self._cache[name] = param
+        return param
+
+    def set_param(self, param):
+        self._cache.pop(param.name, None)
+        array = np.ma.asarray(param.array)
+        np.savez(os.path.join(self.path, param.name + '.npz'), data=array.data,
+                 mask=np.ma.getmaskarray(array), frequency=param.frequency, offset=param.offset)
+
+
+def _doubled(node, param):
+    node.array = param.array * 2
+
+
+def _offset(node, param):
+    node.array = param.array + 1
+
+
+def _max(node, param):
+    node.create_kpv(*max_value(param.array))
+
+
+def _min(node, param):
+    node.create_kpv(*min_value(param.array))
+
+
+def _node_class(name, dep_name, node_type, function):
+    def derive(self, param=P(dep_name)):
+        function(self, param)
+    return type(name.replace(' ', ''), (node_type,), {'name': name, 'derive': derive})
+
+
+def _node_release_peak_rss(path, names, duration, release):
+    '''
+    :returns: Peak resident memory in bytes after deriving the nodes.
+    :rtype: int
+    '''
+    derived_nodes = {}
+    for name in names:
+        for node in (_node_class(name + ' Doubled', name, DerivedParameterNode, _doubled),
+                     _node_class(name + ' Offset', name, DerivedParameterNode, _offset),
+                     _node_class(name + ' Doubled Max', name + ' Doubled', KeyPointValueNode, _max),
+                     _node_class(name + ' Doubled Min', name + ' Doubled', KeyPointValueNode, _min)):
+            derived_nodes[node.get_name()] = node
+    node_mgr = NodeManager({'Start Datetime': datetime.now()}, duration, list(names),
+                           sorted(derived_nodes), [], derived_nodes, {}, {})
+    process_order, _ = dependency_order(node_mgr)
+    hdf = DiskHDF(path, duration)
+    # Recorded parameters and the doubled parameters are each read by two nodes.
+    hdf.cache_param_list.extend(names)
+    hdf.cache_param_list.extend(name + ' Doubled' for name in names)
+    with mock.patch.object(settings, 'NODE_RELEASE', release):
+        derive_parameters(hdf, node_mgr, process_order)
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def node_release_benchmark(parameters=30, hours=4, hz=16):
+    '''
+    :param parameters: Number of recorded parameters.
+    :type parameters: int
+    :param hours: Duration of the recording.
+    :type hours: float
+    :param hz: Frequency of the recorded parameters.
+    :type hz: float
+    :returns: Whether nodes were released, the size of each recorded array and
+        the peak resident memory.
+    :rtype: [dict]
+    '''
+    duration = int(hours * 3600)
+    path = tempfile.mkdtemp()
+    try:
+        hdf = DiskHDF(path, duration)
+        rng = np.random.RandomState(0)
+        names = ['Recorded %d' % index for index in range(parameters)]
+        for name in names:
+            samples = int(duration * hz)
+            array = np.ma.array(rng.randn(samples), mask=rng.rand(samples) < 0.01)
+            hdf.set_param(P(name, array, frequency=hz))
+        nbytes = array.data.nbytes + array.mask.nbytes
+        # Peak resident memory only increases, so each setting is measured
+        # within a new process.
+        context = multiprocessing.get_context('spawn')
+        results = []
+        for release in (False, True):
+            with context.Pool(1) as pool:
+                peak = pool.apply(_node_release_peak_rss, (path, names, duration, release))
+            results.append({'release': release, 'array_bytes': nbytes, 'peak_bytes': peak})
+        return results
+    finally:
+        shutil.rmtree(path)
+
+
+def print_node_release(args):
+    results = node_release_benchmark(parameters=args.parameters, hours=args.hours, hz=args.hz)
+    print('%-7s %14s %15s' % ('release', 'array (MiB)', 'peak RSS (MiB)'))
+    for r in results:
+        print('%-7s %14.1f %15.1f' % (r['release'], r['array_bytes'] / 2.0 ** 20,
+                                       r['peak_bytes'] / 2.0 ** 20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark optimised processing steps.')
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    dependency_order_parser = subparsers.add_parser(
+        'dependency-order', help='Resolve processing orders with each resolver.')
+    dependency_order_parser.add_argument('--repeat', type=int, default=3,
+                                         help='Number of times each order is resolved.')
+    dependency_order_parser.set_defaults(func=print_dependency_order)
+
+    align_parser = subparsers.add_parser(
+        'align', help='Align parameters across frequencies and offsets.')
+    align_parser.add_argument('--duration', type=int, default=3600, help='Seconds of data to align.')
+    align_parser.add_argument('--repeat', type=int, default=5, help='Number of times each alignment is timed.')
+    align_parser.add_argument('--masked', type=float, default=0.01, help='Proportion of samples masked.')
+    align_parser.set_defaults(func=print_align)
+
+    repair_mask_parser = subparsers.add_parser(
+        'repair-mask', help='Repair arrays with many gaps.')
+    repair_mask_parser.add_argument('--samples', type=int, default=100000, help='Length of each array.')
+    repair_mask_parser.add_argument('--repeat', type=int, default=5, help='Number of times each repair is timed.')
+    repair_mask_parser.set_defaults(func=print_repair_mask)
+
+    cycle_finder_parser = subparsers.add_parser(
+        'cycle-finder', help='Find turning points of long noisy arrays.')
+    cycle_finder_parser.add_argument('--samples', type=int, default=100000, help='Length of each array.')
+    cycle_finder_parser.add_argument('--repeat', type=int, default=3, help='Number of times each search is timed.')
+    cycle_finder_parser.set_defaults(func=print_cycle_finder)
+
+    calculate_timebase_parser = subparsers.add_parser(
+        'calculate-timebase', help='Calculate the timebase of long recordings.')
+    calculate_timebase_parser.add_argument('--hours', type=float, default=20, help='Duration of each recording.')
+    calculate_timebase_parser.add_argument('--repeat', type=int, default=3,
+                                           help='Number of times each calculation is timed.')
+    calculate_timebase_parser.set_defaults(func=print_calculate_timebase)
+
+    hysteresis_parser = subparsers.add_parser(
+        'hysteresis', help='Apply hysteresis and second_window to long arrays.')
+    hysteresis_parser.add_argument('--samples', type=int, default=100000, help='Length of each array.')
+    hysteresis_parser.add_argument('--repeat', type=int, default=3, help='Number of times each filter is timed.')
+    hysteresis_parser.set_defaults(func=print_hysteresis)
+
+    node_release_parser = subparsers.add_parser(
+        'node-release', help='Measure peak memory with and without NODE_RELEASE.')
+    node_release_parser.add_argument('--parameters', type=int, default=30,
+                                     help='Number of recorded parameters.')
+    node_release_parser.add_argument('--hours', type=float, default=4, help='Duration of the recording.')
+    node_release_parser.add_argument('--hz', type=float, default=16,
+                                     help='Frequency of the recorded parameters.')
+    node_release_parser.set_defaults(func=print_node_release)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
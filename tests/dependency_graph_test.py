@@ -1,15 +1,23 @@
 from __future__ import print_function
 
 import importlib.util
+import mock
+import shutil
+import tempfile
 from pathlib import Path
 import unittest
 import types
 
 from datetime import datetime
 
+import networkx as nx
+
 from analysis_engine.node import (DerivedParameterNode, Node, NodeManager, P)
 from analysis_engine.dependency_graph import (
+    clear_dependency_order_cache,
     dependency_order,
+    dependency_order_cache_key,
+    dependent_nodes,
     graph_nodes,
     indent_tree,
 )
@@ -632,6 +640,94 @@ Node: Start Datetime 	Pre: [] 	Succ: [] 	Neighbors: [] 	Edges: []
         self.assert_order_maintained(order, expected_order)
 
 
+class TestDependencyGraphIterative(TestDependencyGraph):
+    '''
+    Repeat the dependency graph tests using the iterative resolver.
+    '''
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(settings, 'DEPENDENCY_RESOLVER', 'iterative')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_matches_recursive_resolver(self):
+        aircraft_info, lfl_params = self._example_recorded_parameters()
+        orders = {}
+        for resolver in ('recursive', 'iterative'):
+            with mock.patch.object(settings, 'DEPENDENCY_RESOLVER', resolver):
+                orders[resolver] = self._get_dependency_order([], aircraft_info, lfl_params)
+        self.assertEqual(orders['iterative'], orders['recursive'])
+
+    def test_ground_only_matches_recursive_resolver(self):
+        aircraft_info, lfl_params = self._example_recorded_parameters()
+        segment_info = {'Start Datetime': datetime.now(), 'Segment Type': 'GROUND_ONLY'}
+        orders = {}
+        for resolver in ('recursive', 'iterative'):
+            with mock.patch.object(settings, 'DEPENDENCY_RESOLVER', resolver):
+                orders[resolver] = self._get_dependency_order([], aircraft_info, lfl_params, segment_info)
+        self.assertEqual(orders['iterative'], orders['recursive'])
+
+
+class TestDependencyOrderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.lfl_params = ['Raw1', 'Raw2', 'Raw3', 'Raw4', 'Raw5']
+        self.derived_nodes = {
+            'P4': MockParam(dependencies=['Raw1', 'Raw2']),
+            'P5': MockParam(dependencies=['Raw3', 'Raw4']),
+            'P6': MockParam(dependencies=['Raw3']),
+            'P7': MockParam(dependencies=['P4', 'P5', 'P6']),
+            'P8': MockParam(dependencies=['Raw5']),
+        }
+        self.cache_dir = tempfile.mkdtemp()
+        clear_dependency_order_cache()
+
+    def tearDown(self):
+        clear_dependency_order_cache()
+        shutil.rmtree(self.cache_dir)
+
+    def _node_mgr(self, lfl_params=None):
+        return NodeManager({'Start Datetime': datetime.now()}, 10, lfl_params or self.lfl_params,
+                           ['P7', 'P8'], [], self.derived_nodes, {}, {})
+
+    def test_cache_key(self):
+        key = dependency_order_cache_key(self._node_mgr())
+        self.assertEqual(key, dependency_order_cache_key(self._node_mgr()))
+        self.assertNotEqual(key, dependency_order_cache_key(self._node_mgr(self.lfl_params[:-1])))
+
+    @mock.patch.object(settings, 'DEPENDENCY_ORDER_CACHE_SIZE', 2)
+    def test_memory_cache(self):
+        order, gr_st = dependency_order(self._node_mgr())
+        with mock.patch('analysis_engine.dependency_graph.graph_nodes') as patched:
+            cached_order, cached_gr_st = dependency_order(self._node_mgr())
+            patched.assert_not_called()
+        self.assertEqual(cached_order, order)
+        self.assertEqual(sorted(cached_gr_st.edges()), sorted(gr_st.edges()))
+        # Different parameters are not served from the cache.
+        with mock.patch('analysis_engine.dependency_graph.graph_nodes', wraps=graph_nodes) as patched:
+            dependency_order(self._node_mgr(['Raw1', 'Raw2', 'Raw5']))
+            self.assertEqual(patched.call_count, 1)
+
+    def test_disk_cache(self):
+        with mock.patch.object(settings, 'DEPENDENCY_ORDER_CACHE_DIR', self.cache_dir):
+            order, gr_st = dependency_order(self._node_mgr())
+            clear_dependency_order_cache()
+            with mock.patch('analysis_engine.dependency_graph.graph_nodes') as patched:
+                cached_order, cached_gr_st = dependency_order(self._node_mgr())
+                patched.assert_not_called()
+        self.assertEqual(cached_order, order)
+        self.assertEqual(sorted(cached_gr_st.edges()), sorted(gr_st.edges()))
+
+
+
+class TestDependentNodes(unittest.TestCase):
+    def test_dependent_nodes(self):
+        graph = nx.DiGraph([('root', 'C'), ('root', 'D'), ('C', 'B'), ('B', 'A'), ('D', 'E')])
+        self.assertEqual(dependent_nodes(graph, ['A']), {'A', 'B', 'C'})
+        self.assertEqual(dependent_nodes(graph, ['E', 'Missing']), {'D', 'E', 'Missing'})
+        self.assertEqual(dependent_nodes(graph, []), set())
+
+
 if __name__ == '__main__':
     unittest.main()
 
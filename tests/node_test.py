@@ -19,7 +19,9 @@ from analysis_engine.node import (
     KeyTimeInstanceNode, KeyTimeInstance, KTI,
     FlightAttributeNode,
     FormattedNameNode,
-    Node, NodeManager,
+    HDFParameterCache,
+    LazyNode,
+    Node, NodeCache, NodeManager,
     Parameter, P,
     MultistateDerivedParameterNode, M,
     load,
@@ -27,6 +29,10 @@ from analysis_engine.node import (
     SectionNode,
     Section,
     _calculate_offset,
+    get_can_operate_attribute_names,
+    get_node_fingerprint,
+    item_columns,
+    set_item_fields,
 )
 
 from hdfaccess.file import hdf_file
@@ -70,6 +76,114 @@ class TestCalculateOffset(unittest.TestCase):
             offset = _calculate_offset(test[1][0], test[0][1])
             self.assertAlmostEqual(offset, test[1][1], places=3)
 
+class TestNodeCache(unittest.TestCase):
+    def _param(self, name, size, frequency=1):
+        return P(name, np.ma.zeros(size, dtype=np.float64), frequency=frequency)
+
+    def test_get_set(self):
+        cache = NodeCache()
+        param = self._param('A', 10)
+        key = Node.cache_key('A', 1, 0)
+        self.assertIsNone(cache.get(key))
+        cache[key] = param
+        self.assertIs(cache.get(key), param)
+        self.assertIn(key, cache)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.nbytes, 80)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        # Replacing the node does not count its size twice.
+        cache[key] = param
+        self.assertEqual(cache.nbytes, 80)
+
+    def test_lru_eviction(self):
+        cache = NodeCache(max_bytes=200)
+        key_a, key_b, key_c = (Node.cache_key(n, 1, 0) for n in 'ABC')
+        cache[key_a] = self._param('A', 10)
+        cache[key_b] = self._param('B', 10)
+        cache.get(key_a)  # A is now more recently used than B.
+        cache[key_c] = self._param('C', 10)
+        self.assertIn(key_a, cache)
+        self.assertNotIn(key_b, cache)
+        self.assertIn(key_c, cache)
+        self.assertEqual(cache.nbytes, 160)
+        self.assertEqual(cache.evicted, 1)
+        self.assertEqual(cache.evicted_bytes, 80)
+        # Nodes larger than the cache are not stored.
+        cache[Node.cache_key('D', 1, 0)] = self._param('D', 100)
+        self.assertEqual(len(cache), 2)
+
+    def test_masked_bytes(self):
+        cache = NodeCache()
+        param = self._param('A', 10)
+        param.array[0] = np.ma.masked
+        cache[Node.cache_key('A', 1, 0)] = param
+        self.assertEqual(cache.nbytes, 90)
+
+    def test_release(self):
+        cache = NodeCache()
+        cache[Node.cache_key('A', 1, 0)] = self._param('A', 10)
+        cache[Node.cache_key('A', 2, 0)] = self._param('A', 20, frequency=2)
+        cache[Node.cache_key('B', 1, 0)] = self._param('B', 10)
+        cache.release('A')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.nbytes, 80)
+        self.assertEqual(cache.released, 2)
+        self.assertEqual(cache.released_bytes, 240)
+        cache.release('A')
+        self.assertEqual(cache.released, 2)
+
+    def test_get_aligned(self):
+        cache = NodeCache()
+        param = P('A', np.ma.arange(10, dtype=np.float64), frequency=1, cache=cache)
+        target = P('B', np.ma.arange(20, dtype=np.float64), frequency=2)
+        aligned = param.get_aligned(target)
+        self.assertIs(param.get_aligned(target), aligned)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+
+class TestHDFParameterCache(unittest.TestCase):
+    def setUp(self):
+        self.hdf = mock.Mock(cache_param_list=['A', 'B'], duration=10)
+        self.hdf.get_param.side_effect = lambda name, valid_only=False: \
+            P(name, np.ma.zeros(10, dtype=np.float64))
+
+    def test_get_param(self):
+        with HDFParameterCache(self.hdf) as hdf:
+            # The HDF file does not cache parameters while entered.
+            self.assertEqual(self.hdf.cache_param_list, [])
+            self.assertEqual(hdf.duration, 10)
+            a = hdf.get_param('A', valid_only=True)
+            a.array[:] = 1
+            # Copies of cached parameters are returned.
+            self.assertEqual(hdf.get_param('A').array.sum(), 0)
+            hdf.get_param('C', valid_only=True)
+            hdf.get_param('C', valid_only=True)
+            self.assertEqual(self.hdf.get_param.call_count, 3)
+            self.assertEqual(hdf.stats()['entries'], 1)
+            self.assertEqual(hdf.nbytes, 80)
+            # Writing a parameter replaces its cached copy.
+            hdf.set_param(a)
+            self.hdf.set_param.assert_called_once_with(a)
+            self.assertEqual(hdf.nbytes, 0)
+        self.assertEqual(self.hdf.cache_param_list, ['A', 'B'])
+
+    def test_release(self):
+        with HDFParameterCache(self.hdf) as hdf:
+            hdf.get_param('A', valid_only=True)
+            hdf.release('A')
+            hdf.release('A')
+            self.assertEqual(hdf.nbytes, 0)
+            self.assertEqual(hdf.released, 1)
+            self.assertEqual(hdf.released_bytes, 80)
+            # Released parameters are no longer cached.
+            hdf.get_param('A', valid_only=True)
+            self.assertEqual(hdf.stats()['entries'], 0)
+        self.assertEqual(self.hdf.cache_param_list, ['B'])
+
+
 class TestNode(unittest.TestCase):
 
     def test_node_attributes(self):
@@ -114,6 +228,13 @@ class TestNode(unittest.TestCase):
 
         self.assertEqual(KeyPointValue123.get_dependency_names(),
                          ['Parameter A', 'Parameter B'])
+        # Names are cached while callers receive a list they may modify.
+        with mock.patch('analysis_engine.node.get_param_kwarg_names') as get_names:
+            names = KeyPointValue123.get_dependency_names()
+            names.append('Parameter C')
+            self.assertEqual(KeyPointValue123.get_dependency_names(),
+                             ['Parameter A', 'Parameter B'])
+        get_names.assert_not_called()
 
     def test_cache_key(self):
         name = 'Parameter A'
@@ -420,6 +541,73 @@ class TestFlightAttributeNode(unittest.TestCase):
         attr.value = False
         self.assertFalse(bool(attr))
 
+class TestLazyNode(unittest.TestCase):
+    def setUp(self):
+        self.entry = {
+            'name': 'SAT',
+            'module': 'tests.sample_derived_parameters',
+            'class': 'SAT',
+            'node_type': 'DerivedParameterNode',
+            'dependencies': ['TAT', 'Indicated Airspeed', 'Pressure Altitude'],
+            'can_operate': False,
+            'can_operate_attributes': ['Aircraft Type'],
+            'names': ['SAT'],
+        }
+
+    def test_lazy_node(self):
+        node = LazyNode(self.entry)
+        with mock.patch('analysis_engine.node.importlib.import_module') as import_module:
+            self.assertEqual(node.get_name(), 'SAT')
+            self.assertEqual(node.get_dependency_names(),
+                             ['TAT', 'Indicated Airspeed', 'Pressure Altitude'])
+            self.assertEqual(node.names(), ['SAT'])
+            self.assertEqual(node.__base__, DerivedParameterNode)
+            self.assertEqual(get_can_operate_attribute_names(node), ('Aircraft Type',))
+            self.assertTrue(node.can_operate(['TAT', 'Indicated Airspeed', 'Pressure Altitude']))
+            self.assertFalse(node.can_operate(['TAT', 'Indicated Airspeed']))
+            import_module.assert_not_called()
+
+        from tests.sample_derived_parameters import SAT
+        self.assertIs(node.load(), SAT)
+        self.assertIsInstance(node(), SAT)
+        self.assertEqual(node.align_frequency, SAT.align_frequency)
+
+    def test_custom_can_operate(self):
+        self.entry['can_operate'] = True
+        node = LazyNode(self.entry)
+        with mock.patch.object(node, 'load') as load:
+            load.return_value.can_operate.return_value = True
+            self.assertTrue(node.can_operate(['TAT'], None))
+        load.return_value.can_operate.assert_called_once_with(['TAT'], None)
+
+
+class TestGetNodeFingerprint(unittest.TestCase):
+    def test_get_node_fingerprint(self):
+        from tests.sample_derived_parameters import Mach, SAT
+
+        class SATSubclass(SAT):
+            pass
+
+        sat = get_node_fingerprint(SAT)
+        self.assertEqual(len(sat), 64)
+        self.assertEqual(get_node_fingerprint(SAT), sat)
+        self.assertNotEqual(get_node_fingerprint(Mach), sat)
+        # Base classes are included within the fingerprint.
+        self.assertNotEqual(get_node_fingerprint(SATSubclass), sat)
+        with mock.patch('analysis_engine.node._NODE_FINGERPRINTS', {}), \
+                mock.patch('analysis_engine.node._get_class_source', side_effect=lambda cls: cls.__name__):
+            self.assertNotEqual(get_node_fingerprint(SAT), sat)
+
+    def test_lazy_node_fingerprint(self):
+        from tests.sample_derived_parameters import SAT
+        node = LazyNode({
+            'name': 'SAT', 'module': 'tests.sample_derived_parameters', 'class': 'SAT',
+            'node_type': 'DerivedParameterNode', 'dependencies': [], 'can_operate': False,
+            'can_operate_attributes': [], 'names': ['SAT'],
+        })
+        self.assertEqual(get_node_fingerprint(node), get_node_fingerprint(SAT))
+
+
 class TestNodeManager(unittest.TestCase):
     def setUp(self):
         self.mock_node = mock.Mock('can_operate') # operable node
@@ -516,6 +704,77 @@ class TestPowerset(unittest.TestCase):
         self.assertEqual(res, expected)
 
 
+class TestItemColumns(unittest.TestCase):
+    def test_item_columns(self):
+        items = [KeyPointValue(index=3, value=5.5, name='a'),
+                 KeyPointValue(index=1.5, value=None, name='b'),
+                 KeyPointValue(index=7, value=2, name='a', latitude=51.5, longitude=-0.5)]
+        columns, names = item_columns(items)
+        self.assertEqual(columns['index'].tolist(), [3, 1.5, 7])
+        self.assertEqual(columns['value'][[0, 2]].tolist(), [5.5, 2])
+        self.assertTrue(np.isnan(columns['value'][1]))
+        self.assertTrue(np.isnan(columns['latitude'][:2]).all())
+        self.assertEqual(columns['latitude'][2], 51.5)
+        self.assertEqual(columns['longitude'][2], -0.5)
+        self.assertEqual(columns['name'].tolist(), [0, 1, 0])
+        self.assertEqual(names, ['a', 'b'])
+
+    def test_item_columns_fields(self):
+        items = [KeyTimeInstance(index=4, name='a'),
+                 KeyTimeInstance(index=2, name='b')]
+        columns, names = item_columns(items, ('index',))
+        self.assertEqual(columns.dtype.names, ('index',))
+        self.assertEqual(columns['index'].tolist(), [4, 2])
+        self.assertEqual(names, [])
+        # KTIs have no value.
+        columns, names = item_columns(items, ('value',))
+        self.assertTrue(np.isnan(columns['value']).all())
+        columns, names = item_columns([])
+        self.assertEqual(len(columns), 0)
+
+    def test_set_item_fields(self):
+        items = [KeyTimeInstance(index=4, name='a'),
+                 KeyTimeInstance(index=2, name='b')]
+        set_item_fields(items, latitude=[51.5, None], longitude=[-0.5, None])
+        self.assertEqual(items[0].latitude, 51.5)
+        self.assertEqual(items[0].longitude, -0.5)
+        self.assertEqual(items[1].latitude, None)
+        set_item_fields(items, datetime=[datetime(2012, 1, 1), None])
+        self.assertEqual(items[0].datetime, datetime(2012, 1, 1))
+        # Items of different types.
+        items.append(KeyPointValue(index=3, value=5, name='c'))
+        set_item_fields(items, latitude=[1, 2, 3])
+        self.assertEqual([i.latitude for i in items], [1, 2, 3])
+
+    def test_set_item_fields_index(self):
+        node = KeyTimeInstanceNode(items=[KeyTimeInstance(index=4, name='a'),
+                                          KeyTimeInstance(index=2, name='b')])
+        self.assertEqual(node.get_first().name, 'b')
+        set_item_fields(node, index=[1, 6])
+        self.assertEqual(node.get_first().name, 'a')
+
+    def test_item_change_discards_holding_lookups(self):
+        a = KeyTimeInstance(index=4, name='a')
+        b = KeyTimeInstance(index=2, name='b')
+        first = KeyTimeInstanceNode(items=[a, b])
+        second = KeyTimeInstanceNode(items=[a])
+        self.assertEqual(first.get_first(), b)
+        self.assertEqual(second.get_first(), a)
+        lookup = first.sorted_lookup('name', 'index')
+        # Items which no lookup holds do not discard lookups.
+        unheld = KeyTimeInstance(index=3, name='c')
+        unheld.index = 1
+        set_item_fields([KeyTimeInstance(index=3, name='d')], index=[0])
+        self.assertIs(first.sorted_lookup('name', 'index'), lookup)
+        # Items held by both nodes discard the lookups of both.
+        a.index = 1
+        self.assertIsNot(first.sorted_lookup('name', 'index'), lookup)
+        self.assertEqual(first.get_first(), a)
+        a.index = 5
+        self.assertEqual(first.get_first(), b)
+        self.assertEqual(second.get_first(), a)
+
+
 class TestApproachNode(unittest.TestCase):
     def test__check_type(self):
         approach = ApproachNode()
@@ -663,6 +922,19 @@ class TestApproachNode(unittest.TestCase):
         previous_approach = approach.get_previous(110, frequency=4)
         self.assertEqual(previous_approach, go_around1)
 
+    def test_get_after_modification(self):
+        go_around = ApproachItem('GO_AROUND', slice(15, 25))
+        landing = ApproachItem('LANDING', slice(50, 55))
+        approach = ApproachNode(items=[landing, go_around])
+        self.assertEqual(approach.get_first(), go_around)
+        self.assertEqual(approach.get_last(_type='GO_AROUND'), go_around)
+        go_around.slice = slice(60, 65)
+        self.assertEqual(approach.get_first(), landing)
+        self.assertEqual(approach.get_previous(62, use='start'), go_around)
+        touch_and_go = approach.create_approach('TOUCH_AND_GO', slice(5, 10))
+        self.assertEqual(approach.get_first(), touch_and_go)
+        self.assertEqual(approach.get(_type='TOUCH_AND_GO'), [touch_and_go])
+
 
 class TestSectionNode(unittest.TestCase):
     def setUp(self):
@@ -894,6 +1166,30 @@ class TestSectionNode(unittest.TestCase):
         self.assertEqual(node.get_surrounding(12), [sect_1, sect_2])
         self.assertEqual(node.get_surrounding(-3), [])
         self.assertEqual(node.get_surrounding(25), [sect_2])
+        sect_3 = Section('ThatSection', slice(1, 3), 1, 3)
+        node.insert(0, sect_3)
+        self.assertEqual(node.get_surrounding(2), [sect_3, sect_1])
+
+    def test_get_overlapping(self):
+        sect_1 = Section('ThisSection', slice(2, 30), 2, 30)
+        sect_2 = Section('ThatSection', slice(5, 10), 5, 10)
+        sect_3 = Section('ThisSection', slice(5, 20), 5, 20)
+        sect_4 = Section('ThisSection', slice(40, 50), 40, 50)
+        node = SectionNode(items=[sect_4, sect_3, sect_2, sect_1])
+        # Ties are resolved in the order of the list.
+        self.assertEqual(node.get_first(first_by='start', name='ThisSection'), sect_1)
+        self.assertEqual(node.get_last(last_by='stop'), sect_4)
+        self.assertEqual(node.get_next(8, use='stop'), sect_1)
+        self.assertEqual(node.get_next(8, use='stop', name='ThatSection'), sect_2)
+        self.assertEqual(node.get_previous(20, use='stop'), sect_2)
+        self.assertEqual(node.get_previous(25, use='stop', name='ThisSection'), sect_3)
+        self.assertEqual(node.get_previous(1), None)
+        self.assertEqual(node.get(name='ThisSection'), [sect_4, sect_3, sect_1])
+        self.assertEqual(node.get_ordered_by_index(name='ThisSection'),
+                         [sect_1, sect_3, sect_4])
+        del node[0]
+        self.assertEqual(node.get_last(last_by='stop'), sect_1)
+        self.assertEqual(node.get(name='ThisSection'), [sect_3, sect_1])
 
     def test_get_shortest(self):
         node = SectionNode(items=[Section('ThisSection', slice(0, 5), 0, 5),
@@ -1075,6 +1371,44 @@ class TestFormattedNameNode(unittest.TestCase):
                                           within_slice=slice(500,600))
         self.assertEqual(kti_node_returned5, [])
 
+    def test_get_name_values(self):
+        class SpeedInPhase(FormattedNameNode):
+            NAME_FORMAT = '%(speed)s in %(phase)s'
+            NAME_VALUES = {'speed': ['Slowest', 'Fast'],
+                           'phase': ['Climb', 'Descent']}
+            def derive(self, *args, **kwargs):
+                pass
+        kti_node = SpeedInPhase(items=[KeyTimeInstance(12, 'Slowest in Climb'),
+                                       KeyTimeInstance(342, 'Slowest in Descent'),
+                                       KeyTimeInstance(50, 'Fast in Climb')])
+        self.assertEqual(kti_node.get(name_values={'speed': 'Slowest'}),
+                         [KeyTimeInstance(12, 'Slowest in Climb'),
+                          KeyTimeInstance(342, 'Slowest in Descent')])
+        self.assertEqual(kti_node.get(name_values={'speed': 'Fast', 'phase': 'Climb'}),
+                         [KeyTimeInstance(50, 'Fast in Climb')])
+        self.assertEqual(kti_node.get(name_values={'phase': 'Climb'}, within_slice=slice(20, 100)),
+                         [KeyTimeInstance(50, 'Fast in Climb')])
+        self.assertEqual(kti_node.get_first(name_values={'phase': 'Descent'}).index, 342)
+        self.assertEqual(kti_node.get(name_values={'speed': 'Warp 10'}), [])
+        self.assertRaises(ValueError, kti_node.get, name_values={'altitude': 20})
+
+    def test_name_index(self):
+        class Speed(FormattedNameNode):
+            NAME_FORMAT = 'Speed in %(phase)s at %(altitude)d ft'
+            NAME_VALUES = {'altitude': [100, 200],
+                           'phase': ['ascent', 'descent']}
+            def derive(self, *args, **kwargs):
+                pass
+        index = Speed.name_index()
+        self.assertIs(Speed.name_index(), index)
+        self.assertEqual(index.name_values['Speed in descent at 200 ft'], (200, 'descent'))
+        self.assertEqual(Speed.names_matching({'altitude': 100}),
+                         {'Speed in ascent at 100 ft', 'Speed in descent at 100 ft'})
+        # Modifying NAME_VALUES rebuilds the index.
+        Speed.NAME_VALUES['altitude'].append(300)
+        self.assertIn('Speed in ascent at 300 ft', Speed.names())
+        self.assertTrue(Speed()._validate_name('Speed in descent at 300 ft'))
+
 
     def test_get_ordered_by_index(self):
         kti_node = self.speed_class(items=[KeyTimeInstance(12, 'Slowest'),
@@ -1150,6 +1484,29 @@ class TestFormattedNameNode(unittest.TestCase):
         previous_kti = kti_node.get_previous(40, frequency=4)
         self.assertEqual(previous_kti, KeyTimeInstance(2, 'Slowest'))
 
+    def test_get_after_modification(self):
+        kti_node = self.speed_class(items=[KeyTimeInstance(12, 'Slowest'),
+                                           KeyTimeInstance(342, 'Slowest'),
+                                           KeyTimeInstance(2, 'Slowest'),
+                                           KeyTimeInstance(50, 'Fast')])
+        self.assertEqual(kti_node.get_first(), kti_node[2])
+        self.assertEqual(kti_node.get_next(20, name='Slowest'), kti_node[1])
+        kti_node[1].index = 30
+        self.assertEqual(kti_node.get_next(20, name='Slowest'), kti_node[1])
+        self.assertEqual(kti_node.get_last(), kti_node[3])
+        kti_node[3].name = 'Slowest'
+        self.assertEqual(kti_node.get(name='Fast'), [])
+        self.assertEqual(kti_node.get_last(name='Slowest'), kti_node[3])
+        kti_node.append(KeyTimeInstance(1, 'Fast'))
+        self.assertEqual(kti_node.get_first(), kti_node[4])
+        self.assertEqual(kti_node.get_previous(5, name='Fast'), kti_node[4])
+        kti_node[:] = [KeyTimeInstance(8, 'Fast'), KeyTimeInstance(8, 'Slowest')]
+        # Ties are resolved in the order of the list.
+        self.assertEqual(kti_node.get_first(), kti_node[0])
+        self.assertEqual(kti_node.get_last(), kti_node[0])
+        self.assertEqual(kti_node.get_first(within_slice=slice(5, 10)), kti_node[0])
+        self.assertEqual(kti_node.get(within_slice=slice(8, 9)), kti_node)
+
     def test_initial_items_storage(self):
         node = FormattedNameNode(['a', 'b', 'c'])
         self.assertEqual(list(node), ['a', 'b', 'c'])
@@ -1242,6 +1599,18 @@ class TestKeyPointValueNode(unittest.TestCase):
         ktis = KTI('KTI', items=[KeyTimeInstance(i, 'a') for i in range(0,4,2)])
         self.assertRaises(ValueError, knode.create_kpvs_at_ktis, param.array, ktis)
 
+    def test_create_kpvs_at_ktis_multistate_numeric_states(self):
+        # e.g. FlapAtLiftoff sources the nearest flap state.
+        knode = self.knode
+        param = M('Flap', np.ma.array([0, 0, 5, 5, 15]),
+                  values_mapping={0: '0', 5: '5', 15: '15'})
+        ktis = KTI('KTI', items=[KeyTimeInstance(i, 'a') for i in (1.2, 1.6, 4)])
+        knode.create_kpvs_at_ktis(param.array, ktis, interpolate=False)
+        self.assertEqual(list(knode),
+                         [KeyPointValue(index=1.2, value=0, name='Kpv'),
+                          KeyPointValue(index=1.6, value=5, name='Kpv'),
+                          KeyPointValue(index=4, value=15, name='Kpv')])
+
 
     def test_create_kpv_between_indexes(self):
         knode = self.knode
@@ -1553,6 +1922,9 @@ class TestKeyPointValueNode(unittest.TestCase):
         self.assertEqual(aligned_node,
                          [KeyPointValue(index=1.95, value=12.5, name='Speed at 1000ft'),
                           KeyPointValue(index=5.45, value=12.5, name='Speed at 1000ft')])
+        # Aligned KPVs are copies.
+        aligned_node[0].value = 15
+        self.assertEqual(knode[0], KeyPointValue(index=10, value=12.5, name='Speed at 1000ft'))
 
     def test_get_min(self):
         # Test empty Node first.
@@ -1946,6 +2318,9 @@ class TestDerivedParameterNode(unittest.TestCase):
         self.assertEqual(spd.at(9.75), 9*2) # max val without extrapolation
         self.assertEqual(spd.at(0), 0) # Extrapolation at bottom end
         self.assertEqual(spd.at(11), 19) # Extrapolation at top end
+        spd.array[3:5] = np.ma.masked
+        self.assertIsNone(spd.at(2.5))
+        self.assertIsNone(spd.at(None))
 
     @mock.patch('analysis_engine.node.slices_above')
     def test_slices_above(self, slices_above):
@@ -1,5 +1,104 @@
+import mock
+import numpy as np
+import time
 import unittest
 
+from datetime import datetime
+
+from analysis_engine import settings
+from analysis_engine.dependency_graph import dependency_order
+from analysis_engine.exceptions import FlightTimeoutError
+from analysis_engine.library import max_value
+from analysis_engine.node import (
+    DerivedParameterNode,
+    HDFParameterCache,
+    KeyPointValueNode,
+    KeyTimeInstanceNode,
+    NodeCache,
+    NodeManager,
+    P,
+    get_node_fingerprint,
+)
+from analysis_engine.process_flight import _node_fingerprints, _stale_nodes, derive_parameters
+from analysis_engine.profiler import NodeProfiler
+
+
+class MemoryHDF(object):
+    '''
+    Minimal stand-in for hdf_file which stores parameters in a dictionary.
+    '''
+    def __init__(self, params, duration):
+        self.params = {p.name: p for p in params}
+        self.duration = duration
+        self.cache_param_list = []
+        # Names of parameters in the order read and written.
+        self.read = []
+        self.written = []
+
+    def get_param(self, name, valid_only=False):
+        self.read.append(name)
+        return self.params[name]
+
+    def set_param(self, param):
+        self.params[param.name] = param
+        self.written.append(param.name)
+
+
+class Double(DerivedParameterNode):
+    def derive(self, a=P('A')):
+        self.array = a.array * 2
+
+
+class Total(DerivedParameterNode):
+    def derive(self, double=P('Double'), b=P('B')):
+        self.array = double.array + b.array
+
+
+class BHalved(DerivedParameterNode):
+    align_frequency = 0.5
+
+    def derive(self, b=P('B')):
+        self.array = b.array / 2
+
+
+class TotalMax(KeyPointValueNode):
+    def derive(self, total=P('Total')):
+        self.create_kpv(*max_value(total.array))
+
+
+class BHalvedMax(KeyPointValueNode):
+    def derive(self, b_halved=P('B Halved'), total=P('Total')):
+        self.create_kpv(*max_value(b_halved.array))
+
+
+class DoublePeak(KeyTimeInstanceNode):
+    def derive(self, double=P('Double')):
+        self.create_kti(np.ma.argmax(double.array))
+
+
+class ZeroedB(DerivedParameterNode):
+    '''
+    Modifies its dependencies in-place.
+    '''
+    def derive(self, a=P('A'), b=P('B')):
+        a.array[:] = 0
+        b.array[:] = 0
+        self.array = a.array + b.array
+
+
+class ADelayed(DerivedParameterNode):
+    '''
+    Completes after nodes which follow it within the process order.
+    '''
+    def derive(self, a=P('A')):
+        time.sleep(0.1)
+        self.array = a.array * 2
+
+
+class TimedOut(DerivedParameterNode):
+    def derive(self, a=P('A')):
+        raise FlightTimeoutError('flight.hdf5', 10)
+
 
 class TestProcessFlight(unittest.TestCase):
 
@@ -15,3 +114,154 @@ class TestProcessFlight(unittest.TestCase):
         '''
         self.assertTrue(False, msg='Test not implemented.')
 
+
+class TestDeriveParameters(unittest.TestCase):
+
+    def setUp(self):
+        self.derived_nodes = {
+            n.get_name(): n for n in (Double, Total, BHalved, TotalMax, BHalvedMax, DoublePeak)
+        }
+
+    def _node_mgr(self, hdf_keys=('A', 'B')):
+        return NodeManager({'Start Datetime': datetime.now()}, 100, list(hdf_keys),
+                           sorted(self.derived_nodes), [], self.derived_nodes, {}, {})
+
+    def _derive(self, workers, params=None, cache_param_list=(), profiler=None, force=False):
+        a = P('A', np.ma.arange(100, dtype=float), frequency=1)
+        b = P('B', np.ma.arange(200, dtype=float)[::-1], frequency=2, offset=0.25)
+        hdf = MemoryHDF([a, b], 100)
+        hdf.cache_param_list.extend(cache_param_list)
+        node_mgr = self._node_mgr()
+        process_order, _ = dependency_order(node_mgr)
+        results = derive_parameters(hdf, node_mgr, process_order, params=params, force=force,
+                                    workers=workers, profiler=profiler)
+        return hdf, results
+
+    def test_cache_release(self):
+        released = []
+        release = NodeCache.release
+
+        def track_release(cache, name):
+            released.append(name)
+            release(cache, name)
+
+        with mock.patch.object(NodeCache, 'release', track_release):
+            self._derive(None)
+        # Every dependency is released once, after its final consumer.
+        self.assertEqual(sorted(released), ['A', 'B', 'B Halved', 'Double', 'Total'])
+        self.assertLess(released.index('A'), released.index('Double'))
+
+    def test_force_timeout(self):
+        self.derived_nodes['Timed Out'] = TimedOut
+        for workers in (None, 4):
+            # Timeouts are raised even when forcing nodes to be derived.
+            with self.assertRaises(FlightTimeoutError):
+                self._derive(workers, force=True)
+
+    def test_node_release(self):
+        unused = P('Unused')
+        for workers in (None, 4):
+            params = {'Unused': unused}
+            hdf, results = self._derive(workers, params=params, cache_param_list=['A', 'Double', 'Total'])
+            # Derived nodes are released once no remaining node reads them.
+            self.assertEqual(params, {'Unused': unused})
+            self.assertEqual(hdf.cache_param_list, [])
+            self.assertEqual(sorted(results[1]), ['B Halved Max', 'Total Max'])
+
+        params = {'Unused': unused}
+        with mock.patch.object(settings, 'NODE_RELEASE', False):
+            hdf, _ = self._derive(None, params=params, cache_param_list=['A', 'Double', 'Total'])
+        self.assertEqual(sorted(params), ['B Halved Max', 'Double Peak', 'Total Max', 'Unused'])
+        self.assertEqual(hdf.cache_param_list, ['A', 'Double', 'Total'])
+
+    def test_hdf_cache(self):
+        released = []
+        release = HDFParameterCache.release
+
+        def track_release(cache, name):
+            released.append((name, cache.stats()['entries']))
+            release(cache, name)
+
+        for workers in (None, 4):
+            del released[:]
+            with mock.patch.object(HDFParameterCache, 'release', track_release):
+                hdf, _ = self._derive(workers, cache_param_list=['B', 'Double'])
+            # Cached parameters are read from the HDF file once however many
+            # nodes read them, and released after their last use. Total is
+            # not cached so is read by both Total Max and B Halved Max.
+            self.assertEqual(sorted(hdf.read), ['A', 'B', 'B Halved', 'Double', 'Total', 'Total'])
+            self.assertIn(('B', 2), released)
+            self.assertIn(('Double', 1), released)
+            self.assertEqual(hdf.cache_param_list, [])
+
+    def test_profiler(self):
+        profiler = NodeProfiler()
+        _, results = self._derive(4, profiler=profiler)
+        _, serial = self._derive(None)
+        self.assertEqual(results, serial)
+        profiles = {p['name']: p for p in profiler.report()}
+        self.assertEqual(sorted(profiles), sorted(self.derived_nodes))
+        self.assertEqual(profiles['Total']['node_type'], 'DerivedParameterNode')
+        self.assertEqual(profiles['Total Max']['node_type'], 'KeyPointValueNode')
+        # Total aligns B to Double, while Double has only one dependency.
+        self.assertEqual(profiles['Total']['dependencies_aligned'], 1)
+        self.assertEqual(profiles['Double']['dependencies_aligned'], 0)
+        for profile in profiles.values():
+            self.assertGreaterEqual(profile['total_time'],
+                                    profile['align_time'] + profile['derive_time'] + profile['store_time'])
+
+    def test_stale_nodes(self):
+        node_mgr = self._node_mgr()
+        process_order, gr_st = dependency_order(node_mgr)
+        fingerprints = _node_fingerprints(node_mgr, gr_st, process_order, set(), {})
+        self.assertEqual(sorted(fingerprints), sorted(self.derived_nodes))
+        self.assertEqual(fingerprints['Total'], get_node_fingerprint(Total))
+        self.assertEqual(_stale_nodes(self.derived_nodes, gr_st, fingerprints), set())
+        # Nodes depending upon a changed node are also stale.
+        fingerprints['Double'] = 'changed'
+        self.assertEqual(_stale_nodes(self.derived_nodes, gr_st, fingerprints),
+                         {'Double', 'Total', 'Total Max', 'B Halved Max', 'Double Peak'})
+        del fingerprints['B Halved']
+        self.assertIn('B Halved', _stale_nodes(self.derived_nodes, gr_st, fingerprints))
+
+    def test_node_fingerprints_reused(self):
+        # Double is read from the HDF and Total Max provided within initial.
+        node_mgr = self._node_mgr(['A', 'B', 'Double'])
+        process_order, gr_st = dependency_order(node_mgr)
+        previous = {'Double': 'previous double', 'Total Max': 'previous total max'}
+        fingerprints = _node_fingerprints(node_mgr, gr_st, process_order, {'Total Max'}, previous)
+        self.assertEqual(fingerprints['Double'], 'previous double')
+        self.assertEqual(fingerprints['Total Max'], 'previous total max')
+        self.assertEqual(fingerprints['Total'], get_node_fingerprint(Total))
+        self.assertNotIn('A', fingerprints)
+
+    def test_parallel_matches_serial(self):
+        serial_hdf, serial = self._derive(None)
+        parallel_hdf, parallel = self._derive(4)
+        self.assertEqual(serial, parallel)
+        for serial_result, parallel_result in zip(serial, parallel):
+            # Results are ordered by the process order.
+            self.assertEqual(list(serial_result), list(parallel_result))
+        self.assertEqual(sorted(serial_hdf.params), sorted(parallel_hdf.params))
+        for name, param in serial_hdf.params.items():
+            np.testing.assert_array_equal(param.array, parallel_hdf.params[name].array)
+            self.assertEqual(param.frequency, parallel_hdf.params[name].frequency)
+            self.assertEqual(param.offset, parallel_hdf.params[name].offset)
+
+    def test_parallel_write_order(self):
+        self.derived_nodes['A Delayed'] = ADelayed
+        serial_hdf, _ = self._derive(None)
+        parallel_hdf, _ = self._derive(4)
+        # Parameters are written in process order however long each takes.
+        self.assertEqual(parallel_hdf.written, serial_hdf.written)
+        self.assertEqual(list(parallel_hdf.params), list(serial_hdf.params))
+
+    def test_parallel_private_dependencies(self):
+        expected_hdf, expected = self._derive(4)
+        self.derived_nodes['Zeroed B'] = ZeroedB
+        hdf, results = self._derive(4)
+        # Nodes derived concurrently do not see Zeroed B's modifications.
+        self.assertEqual(results, expected)
+        for name, param in expected_hdf.params.items():
+            np.testing.assert_array_equal(hdf.params[name].array, param.array)
+        np.testing.assert_array_equal(hdf.params['Zeroed B'].array, 0)
@@ -0,0 +1,48 @@
+import os
+import shutil
+import simplejson as json
+import tempfile
+import unittest
+
+from analysis_engine.profiler import NodeProfiler
+
+
+class TestNodeProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.profiler = NodeProfiler(trace_memory=True)
+        with self.profiler.tracing():
+            with self.profiler.profile('Fast', 'FlightPhaseNode') as profile:
+                profile.derive_time = 0.1
+            with self.profiler.profile('Airspeed Max', 'KeyPointValueNode') as profile:
+                profile.dependencies_aligned = 2
+                # Allocate memory within the profile so its peak is traced.
+                data = [0] * 100000
+                del data
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_report(self):
+        report = self.profiler.report()
+        self.assertEqual(len(report), 2)
+        self.assertGreaterEqual(report[0]['total_time'], report[1]['total_time'])
+        profiles = {p['name']: p for p in report}
+        self.assertEqual(profiles['Fast']['node_type'], 'FlightPhaseNode')
+        self.assertEqual(profiles['Fast']['derive_time'], 0.1)
+        self.assertEqual(profiles['Airspeed Max']['dependencies_aligned'], 2)
+        self.assertGreater(profiles['Airspeed Max']['peak_bytes'], 700000)
+
+    def test_write(self):
+        json_path = os.path.join(self.temp_dir, 'profile.json')
+        self.profiler.write(json_path)
+        with open(json_path) as f:
+            self.assertEqual(json.load(f), self.profiler.report())
+
+        csv_path = os.path.join(self.temp_dir, 'profile.csv')
+        self.profiler.write(csv_path)
+        with open(csv_path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('name,node_type,total_time'))
@@ -6,21 +6,29 @@ import os.path
 import pytz
 import unittest
 
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
 from analysis_engine.split_hdf_to_segments import (
     _calculate_start_datetime,
     _get_normalised_split_params,
     _mask_invalid_years,
     _segment_type_and_slice,
+    _straighten_block,
     append_segment_info,
     calculate_fallback_dt,
     get_dt_arrays,
     get_valid_dt_slices,
     has_constant_time,
+    split_hdf_to_segments,
     split_segments,
+    split_segments_streaming,
+    FALLBACK_NO_PARAM,
     PRECISE,
+    SplitParameters,
 )
+from analysis_engine.datastructures import Segment
+from analysis_engine.library import straighten_headings
 from analysis_engine.node import M, P, Parameter
 
 from hdfaccess.file import hdf_file
@@ -126,6 +134,26 @@ class TestDateTimeFunctions(unittest.TestCase):
         self.assertTrue(len(dt_arrays[0]) == len(dt_arrays[1]) == len(dt_arrays[2]) == \
                         len(dt_arrays[3]) == len(dt_arrays[4]) == len(dt_arrays[5]) == duration)
 
+    def test_get_dt_arrays__fallback(self):
+        duration = 90
+        month = P('Month', array=np.ma.array([12] * duration))
+        day = P('Day', array=np.ma.array([31] * duration))
+        values = {'Month': month, 'Day': day}
+        hdf = mock.Mock()
+        hdf.duration = duration
+        hdf.get.side_effect = values.get
+        fallback_dt = datetime(2019, 12, 31, 23, 59, 30, 500000, tzinfo=pytz.utc)
+        dt_arrays, precise_timestamp, dt_param_state = get_dt_arrays(hdf, fallback_dt, fallback_dt)
+        self.assertFalse(precise_timestamp)
+        self.assertEqual(dt_arrays[0].tolist(), [2019] * 30 + [2020] * 60)
+        self.assertEqual(dt_arrays[1].tolist(), [12] * duration)
+        self.assertEqual(dt_arrays[2].tolist(), [31] * duration)
+        self.assertEqual(dt_arrays[3].tolist(), [23] * 30 + [0] * 60)
+        self.assertEqual(dt_arrays[4].tolist(), [59] * 30 + [0] * 60)
+        self.assertEqual(dt_arrays[5].tolist(), list(range(30, 60)) + list(range(60)))
+        self.assertEqual(dt_param_state['Year'], FALLBACK_NO_PARAM)
+        self.assertEqual(dt_param_state['Month'], PRECISE)
+
     def test_get_valid_dt_slices_all_unmasked(self):
 
         def hdf_get(key):
@@ -663,6 +691,249 @@ class TestSplitSegments(unittest.TestCase):
         self.assertEqual(np.ma.argmin(norm_array), 715)
 
 
+class TestSplitHdfToSegments(unittest.TestCase):
+    def _split(self, workers, write_segment, append_segment_info, calculate_fallback_dt,
+               split_segments, hdf_file):
+        hdf = hdf_file.return_value.__enter__.return_value
+        hdf.arinc = '717'
+        hdf.superframe_present = False
+        split_segments.return_value = [
+            ('START_AND_STOP', slice(0, 3000), 0),
+            ('GROUND_ONLY', slice(3000, 3500), 40),
+            ('START_AND_STOP', slice(3500, 9000), 20),
+        ]
+        calculate_fallback_dt.return_value = datetime(2020, 1, 1, tzinfo=pytz.utc)
+
+        def segment_info(path, segment_type, segment_slice, part, fallback_dt=None, **kwargs):
+            return Segment(segment_slice, segment_type, part, path, start_dt=fallback_dt,
+                           stop_dt=fallback_dt + timedelta(seconds=segment_slice.stop - segment_slice.start))
+        append_segment_info.side_effect = segment_info
+        return split_hdf_to_segments(os.path.join('data', 'flight.hdf5'), {}, workers=workers)
+
+    @mock.patch('analysis_engine.split_hdf_to_segments.hdf_file')
+    @mock.patch('analysis_engine.split_hdf_to_segments.validate_aircraft')
+    @mock.patch('analysis_engine.split_hdf_to_segments.split_segments')
+    @mock.patch('analysis_engine.split_hdf_to_segments.calculate_fallback_dt')
+    @mock.patch('analysis_engine.split_hdf_to_segments.append_segment_info')
+    @mock.patch('analysis_engine.split_hdf_to_segments.write_segment')
+    def test_split_hdf_to_segments(self, write_segment, append_segment_info, calculate_fallback_dt,
+                                   split_segments, validate_aircraft, hdf_file):
+        segments = self._split(None, write_segment, append_segment_info, calculate_fallback_dt,
+                               split_segments, hdf_file)
+        self.assertEqual([s.path for s in segments],
+                         [os.path.join('data', 'flight.%03d.hdf5' % p) for p in (1, 2, 3)])
+        self.assertEqual([s.part for s in segments], [1, 2, 3])
+        # Fallback datetimes account for the padding at the start of each segment.
+        self.assertEqual([s.start_dt for s in segments],
+                         [datetime(2020, 1, 1, 0, 0, 0, tzinfo=pytz.utc),
+                          datetime(2020, 1, 1, 0, 49, 20, tzinfo=pytz.utc),
+                          datetime(2020, 1, 1, 0, 58, 0, tzinfo=pytz.utc)])
+        self.assertEqual(write_segment.call_args_list[1][0][:4],
+                         (os.path.join('data', 'flight.hdf5'), slice(3000, 3500),
+                          os.path.join('data', 'flight.002.hdf5'), 4))
+
+    @mock.patch('analysis_engine.split_hdf_to_segments.ProcessPoolExecutor', new=ThreadPoolExecutor)
+    @mock.patch('analysis_engine.split_hdf_to_segments.hdf_file')
+    @mock.patch('analysis_engine.split_hdf_to_segments.validate_aircraft')
+    @mock.patch('analysis_engine.split_hdf_to_segments.split_segments')
+    @mock.patch('analysis_engine.split_hdf_to_segments.calculate_fallback_dt')
+    @mock.patch('analysis_engine.split_hdf_to_segments.append_segment_info')
+    @mock.patch('analysis_engine.split_hdf_to_segments.write_segment')
+    def test_split_hdf_to_segments_workers(self, write_segment, append_segment_info, calculate_fallback_dt,
+                                           split_segments, validate_aircraft, hdf_file):
+        expected = self._split(None, write_segment, append_segment_info, calculate_fallback_dt,
+                               split_segments, hdf_file)
+        segments = self._split(3, write_segment, append_segment_info, calculate_fallback_dt,
+                               split_segments, hdf_file)
+        self.assertEqual(segments, expected)
+        self.assertEqual(write_segment.call_count, 6)
+
+
+    @mock.patch('analysis_engine.split_hdf_to_segments.settings')
+    @mock.patch('analysis_engine.split_hdf_to_segments.split_segments_streaming')
+    @mock.patch('analysis_engine.split_hdf_to_segments.hdf_file')
+    @mock.patch('analysis_engine.split_hdf_to_segments.validate_aircraft')
+    @mock.patch('analysis_engine.split_hdf_to_segments.split_segments')
+    @mock.patch('analysis_engine.split_hdf_to_segments.calculate_fallback_dt')
+    @mock.patch('analysis_engine.split_hdf_to_segments.append_segment_info')
+    @mock.patch('analysis_engine.split_hdf_to_segments.write_segment')
+    def test_split_hdf_to_segments_streaming(self, write_segment, append_segment_info, calculate_fallback_dt,
+                                             split_segments, validate_aircraft, hdf_file,
+                                             split_segments_streaming, settings):
+        settings.SPLIT_STREAMING_DURATION = 3600
+        settings.SPLIT_SEGMENT_WORKERS = 0
+        hdf_file.return_value.__enter__.return_value.duration = 9000
+        split_segments_streaming.side_effect = lambda hdf, aircraft_info: iter(split_segments.return_value)
+        segments = self._split(None, write_segment, append_segment_info, calculate_fallback_dt,
+                               split_segments, hdf_file)
+        self.assertEqual([s.slice for s in segments], [slice(0, 3000), slice(3000, 3500), slice(3500, 9000)])
+        split_segments.assert_not_called()
+
+
+class TestSplitParameters(unittest.TestCase):
+    def setUp(self):
+        self.params = {
+            'Eng (1) N1': Parameter('Eng (1) N1', array=np.ma.array([10, 20, 30, 40.]), frequency=1),
+            'Eng (2) N1': Parameter('Eng (2) N1', array=np.ma.array([30, 40, 50, 60.]), frequency=1),
+            'Groundspeed': Parameter('Groundspeed', array=np.ma.array([0, 5, 10, 15, 20, 25, 30, 35.]),
+                                     frequency=2),
+            'Gear On Ground': Parameter('Gear On Ground', array=np.ma.array([1, 1, 0, 0])),
+        }
+        self.hdf = mock.MagicMock()
+        self.hdf.__getitem__.side_effect = self.params.__getitem__
+        self.hdf.get.side_effect = self.params.get
+
+    def test_eng_average(self):
+        split_params = SplitParameters(self.hdf)
+        self.assertEqual(list(split_params.arrays), ['Eng (1) N1', 'Eng (2) N1', 'Groundspeed'])
+        eng_average, frequency = split_params.eng_average()
+        self.assertEqual(eng_average.tolist(), [20, 30, 40, 50])
+        self.assertEqual(frequency, 1)
+        # Parameters are aligned once and not modified.
+        self.assertEqual(split_params.arrays['Groundspeed'].tolist(), [0, 10, 20, 30])
+        self.assertEqual(self.params['Groundspeed'].array.tolist(), [0, 5, 10, 15, 20, 25, 30, 35])
+
+    def test_eng_average_aligned(self):
+        heading = Parameter('Heading', array=np.ma.arange(8), frequency=2)
+        eng_average, frequency = SplitParameters(self.hdf, heading).eng_average()
+        self.assertEqual(eng_average.tolist(), [20, 25, 30, 35, 40, 45, 50, None])
+        self.assertEqual(frequency, 2)
+
+    def test_normalised_average(self):
+        norm_array, frequency = SplitParameters(self.hdf).normalised_average()
+        # Each parameter is normalised by its maximum.
+        self.assertTrue(np.allclose(norm_array, [0.25, 0.5, 0.75, 1]))
+        self.assertEqual(frequency, 1)
+
+    def test_normalised_average_maxima(self):
+        split_params = SplitParameters(self.hdf)
+        self.assertEqual(list(split_params.maxima().values()), [40, 60, 30])
+        maxima = {'Eng (1) N1': 80, 'Eng (2) N1': 0, 'Groundspeed': 60}
+        norm_array, frequency = split_params.normalised_average(maxima)
+        # Parameters with a maximum of 0 are masked as normalise does.
+        self.assertTrue(np.allclose(norm_array, [0.0625, 0.5 / 2.4, 0.85 / 2.4, 0.5]))
+        self.assertEqual(frequency, 1)
+
+    def test_no_split_params(self):
+        del self.params['Eng (1) N1'], self.params['Eng (2) N1']
+        split_params = SplitParameters(self.hdf)
+        self.assertEqual(split_params.eng_average(), (None, None))
+        self.assertEqual(split_params.normalised_average()[1], 2)
+        del self.params['Groundspeed']
+        split_params = SplitParameters(self.hdf)
+        self.assertEqual(split_params.normalised_average(), (None, None))
+
+    def test_get(self):
+        split_params = SplitParameters(self.hdf)
+        gog = split_params.get('Gear On Ground')
+        self.assertIs(split_params.get('Gear On Ground'), gog)
+        self.assertIsNone(split_params.get('Collective'))
+        self.assertIsNone(split_params.get('Collective'))
+        self.assertEqual(self.hdf.get.call_count, 2)
+
+
+class BlockHDF(MockHDF):
+    '''
+    Parameters of a data file which may be read in slices of seconds.
+    '''
+    reliable_frame_counter = False
+    superframe_present = False
+
+    def get_param(self, name, valid_only=False, _slice=None):
+        param = self[name]
+        array = param.array
+        if _slice is not None:
+            self.slices.append(_slice)
+            array = array[int(_slice.start * param.frequency):int(_slice.stop * param.frequency)]
+        return Parameter(name, array=array.copy(), frequency=param.frequency, offset=param.offset)
+
+    def get(self, name, default=None):
+        return self.get_param(name) if name in self else default
+
+
+class TestSplitSegmentsStreaming(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        airspeed, heading, eng = [], [], []
+        for taxi, airborne in ((700, 2500), (900, 3100), (600, 2200), (800, 1900)):
+            airspeed.extend(np.r_[rng.rand(taxi) * 20, 100 + rng.rand(airborne) * 150, rng.rand(taxi) * 20])
+            heading.extend((rng.rand() * 360 + np.cumsum(rng.randn(2 * taxi + airborne) * 2)) % 360)
+            eng.extend(np.r_[np.linspace(0, 60, taxi), 60 + rng.rand(airborne) * 30, np.linspace(60, 0, taxi)])
+        samples = len(airspeed) - len(airspeed) % 64
+        airspeed = np.ma.array(airspeed[:samples])
+        # Masked sections within flight are repaired while those on the
+        # ground are not, including one longer than a block.
+        airspeed[2000:2010] = np.ma.masked
+        airspeed[4020:4400] = np.ma.masked
+        heading = np.ma.array(np.repeat(heading[:samples], 2))
+        heading[3000:3020] = heading[9000:12000] = np.ma.masked
+        eng = np.ma.array(np.repeat(eng[:samples], 4))
+        eng[20000:20100] = np.ma.masked
+        self.hdf = BlockHDF({
+            'Airspeed': Parameter('Airspeed', array=airspeed, frequency=1, offset=0.2),
+            'Heading': Parameter('Heading', array=heading, frequency=2, offset=0.1),
+            'Eng (1) N1': Parameter('Eng (1) N1', array=eng, frequency=4, offset=0.3),
+            'Frame Counter': Parameter('Frame Counter', array=np.ma.arange(samples) % 4096, frequency=1),
+        }, duration=samples)
+        self.hdf.slices = []
+
+    def assert_streaming(self, block_duration):
+        expected = split_segments(self.hdf, {})
+        self.assertEqual(list(split_segments_streaming(self.hdf, {}, block_duration=block_duration)),
+                         expected)
+        return expected
+
+    def test_split_segments_streaming(self):
+        for block_duration in (128, 1000, 4000, 100000):
+            segments = self.assert_streaming(block_duration)
+        self.assertEqual(len(segments), 4)
+
+    def test_split_segments_streaming_frame_counter(self):
+        self.hdf.reliable_frame_counter = True
+        dfc = self.hdf['Frame Counter'].array
+        dfc[4000:] += 1000
+        for block_duration in (128, 4000):
+            segments = self.assert_streaming(block_duration)
+        self.assertEqual(segments[0][1].stop, 4000.0)
+
+    def test_split_segments_streaming_rate_of_turn(self):
+        del self.hdf['Eng (1) N1']
+        for block_duration in (128, 4000):
+            self.assert_streaming(block_duration)
+
+    def test_split_segments_streaming_reads_blocks(self):
+        segments = list(split_segments_streaming(self.hdf, {}, block_duration=1000))
+        self.assertEqual(len(segments), 4)
+        # Blocks are rounded up to 1024 seconds and read with a margin of
+        # 128 seconds for alignment.
+        self.assertTrue(self.hdf.slices)
+        self.assertLessEqual(max(s.stop - s.start for s in self.hdf.slices), 1024 + 2 * 128)
+
+    @mock.patch('analysis_engine.split_hdf_to_segments.split_segments')
+    def test_split_segments_streaming_in_memory(self, split_segments):
+        split_segments.return_value = [('START_AND_STOP', slice(0, 100), 0)]
+        self.assertEqual(list(split_segments_streaming(self.hdf, {'Aircraft Type': 'helicopter'})),
+                         split_segments.return_value)
+        # Data which can only be a single segment.
+        self.hdf['Airspeed'].array[:] = np.ma.masked
+        self.assertEqual(list(split_segments_streaming(self.hdf, {})), split_segments.return_value)
+        self.assertEqual(split_segments.call_count, 2)
+
+    def test_straighten_block(self):
+        heading = self.hdf['Heading'].array[:20000]
+        heading[100] = heading[4095:4097] = heading[6000] = np.ma.masked
+        expected = straighten_headings(heading)
+        state = None
+        blocks = []
+        for start, stop in ((0, 4096), (4096, 6000), (6000, 6001), (6001, 20000)):
+            block, state = _straighten_block(heading[start:stop], state)
+            blocks.append(block)
+        straightened = np.ma.concatenate(blocks)
+        self.assertEqual(straightened.data[~straightened.mask].tolist(),
+                         expected.data[~expected.mask].tolist())
+        self.assertEqual(straightened.mask.tolist(), expected.mask.tolist())
+
+
 class mocked_hdf(object):
     def __init__(self, path=None):
         pass
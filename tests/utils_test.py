@@ -1,10 +1,17 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
 
 from mock import Mock, patch
 
-from analysis_engine.node import DerivedParameterNode, P, Parameter
+from analysis_engine.node import DerivedParameterNode, LazyNode, P, Parameter
 from analysis_engine.utils import (
+    clear_derived_nodes_cache,
     derived_trimmer,
+    get_derived_nodes,
     list_derived_parameters,
     list_everything,
     list_flight_attributes,
@@ -13,8 +20,12 @@ from analysis_engine.utils import (
     list_ktis,
     list_lfl_parameter_dependencies,
     list_parameters,
+    load_node_manifest,
+    save_node_manifest,
     )
 
+from tests import sample_derived_parameters
+
 class TestTrimmer(unittest.TestCase):
 
     @patch('analysis_engine.utils.hdf_file')
@@ -68,6 +79,107 @@ class TestTrimmer(unittest.TestCase):
         self.assertEqual(dest, strip_hdf.return_value)
 
 
+class TestGetDerivedNodes(unittest.TestCase):
+    def setUp(self):
+        clear_derived_nodes_cache()
+
+    def tearDown(self):
+        clear_derived_nodes_cache()
+
+    def test_get_derived_nodes(self):
+        nodes = get_derived_nodes('tests.sample_derived_parameters')
+        self.assertEqual(nodes['SAT'], sample_derived_parameters.SAT)
+        self.assertEqual(nodes['Mach'], sample_derived_parameters.Mach)
+        self.assertEqual(get_derived_nodes([sample_derived_parameters]), nodes)
+
+    def test_get_derived_nodes_cached(self):
+        nodes = get_derived_nodes(['tests.sample_derived_parameters'])
+        with patch('analysis_engine.utils._find_module_nodes') as find_module_nodes:
+            self.assertEqual(get_derived_nodes(['tests.sample_derived_parameters']), nodes)
+            find_module_nodes.assert_not_called()
+            # Modules are inspected again once the cache is cleared.
+            clear_derived_nodes_cache()
+            find_module_nodes.return_value = {}
+            self.assertEqual(get_derived_nodes(['tests.sample_derived_parameters']), {})
+            self.assertEqual(find_module_nodes.call_count, 1)
+
+
+class TestNodeManifest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'manifest.json')
+        self.modules = ['tests.sample_derived_parameters']
+        clear_derived_nodes_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_save_node_manifest(self):
+        manifest = save_node_manifest(self.path, self.modules)
+        entries = {e['name']: e for e in manifest['nodes']['tests.sample_derived_parameters']}
+        self.assertEqual(entries['SAT'], {
+            'name': 'SAT',
+            'module': 'tests.sample_derived_parameters',
+            'class': 'SAT',
+            'node_type': 'DerivedParameterNode',
+            'dependencies': ['TAT', 'Indicated Airspeed', 'Pressure Altitude'],
+            'can_operate': False,
+            'can_operate_attributes': [],
+            'names': ['SAT'],
+        })
+        self.assertEqual(load_node_manifest(self.path, self.modules), manifest)
+
+    def test_load_node_manifest_stale(self):
+        self.assertIsNone(load_node_manifest(self.path, self.modules))
+        save_node_manifest(self.path, self.modules)
+        # Modules not within the manifest.
+        self.assertIsNone(load_node_manifest(self.path, self.modules + ['analysis_engine.flight_phase']))
+        # Module source changed since the manifest was written.
+        with patch('analysis_engine.utils._source_fingerprint', return_value=[0, 0]):
+            self.assertIsNone(load_node_manifest(self.path, self.modules))
+        with patch('analysis_engine.utils.__version__', 'other'):
+            self.assertIsNone(load_node_manifest(self.path, self.modules))
+
+    def test_get_derived_nodes_lazy(self):
+        save_node_manifest(self.path, self.modules)
+        clear_derived_nodes_cache()
+        with patch.dict('sys.modules'):
+            del sys.modules['tests.sample_derived_parameters']
+            nodes = get_derived_nodes(self.modules, manifest_path=self.path)
+            self.assertNotIn('tests.sample_derived_parameters', sys.modules)
+            self.assertIsInstance(nodes['SAT'], LazyNode)
+            self.assertEqual(sorted(nodes), sorted(get_derived_nodes([sample_derived_parameters])))
+            # The module is imported once the node is derived.
+            self.assertEqual(nodes['SAT']().get_name(), 'SAT')
+            self.assertIn('tests.sample_derived_parameters', sys.modules)
+        clear_derived_nodes_cache()
+        # Nodes are imported if the manifest is missing.
+        nodes = get_derived_nodes(self.modules, manifest_path=self.path + '.missing')
+        self.assertIs(nodes['SAT'], sample_derived_parameters.SAT)
+
+    def _imported_modules(self, code):
+        code += '; import sys; print(*sys.modules)'
+        output = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+        return set(output.split())
+
+    def test_imported_modules(self):
+        code = 'from analysis_engine import process_flight, settings; process_flight.get_derived_nodes(settings.NODE_MODULES%s)'
+        modules = self._imported_modules(code % '')
+        self.assertIn('analysis_engine.key_point_values', modules)
+        self.assertIn('analysis_engine.derived_parameters', modules)
+        # Plotting libraries are only imported by plot_flight.
+        self.assertNotIn('matplotlib', modules)
+        self.assertNotIn('simplekml', modules)
+        self.assertNotIn('analysis_engine.plot_flight', modules)
+
+        save_node_manifest(self.path)
+        modules = self._imported_modules(code % (', manifest_path=%r' % self.path))
+        # Node modules are not imported until one of their nodes is derived.
+        self.assertNotIn('analysis_engine.key_point_values', modules)
+        self.assertNotIn('analysis_engine.derived_parameters', modules)
+        self.assertNotIn('matplotlib', modules)
+
+
 class TestGetNames(unittest.TestCase):
     def test_list_parameters(self):
         params = list_parameters()